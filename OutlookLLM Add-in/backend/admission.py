@@ -0,0 +1,178 @@
+"""Per-user admission control with priority queueing and load shedding.
+
+Every model-bound request first takes a token from its user's token bucket,
+so one user's scripted run cannot starve everyone else. It then needs one of
+`max_concurrency` global slots. When all slots are busy, requests wait in a
+priority queue (interactive before standard before background). Requests
+that cannot be admitted in time are rejected with `AdmissionRejected`, which
+the app turns into 429 + Retry-After. Background work is shed first: it is
+refused once the queue is half full.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    STANDARD = 1
+    BACKGROUND = 2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Request rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Take `cost` tokens; return 0 on success, else seconds until they are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class Ticket:
+    """A granted concurrency slot; `release` is idempotent."""
+
+    __slots__ = ("_controller", "_released")
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int = 64,
+        max_queue: int = 256,
+        user_rate: float = 5.0,
+        user_burst: float = 20.0,
+        queue_timeouts: Optional[Dict[Priority, float]] = None,
+        max_tracked_users: int = 100000,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.queue_timeouts = queue_timeouts or {
+            Priority.INTERACTIVE: 10.0,
+            Priority.STANDARD: 5.0,
+            Priority.BACKGROUND: 2.0,
+        }
+        self.max_tracked_users = max_tracked_users
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued: Counter = Counter()
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected: Counter = Counter()
+
+    def check_rate(self, user_id: str, cost: float = 1.0) -> None:
+        """Charge `cost` to the user's token bucket or raise `AdmissionRejected`."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            if len(self._buckets) > self.max_tracked_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        wait = bucket.take(min(cost, self.user_burst))
+        if wait:
+            self.rejected["rate_limited"] += 1
+            raise AdmissionRejected("user rate limit exceeded", wait)
+
+    async def acquire(self, user_id: str, priority: Priority, cost: float = 1.0) -> Ticket:
+        """Admit a request or raise `AdmissionRejected`."""
+        self.check_rate(user_id, cost)
+        queued = sum(self._queued.values())
+        if self._active < self.max_concurrency and not queued:
+            self._active += 1
+            self.admitted += 1
+            return Ticket(self)
+        if queued >= self.max_queue or (priority == Priority.BACKGROUND and queued >= self.max_queue // 2):
+            self.rejected["overloaded"] += 1
+            raise AdmissionRejected("server overloaded", self.queue_timeouts[priority])
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._queued[priority] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeouts[priority])
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self._release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected["queue_timeout"] += 1
+            raise AdmissionRejected("timed out waiting for capacity", self.queue_timeouts[priority]) from None
+        finally:
+            self._queued[priority] -= 1
+        self.admitted += 1
+        return Ticket(self)
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter; _active is unchanged.
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, priority: Priority, cost: float = 1.0) -> AsyncIterator[Ticket]:
+        ticket = await self.acquire(user_id, priority, cost)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queued": sum(self._queued.values()),
+            "queued_interactive": self._queued[Priority.INTERACTIVE],
+            "queued_standard": self._queued[Priority.STANDARD],
+            "queued_background": self._queued[Priority.BACKGROUND],
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected["rate_limited"],
+            "rejected_overloaded": self.rejected["overloaded"],
+            "rejected_queue_timeout": self.rejected["queue_timeout"],
+            "tracked_users": len(self._buckets),
+        }
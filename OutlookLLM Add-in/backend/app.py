@@ -1,14 +1,37 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import AsyncIterator, Callable, List, Dict, Optional, Tuple
+import asyncio
+import json
+import os
 import uvicorn
 import logging
 
+from admission import AdmissionController, AdmissionRejected, Priority, Ticket
+from batching import MicroBatcher
+from cache import ResponseCache, cache_key
+from config_store import UserConfigStore, etag_matches
+from ingest import BodyTooLarge, UnsupportedEncoding, ingest, supported_encodings
+from conversation import ConversationStore
+from jobs import EmailJob, EmailJobManager, JobQueueFull
+from mapreduce import MapReduceSummarizer
+from normalize import EmailNormalizer, NormalizationStats, estimate_tokens, normalize_email
+from redaction import Redactor
+from router import ModelRouter, ModelTier, load_tiers
+from singleflight import SingleFlight
+from static import StaticBundle
+from llm import get_backend
+from logging_setup import RequestIdMiddleware, setup_logging
+from metrics import MetricsMiddleware, MetricsRegistry
+
 app = FastAPI()
 
-logging.basicConfig(level=logging.INFO)
+log_handler = setup_logging(
+    level=getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper()),
+    sample_rate=float(os.environ.get("LOG_INFO_SAMPLE_RATE", "1.0")),
+)
 logger = logging.getLogger(__name__)
 
 # Enable CORS
@@ -18,7 +41,112 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["ETag", "X-Request-ID"],
+)
+
+metrics = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics, routes=app.router.routes)
+app.add_middleware(RequestIdMiddleware)
+
+BATCH_MAX_SIZE = int(os.environ.get("LLM_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("LLM_BATCH_MAX_WAIT_MS", "5"))
+
+# MODEL_TIERS is a JSON list of tier specs (see router.load_tiers), inline or
+# in a file. Without it every call goes to the single LLM_BACKEND.
+model_tiers_spec = os.environ.get("MODEL_TIERS")
+if model_tiers_spec:
+    if not model_tiers_spec.lstrip().startswith("["):
+        with open(model_tiers_spec, encoding="utf-8") as f:
+            model_tiers_spec = f.read()
+    model_tiers = load_tiers(json.loads(model_tiers_spec), max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+else:
+    llm_backend = get_backend()
+    model_tiers = [
+        ModelTier(
+            name="default",
+            backend=llm_backend,
+            batcher=MicroBatcher(llm_backend, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS),
+        )
+    ]
+# PII is redacted from every prompt before it leaves the backend.
+redactor = Redactor.from_file(os.environ.get("REDACTION_TERMS_FILE")) if os.environ.get("REDACTION_ENABLED", "1") == "1" else None
+router = ModelRouter(
+    model_tiers,
+    default_slo_ms={
+        operation: float(os.environ[f"{operation.upper()}_SLO_MS"])
+        for operation in ("generate_email", "summarize_email", "ai_assistant")
+        if os.environ.get(f"{operation.upper()}_SLO_MS")
+    },
+    redactor=redactor,
+)
+
+summary_cache = ResponseCache(
+    max_entries=int(os.environ.get("SUMMARY_CACHE_MAX_ENTRIES", "10000")),
+    max_bytes=int(os.environ.get("SUMMARY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.environ.get("SUMMARY_CACHE_TTL_SECONDS", str(24 * 3600))),
+    db_path=os.environ.get("SUMMARY_CACHE_DB"),
+)
+normalization_stats = NormalizationStats()
+admission = AdmissionController(
+    max_concurrency=int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "64")),
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", "256")),
+    user_rate=float(os.environ.get("ADMISSION_USER_RATE", "5")),
+    user_burst=float(os.environ.get("ADMISSION_USER_BURST", "20")),
 )
+in_flight = SingleFlight()
+jobs = EmailJobManager(
+    workers=int(os.environ.get("JOB_WORKERS", "4")),
+    max_pending=int(os.environ.get("JOB_MAX_PENDING", "1000")),
+    retention_seconds=float(os.environ.get("JOB_RETENTION_SECONDS", "3600")),
+)
+static_bundle = StaticBundle(
+    os.environ.get("STATIC_ROOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dist")),
+    brotli_quality=int(os.environ.get("STATIC_BROTLI_QUALITY", "11")),
+    include_source_maps=os.environ.get("STATIC_INCLUDE_SOURCE_MAPS", "0") == "1",
+)
+conversations = ConversationStore(max_conversations=int(os.environ.get("CONVERSATION_CACHE_MAX", "5000")))
+
+for tier in router.tiers:
+    metrics.register_stats(f"batching_{tier.name}", tier.batcher.stats)
+    if hasattr(tier.backend, "stats"):
+        metrics.register_stats(
+            f"upstream_{tier.name}", tier.backend.stats,
+            counters=("requests", "retried", "failures", "hedged", "hedge_wins", "circuit_trips"),
+        )
+metrics.register_stats("routing", router.counters, counters=("slo_misses", "routed_*"))
+metrics.register_stats("static", static_bundle.stats, counters=("*_bytes_saved",))
+if redactor is not None:
+    metrics.register_stats("redaction", redactor.stats, counters=("requests", "bytes_scanned", "redacted_*"))
+metrics.register_stats(
+    "summary_cache", summary_cache.stats, counters=("hits", "disk_hits", "misses", "evictions", "expirations")
+)
+metrics.register_stats(
+    "normalization", normalization_stats.stats,
+    counters=("requests", "bytes_in", "bytes_removed", "tokens_in", "tokens_removed", "truncated"),
+)
+metrics.register_stats("conversations", conversations.stats, counters=("messages_folded", "messages_skipped"))
+metrics.register_stats("singleflight", in_flight.stats, counters=("executed", "coalesced", "abandoned"))
+metrics.register_stats("jobs", jobs.stats)
+metrics.register_stats("admission", admission.stats, counters=("admitted", "rejected_*"))
+metrics.register_stats("logging", lambda: {"dropped_records": log_handler.dropped}, counters=("dropped_records",))
+
+# Bump when any prompt template changes so cached responses are not reused.
+PROMPT_VERSION = "1"
+PROMPTS = {
+    "generate_email": "Write a complete, professional email based on the following context.\n\n{content}",
+    "summarize_email": "Summarize the following email concisely.\n\n{content}",
+    "ai_assistant": "You are an email assistant. Help the user with the following email.\n\n{content}",
+    "update_summary": (
+        "Update the running summary of an email conversation with the new messages below.\n\n"
+        "Summary so far:\n{summary}\n\nNew messages:\n\n{content}"
+    ),
+    "summarize_chunk": (
+        "Summarize this section of a longer document concisely, keeping names, figures and decisions.\n\n{content}"
+    ),
+    "merge_summaries": (
+        "Combine these summaries of consecutive sections of one document into a single concise summary.\n\n{content}"
+    ),
+}
 
 # This would typically come from a database
 user_configs = {
@@ -64,14 +192,173 @@ user_configs = {
 }
 
 
+config_store = UserConfigStore(user_configs, source=os.environ.get("USER_CONFIG_SOURCE"))
+
+
+@app.on_event("startup")
+async def start_config_reload():
+    if config_store.source:
+        config_store.reload()
+        interval = float(os.environ.get("USER_CONFIG_RELOAD_SECONDS", "5"))
+        app.state.config_watcher = asyncio.create_task(config_store.watch(interval))
+
+
+@app.on_event("startup")
+async def load_static_bundle():
+    if os.path.isdir(static_bundle.root):
+        # Precompression is CPU-bound; keep it off the event loop.
+        await asyncio.get_running_loop().run_in_executor(None, static_bundle.load)
+
+
+@app.on_event("shutdown")
+async def close_summary_cache():
+    await asyncio.to_thread(summary_cache.close)
+
+
+@app.on_event("shutdown")
+async def close_llm_backends():
+    for tier in router.tiers:
+        if hasattr(tier.backend, "aclose"):
+            await tier.backend.aclose()
+
+
 class EmailRequest(BaseModel):
     userId: str
     emailContent: str
+    conversationId: Optional[str] = None
 
 
 class EmailResponse(BaseModel):
     originalContent: str
-    generatedContent: str = ""  # This will be used later for LLM-generated content
+    generatedContent: str = ""
+
+
+class BatchItem(BaseModel):
+    id: str
+    emailContent: str
+
+
+class BatchSummarizeRequest(BaseModel):
+    userId: str
+    items: List[BatchItem]
+    parallelism: Optional[int] = None
+
+
+INPUT_TOKEN_BUDGET = int(os.environ.get("INPUT_TOKEN_BUDGET", "6000"))
+# Summaries of longer inputs (up to LONG_INPUT_TOKEN_BUDGET) go through map-reduce.
+LONG_INPUT_TOKEN_BUDGET = int(os.environ.get("LONG_INPUT_TOKEN_BUDGET", "200000"))
+MAPREDUCE_CHUNK_TOKENS = int(os.environ.get("MAPREDUCE_CHUNK_TOKENS", "3000"))
+MAPREDUCE_PARALLELISM = int(os.environ.get("MAPREDUCE_PARALLELISM", "8"))
+UPLOAD_MAX_BODY_BYTES = int(os.environ.get("UPLOAD_MAX_BODY_BYTES", str(32 * 1024 * 1024)))
+UPLOAD_MAX_DECODED_BYTES = int(os.environ.get("UPLOAD_MAX_DECODED_BYTES", str(64 * 1024 * 1024)))
+SUMMARIZE_BATCH_MAX_ITEMS = int(os.environ.get("SUMMARIZE_BATCH_MAX_ITEMS", "200"))
+SUMMARIZE_BATCH_MAX_PARALLELISM = int(os.environ.get("SUMMARIZE_BATCH_MAX_PARALLELISM", "8"))
+
+
+class PreparedContent(str):
+    """Email content that was already normalized while its upload was streamed in."""
+
+
+def prepare_content(content: str, operation: str, collapse_quotes: bool = True, token_budget: Optional[int] = INPUT_TOKEN_BUDGET) -> str:
+    """Strip markup, quoted history, disclaimers and signatures before a model call."""
+    if isinstance(content, PreparedContent):
+        return content
+    result = normalize_email(content, token_budget=token_budget, collapse_quotes=collapse_quotes)
+    normalization_stats.record(result)
+    logger.info(
+        "Normalized %s input: removed %d of %d bytes, ~%d of %d tokens",
+        operation,
+        result.bytes_removed,
+        result.original_bytes,
+        result.tokens_removed,
+        result.original_tokens,
+    )
+    return result.text
+
+
+def build_prompt(operation: str, content: str, **fields: str) -> str:
+    return PROMPTS[operation].format(content=content, **fields)
+
+
+def latency_slo(user_id: str) -> Optional[float]:
+    """The user's configured latency SLO in ms (`latencySloMs`), if any."""
+    return config_store.get(user_id).latency_slo_ms
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+async def replay(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+class EventStreamResponse(StreamingResponse):
+    """SSE response over a stream of `(event, data)` pairs.
+
+    `event` is None for plain data frames. The pairs stay available as
+    `events` so the session WebSocket can relay the same stream. An admission
+    `ticket` is held until the stream ends.
+    """
+
+    def __init__(self, events: AsyncIterator[Tuple[Optional[str], dict]], ticket: Optional[Ticket] = None):
+        self.events = events
+        self.ticket = ticket
+        super().__init__(
+            self._frames(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def _frames(self) -> AsyncIterator[str]:
+        async for event, data in self.events:
+            yield sse_event(data, event=event)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.ticket is not None:
+                self.ticket.release()
+
+
+def sse_response(
+    operation: str,
+    chunks: AsyncIterator[str],
+    final: Callable[[str], dict],
+    on_complete: Optional[Callable[[str], None]] = None,
+    ticket: Optional[Ticket] = None,
+) -> EventStreamResponse:
+    """Stream `chunks` as SSE.
+
+    Each chunk is sent as a `data: {"delta": ...}` frame as soon as it is
+    produced; the last frame is a `done` event carrying `final(text)`, the
+    same body the non-streaming endpoint would have returned.
+    """
+
+    async def events() -> AsyncIterator[Tuple[Optional[str], dict]]:
+        parts = []
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield None, {"delta": chunk}
+            text = "".join(parts)
+            if on_complete is not None:
+                on_complete(text)
+            yield "done", final(text)
+        except Exception as e:
+            logger.error("Error while streaming %s: %s", operation, e)
+            yield "error", {"detail": str(e)}
+
+    return EventStreamResponse(events(), ticket=ticket)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    logger.warning("Rejected %s %s: %s", request.method, request.url.path, exc.reason)
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": exc.retry_after_header})
 
 
 @app.get("/getUserId")
@@ -81,39 +368,588 @@ async def get_user_id():
 
 
 @app.get("/getUserConfig/{user_id}")
-async def get_user_config(user_id: str):
-    logger.info(f"Received request for getUserConfig for user: {user_id}")
+async def get_user_config(user_id: str, request: Request):
+    logger.info("Received request for getUserConfig for user: %s", user_id)
     try:
-        config = user_configs.get(user_id, user_configs["default"])
-        logger.info(f"Returning config for user: {user_id}")
-        return JSONResponse(content=config)
+        entry = config_store.get(user_id)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        logger.info("Returning config for user: %s", user_id)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
     except Exception as e:
-        logger.error(f"Error in getUserConfig: {str(e)}")
+        logger.error("Error in getUserConfig: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/generate_email", response_model=EmailResponse)
-async def generate_email(request: EmailRequest):
-    logger.info(f"Received generate_email request for user: {request.userId}")
+async def generate_email(request: EmailRequest, stream: bool = False, async_job: bool = False):
+    logger.info("Received generate_email request for user: %s", request.userId)
+    if async_job:
+        admission.check_rate(request.userId)
+        return submit_generate_job(request)
+    ticket = await admission.acquire(request.userId, Priority.INTERACTIVE)
+    return await generate_email_admitted(request, stream, ticket)
+
+
+async def generate_email_admitted(request: EmailRequest, stream: bool, ticket: Ticket):
+    """generate_email under an admission `ticket`; a streaming response takes it over, otherwise it is released."""
+    response = None
     try:
-        # For now, we're just echoing back the original content
-        # Later, we'll add LLM processing here
-        return EmailResponse(originalContent=request.emailContent)
+        content = prepare_content(request.emailContent, "generate_email")
+        if stream:
+            response = sse_response(
+                "generate_email",
+                router.stream("generate_email", build_prompt("generate_email", content), latency_slo(request.userId)),
+                lambda text: EmailResponse(originalContent=request.emailContent, generatedContent=text).dict(),
+                ticket=ticket,
+            )
+            return response
+        generated = await complete_once("generate_email", content, request.userId)
+        return EmailResponse(originalContent=request.emailContent, generatedContent=generated)
     except Exception as e:
-        logger.error(f"Error in generate_email: {str(e)}")
+        logger.error("Error in generate_email: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # A streaming response releases the ticket itself once the stream ends.
+        if not isinstance(response, EventStreamResponse):
+            ticket.release()
+
+
+def submit_generate_job(request: EmailRequest) -> JSONResponse:
+    """Queue generation as a background job and return its ID right away (the caller checks the rate limit)."""
+    content = prepare_content(request.emailContent, "generate_email")
+
+    async def run(job: EmailJob, on_delta: Callable[[str], None]) -> dict:
+        parts = []
+        async for chunk in router.stream("generate_email", build_prompt("generate_email", content), latency_slo(request.userId)):
+            parts.append(chunk)
+            on_delta(chunk)
+        return EmailResponse(originalContent=request.emailContent, generatedContent="".join(parts)).dict()
+
+    try:
+        job = jobs.submit(request.userId, "generate_email", run)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    logger.info("Queued generate_email job %s for user: %s", job.job_id, request.userId)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "jobId": job.job_id,
+            "status": job.status.value,
+            "statusUrl": f"/jobs/{job.job_id}",
+            "eventsUrl": f"/jobs/{job.job_id}/events",
+            "websocketUrl": f"/jobs/{job.job_id}/ws",
+        },
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.snapshot()
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has already started")
+    return jobs.get(job_id).snapshot()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """SSE feed of a job: a snapshot of progress so far, then deltas until it finishes."""
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    return EventStreamResponse(jobs.subscribe(job_id))
+
+
+@app.websocket("/jobs/{job_id}/ws")
+async def job_events_ws(websocket: WebSocket, job_id: str):
+    """The same feed as /jobs/{job_id}/events, one JSON message per event."""
+    await websocket.accept()
+    if jobs.get(job_id) is None:
+        await websocket.close(code=4404)
+        return
+    try:
+        async for event, data in jobs.subscribe(job_id):
+            await websocket.send_json({"event": event, "data": data})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
 
 
 @app.post("/summarize_email")
-async def summarize_email(request: EmailRequest):
-    logger.info(f"Received summarize_email request for user: {request.userId}")
-    return {"body": f"Summarized email for user {request.userId}"}
+async def summarize_email(request: EmailRequest, stream: bool = False):
+    logger.info("Received summarize_email request for user: %s", request.userId)
+    ticket = await admission.acquire(request.userId, Priority.STANDARD)
+    return await summarize_email_admitted(request, stream, ticket)
+
+
+async def summarize_email_admitted(request: EmailRequest, stream: bool, ticket: Ticket):
+    """summarize_email under an admission `ticket`; a streaming response takes it over, otherwise it is released."""
+    response = None
+    try:
+        if request.conversationId:
+            response = await summarize_conversation(request, stream, ticket)
+            return response
+        content = prepare_content(request.emailContent, "summarize_email", token_budget=LONG_INPUT_TOKEN_BUDGET)
+        if stream:
+            key = cache_key("summarize_email", content, PROMPT_VERSION)
+            cached = await summary_cache.aget(key)
+            if cached is not None:
+                response = sse_response("summarize_email", replay(cached), lambda text: {"body": text}, ticket=ticket)
+            elif estimate_tokens(content) > INPUT_TOKEN_BUDGET:
+                response = EventStreamResponse(summarize_long_events(content, key, latency_slo(request.userId)), ticket=ticket)
+            else:
+                response = sse_response(
+                    "summarize_email",
+                    router.stream("summarize_email", build_prompt("summarize_email", content), latency_slo(request.userId)),
+                    lambda text: {"body": text},
+                    on_complete=lambda text: summary_cache.set(key, text),
+                    ticket=ticket,
+                )
+            return response
+        return {"body": await summarize(content, latency_slo(request.userId))}
+    except Exception as e:
+        logger.error("Error in summarize_email for user %s: %s", request.userId, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # A streaming response releases the ticket itself once the stream ends.
+        if not isinstance(response, EventStreamResponse):
+            ticket.release()
+
+
+def fold_prompt(summary: str, new_messages: List[str]) -> str:
+    content = "\n\n---\n\n".join(new_messages)
+    if not summary:
+        return build_prompt("summarize_email", content)
+    return build_prompt("update_summary", content, summary=summary)
+
+
+async def summarize_conversation(request: EmailRequest, stream: bool, ticket: Ticket):
+    """Fold only the messages not yet seen in this conversation into its running summary.
+
+    A streaming response takes over `ticket`; otherwise the caller releases it.
+    """
+    user_id, conversation_id = request.userId, request.conversationId
+    # Quoted history is what tells us which messages are already summarized.
+    content = prepare_content(request.emailContent, "summarize_email", collapse_quotes=False, token_budget=None)
+    if stream:
+
+        async def folded() -> AsyncIterator[str]:
+            # Held for the whole stream, so concurrent folds can't both treat the same messages as new.
+            async with conversations.lock(user_id, conversation_id):
+                summary, new_messages, hashes = conversations.plan(user_id, conversation_id, content)
+                if not new_messages:
+                    yield summary
+                    return
+                parts = []
+                async for chunk in router.stream("summarize_email", fold_prompt(summary, new_messages), latency_slo(user_id)):
+                    parts.append(chunk)
+                    yield chunk
+                conversations.commit(user_id, conversation_id, "".join(parts), hashes)
+
+        return sse_response("summarize_email", folded(), lambda text: {"body": text}, ticket=ticket)
+    async with conversations.lock(user_id, conversation_id):
+        summary, new_messages, hashes = conversations.plan(user_id, conversation_id, content)
+        if new_messages:
+            summary = await router.complete("summarize_email", fold_prompt(summary, new_messages), latency_slo(user_id))
+            conversations.commit(user_id, conversation_id, summary, hashes)
+    return {"body": summary}
+
+
+async def summarize(content: str, slo_ms: Optional[float] = None, limit: Optional[asyncio.Semaphore] = None) -> str:
+    """Summarize already normalized `content`, going through the response cache.
+
+    With `limit`, every model call it makes (including map-reduce chunks) holds the semaphore.
+    """
+    key = cache_key("summarize_email", content, PROMPT_VERSION)
+    cached = await summary_cache.aget(key)
+    if cached is not None:
+        return cached
+
+    async def compute() -> str:
+        if estimate_tokens(content) > INPUT_TOKEN_BUDGET:
+            summary = await map_reduce(slo_ms, limit).run(content)
+        else:
+            summary = await complete_limited(build_prompt("summarize_email", content), slo_ms, limit)
+        summary_cache.set(key, summary)
+        return summary
+
+    return await in_flight.do(key, compute)
+
+
+async def complete_limited(prompt: str, slo_ms: Optional[float], limit: Optional[asyncio.Semaphore]) -> str:
+    if limit is None:
+        return await router.complete("summarize_email", prompt, slo_ms)
+    async with limit:
+        return await router.complete("summarize_email", prompt, slo_ms)
+
+
+def map_reduce(slo_ms: Optional[float], limit: Optional[asyncio.Semaphore] = None) -> MapReduceSummarizer:
+    return MapReduceSummarizer(
+        lambda chunk: complete_limited(build_prompt("summarize_chunk", chunk), slo_ms, limit),
+        lambda summaries: complete_limited(merge_prompt(summaries), slo_ms, limit),
+        chunk_tokens=MAPREDUCE_CHUNK_TOKENS,
+        merge_tokens=MAPREDUCE_CHUNK_TOKENS,
+        parallelism=MAPREDUCE_PARALLELISM,
+    )
+
+
+def merge_prompt(summaries: List[str]) -> str:
+    return build_prompt("merge_summaries", "\n\n---\n\n".join(summaries))
+
+
+async def summarize_long_events(content: str, key: str, slo_ms: Optional[float]) -> AsyncIterator[Tuple[Optional[str], dict]]:
+    """Map-reduce summary as SSE events.
+
+    Each chunk summary is sent as a `partial` event (`{"index", "total",
+    "summary"}`) as soon as it is ready; the final merge then streams as
+    ordinary delta frames, followed by the usual `done` event.
+    """
+    summarizer = map_reduce(slo_ms)
+    try:
+        summaries: List[str] = []
+        async for index, total, summary in summarizer.summarize_chunks(content):
+            if not summaries:
+                summaries = [""] * total
+            summaries[index] = summary
+            yield "partial", {"index": index, "total": total, "summary": summary}
+        collapsed = await summarizer.collapse(summaries)
+        if len(collapsed) == 1:
+            chunks = replay(collapsed[0])
+        else:
+            chunks = router.stream("summarize_email", merge_prompt(collapsed), slo_ms)
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield None, {"delta": chunk}
+        text = "".join(parts)
+        summary_cache.set(key, text)
+        yield "done", {"body": text}
+    except Exception as e:
+        logger.error("Error while streaming summarize_email: %s", e)
+        yield "error", {"detail": str(e)}
+
+
+async def complete_once(operation: str, content: str, user_id: str) -> str:
+    """Complete `operation` for `content`, sharing the call with identical in-flight requests."""
+    key = cache_key(operation, content, PROMPT_VERSION)
+    return await in_flight.do(key, lambda: router.complete(operation, build_prompt(operation, content), latency_slo(user_id)))
+
+
+@app.post("/summarize_batch")
+async def summarize_batch(request: BatchSummarizeRequest):
+    """Summarize many messages in one call, streaming each result as it completes.
+
+    Results arrive as SSE `result` events (`{"id", "body"}` or `{"id", "error"}`)
+    in completion order, followed by a `done` event with the totals. A failing
+    item only produces an error result for that item. Long items are map-reduced
+    like in /summarize_email. The batch is admitted at a cost of one per item, and
+    at most that many of its model calls (chunk calls included) run at once.
+    """
+    logger.info("Received summarize_batch request for user: %s (%d items)", request.userId, len(request.items))
+    if len(request.items) > SUMMARIZE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {SUMMARIZE_BATCH_MAX_ITEMS} items per batch")
+    cost = len(request.items)
+    ticket = await admission.acquire(request.userId, Priority.BACKGROUND, cost=cost)
+    parallelism = max(1, min(request.parallelism or SUMMARIZE_BATCH_MAX_PARALLELISM, SUMMARIZE_BATCH_MAX_PARALLELISM, cost))
+    # Shared by all of the batch's model calls, so map-reduced items can't widen the fan-out.
+    model_calls = asyncio.Semaphore(parallelism)
+
+    async def run_item(item: BatchItem) -> dict:
+        try:
+            content = prepare_content(item.emailContent, "summarize_batch", token_budget=LONG_INPUT_TOKEN_BUDGET)
+            return {"id": item.id, "body": await summarize(content, latency_slo(request.userId), limit=model_calls)}
+        except Exception as e:
+            logger.error("Error in summarize_batch item %s: %s", item.id, e)
+            return {"id": item.id, "error": str(e)}
+
+    async def events() -> AsyncIterator[Tuple[Optional[str], dict]]:
+        tasks = [asyncio.ensure_future(run_item(item)) for item in request.items]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                failed += "error" in result
+                yield "result", result
+            yield "done", {"total": len(tasks), "failed": failed}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return EventStreamResponse(events(), ticket=ticket)
 
 
 @app.post("/ai_assistant")
 async def ai_assistant(request: EmailRequest):
-    logger.info(f"Received ai_assistant request for user: {request.userId}")
-    return {"body": f"AI Assistant response for user {request.userId}"}
+    logger.info("Received ai_assistant request for user: %s", request.userId)
+    ticket = await admission.acquire(request.userId, Priority.INTERACTIVE)
+    return await ai_assistant_admitted(request, ticket)
+
+
+async def ai_assistant_admitted(request: EmailRequest, ticket: Ticket):
+    """ai_assistant under an admission `ticket`, which is released when it returns."""
+    try:
+        content = prepare_content(request.emailContent, "ai_assistant")
+        return {"body": await complete_once("ai_assistant", content, request.userId)}
+    except Exception as e:
+        logger.error("Error in ai_assistant: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        ticket.release()
+
+
+SESSION_ACTIONS = {
+    "generate_email": generate_email,
+    "summarize_email": summarize_email,
+    "ai_assistant": ai_assistant,
+}
+ACTION_PRIORITY = {
+    "generate_email": Priority.INTERACTIVE,
+    "summarize_email": Priority.STANDARD,
+    "ai_assistant": Priority.INTERACTIVE,
+}
+
+
+@app.post("/upload/{action}")
+async def upload_email(
+    action: str,
+    request: Request,
+    userId: str,
+    conversationId: Optional[str] = None,
+    stream: bool = False,
+    async_job: bool = False,
+):
+    """Run an action on a raw email body streamed in with the request.
+
+    The body is the email itself (text/plain or text/html, with its charset in
+    Content-Type), optionally chunked and compressed with Content-Encoding.
+    It is normalized as it arrives, so memory stays bounded however large the
+    email is; the normalized text then goes through the same handler as the
+    JSON endpoint. Oversized bodies get 413 and unknown encodings 415.
+    """
+    if action not in SESSION_ACTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown action: {action}")
+    # Admission comes first, so a rejected request costs no decompression or parsing.
+    if action == "generate_email" and async_job:
+        admission.check_rate(userId)
+        return submit_generate_job(await read_upload(action, request, userId, conversationId))
+    ticket = await admission.acquire(userId, ACTION_PRIORITY[action])
+    try:
+        email = await read_upload(action, request, userId, conversationId)
+    except BaseException:
+        ticket.release()
+        raise
+    if action == "generate_email":
+        return await generate_email_admitted(email, stream, ticket)
+    if action == "summarize_email":
+        return await summarize_email_admitted(email, stream, ticket)
+    return await ai_assistant_admitted(email, ticket)
+
+
+async def read_upload(action: str, request: Request, userId: str, conversationId: Optional[str]) -> EmailRequest:
+    """Stream the upload body through a normalizer set up for `action`."""
+    if action == "summarize_email" and conversationId:
+        # Same settings as summarize_conversation: the quoted history is needed.
+        normalizer = EmailNormalizer(token_budget=None, collapse_quotes=False)
+    else:
+        normalizer = EmailNormalizer(token_budget=LONG_INPUT_TOKEN_BUDGET if action == "summarize_email" else INPUT_TOKEN_BUDGET)
+    content_type = request.headers.get("content-type", "")
+    charset = content_type.partition("charset=")[2].split(";")[0].strip().strip('"') or "utf-8"
+    content_length = request.headers.get("content-length")
+    try:
+        await ingest(
+            request.stream(),
+            normalizer,
+            content_encoding=request.headers.get("content-encoding"),
+            charset=charset,
+            content_length=int(content_length) if content_length else None,
+            max_body_bytes=UPLOAD_MAX_BODY_BYTES,
+            max_decoded_bytes=UPLOAD_MAX_DECODED_BYTES,
+        )
+    except BodyTooLarge as e:
+        logger.warning("Rejected upload for user %s: %s", userId, e)
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedEncoding as e:
+        raise HTTPException(status_code=415, detail=str(e), headers={"Accept-Encoding": supported_encodings()})
+    result = normalizer.close()
+    normalization_stats.record(result)
+    logger.info("Streamed %s upload: kept ~%d of %d tokens", action, result.original_tokens - result.tokens_removed, result.original_tokens)
+    # construct() keeps the PreparedContent marker that validation would coerce away.
+    return EmailRequest.construct(userId=userId, emailContent=PreparedContent(result.text), conversationId=conversationId)
+
+
+@app.websocket("/ws")
+async def session_channel(websocket: WebSocket):
+    """Multiplexed session channel for the taskpane.
+
+    One connection carries session setup, config delivery and every action,
+    as JSON frames tagged with a client-chosen `id`:
+
+      {"id", "type": "hello", "userId"?}  -> {"id", "type": "hello", "userId", "etag", "config"}
+      {"id", "type": "config", "userId"?, "etag"?}
+                                          -> {"id", "type": "config", "etag", "config"} or {..., "notModified": true}
+      {"id", "type": "action", "action", "emailContent", "conversationId"?, "stream"?, "async"?}
+                                          -> {"id", "type": "delta", "delta"}... then {"id", "type": "result", ...}
+      {"id", "type": "subscribe", "jobId"} -> pushed {"id", "type": "job", "jobId", "event", "data"} frames
+
+    An async generate_email action is acknowledged with an `accepted` frame
+    and its job events are pushed on the same connection. Failures come back
+    as {"id", "type": "error", "status", "detail"}. Frames are handled
+    concurrently, so a slow action doesn't hold up the others.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    tasks: set = set()
+    session = {"userId": None}
+
+    async def send(frame: dict) -> None:
+        async with send_lock:
+            await websocket.send_json(frame)
+
+    async def send_config(frame_id, kind: str, user_id: str, etag: Optional[str] = None, **extra) -> None:
+        entry = config_store.get(user_id)
+        header = {"id": frame_id, "type": kind, "etag": entry.etag, **extra}
+        if etag_matches(etag, entry.etag):
+            await send({**header, "notModified": True})
+            return
+        # Splice the pre-serialized config in rather than re-encoding it.
+        async with send_lock:
+            await websocket.send_text(json.dumps(header)[:-1] + ',"config":' + entry.body.decode("utf-8") + "}")
+
+    async def push_job(frame_id, job_id: str) -> None:
+        async for event, data in jobs.subscribe(job_id):
+            await send({"id": frame_id, "type": "job", "jobId": job_id, "event": event, "data": data})
+
+    async def run_action(frame_id, frame: dict) -> None:
+        action = frame.get("action")
+        handler = SESSION_ACTIONS.get(action)
+        if handler is None:
+            raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
+        request = EmailRequest(
+            userId=frame.get("userId") or session["userId"] or "default",
+            emailContent=frame.get("emailContent", ""),
+            conversationId=frame.get("conversationId"),
+        )
+        if frame.get("async") and action == "generate_email":
+            admission.check_rate(request.userId)
+            accepted = json.loads(submit_generate_job(request).body)
+            await send({"id": frame_id, "type": "accepted", **accepted})
+            await push_job(frame_id, accepted["jobId"])
+        elif frame.get("stream") and action != "ai_assistant":
+            response = await handler(request, stream=True)
+            try:
+                async for event, data in response.events:
+                    await send({"id": frame_id, "type": {None: "delta", "done": "result"}.get(event, event), **data})
+            finally:
+                if response.ticket is not None:
+                    response.ticket.release()
+        else:
+            result = await handler(request)
+            body = result.dict() if isinstance(result, BaseModel) else result
+            await send({"id": frame_id, "type": "result", **body})
+
+    async def handle(frame: dict) -> None:
+        frame_id = frame.get("id")
+        kind = frame.get("type")
+        try:
+            if kind == "hello":
+                session["userId"] = frame.get("userId") or (await get_user_id())["userId"]
+                await send_config(frame_id, "hello", session["userId"], frame.get("etag"), userId=session["userId"])
+            elif kind == "config":
+                await send_config(frame_id, "config", frame.get("userId") or session["userId"] or "default", frame.get("etag"))
+            elif kind == "action":
+                await run_action(frame_id, frame)
+            elif kind == "subscribe":
+                if jobs.get(frame.get("jobId")) is None:
+                    raise HTTPException(status_code=404, detail=f"Job {frame.get('jobId')} not found")
+                await push_job(frame_id, frame["jobId"])
+            else:
+                raise HTTPException(status_code=400, detail=f"Unknown frame type: {kind}")
+        except HTTPException as e:
+            await send({"id": frame_id, "type": "error", "status": e.status_code, "detail": e.detail})
+        except AdmissionRejected as e:
+            await send({"id": frame_id, "type": "error", "status": 429, "detail": str(e), "retryAfter": e.retry_after})
+        except ValidationError as e:
+            await send({"id": frame_id, "type": "error", "status": 400, "detail": str(e)})
+        except Exception as e:
+            logger.error("Error in session frame %s (%s): %s", frame_id, kind, e)
+            await send({"id": frame_id, "type": "error", "status": 500, "detail": str(e)})
+
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                frame = json.loads(raw)
+            except ValueError:
+                await send({"id": None, "type": "error", "status": 400, "detail": "Frames must be JSON objects"})
+                continue
+            if not isinstance(frame, dict):
+                await send({"id": None, "type": "error", "status": 400, "detail": "Frames must be JSON objects"})
+                continue
+            task = asyncio.ensure_future(handle(frame))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.api_route("/addin/{path:path}", methods=["GET", "HEAD"])
+async def addin_static(path: str, request: Request, v: Optional[str] = None):
+    """The built add-in (`dist/`), precompressed and served with content-hash caching."""
+    response = static_bundle.serve(
+        path or "taskpane.html",
+        version=v,
+        accept_encoding=request.headers.get("accept-encoding"),
+        if_none_match=request.headers.get("if-none-match"),
+        range_header=request.headers.get("range"),
+        if_range=request.headers.get("if-range"),
+        head=request.method == "HEAD",
+    )
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"{path} not found")
+    return Response(content=response.body, status_code=response.status, headers=response.headers)
+
+
+@app.get("/stats/batching")
+async def batching_stats():
+    return {tier.name: tier.batcher.stats() for tier in router.tiers}
+
+
+@app.get("/stats/routing")
+async def routing_stats():
+    return router.stats()
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    return summary_cache.stats()
+
+
+@app.get("/stats/normalization")
+async def normalization_stats_endpoint():
+    return normalization_stats.stats()
+
+
+@app.get("/stats/conversations")
+async def conversation_stats():
+    return conversations.stats()
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+"""Dynamic micro-batching of concurrent completion requests.
+
+Handlers call `MicroBatcher.submit(prompt)` and await the result. Prompts that
+arrive within `max_wait_ms` of the first queued one are sent to the backend as
+a single `complete_batch` call; a batch is flushed early once it reaches
+`max_batch_size`. Each result is routed back to the future of the handler that
+submitted it.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import List, Optional, Set, Tuple
+
+from llm import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collects concurrent prompts into batched backend calls."""
+
+    def __init__(self, backend: LLMBackend, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks; hold in-flight batches here.
+        self._tasks: Set[asyncio.Task] = set()
+        self._in_flight = 0
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes: Counter = Counter()
+        self._queue_wait_total = 0.0
+
+    async def submit(self, prompt: str) -> str:
+        """Queue `prompt` for the next batch and wait for its completion."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prompt, future, time.perf_counter()))
+        self._requests += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[: self.max_batch_size], self._pending[self.max_batch_size:]
+            # Callers that gave up while queued don't take a slot in the batch.
+            batch = [item for item in batch if not item[1].done()]
+            if batch:
+                task = asyncio.ensure_future(self._run(batch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        started = time.perf_counter()
+        self._in_flight += 1
+        self._batches += 1
+        self._batch_sizes[len(batch)] += 1
+        self._queue_wait_total += sum(started - queued_at for _, _, queued_at in batch)
+        try:
+            results = await self.backend.complete_batch([prompt for prompt, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Backend returned {len(results)} results for a batch of {len(batch)}")
+        except Exception as e:
+            logger.error("Batched inference failed for %d requests: %s", len(batch), e)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= 1
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Queue-depth and batch-size counters for tuning the wait window."""
+        batched = sum(size * count for size, count in self._batch_sizes.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": len(self._pending),
+            "in_flight_batches": self._in_flight,
+            "requests_total": self._requests,
+            "batches_total": self._batches,
+            "mean_batch_size": batched / self._batches if self._batches else 0.0,
+            "mean_queue_wait_ms": self._queue_wait_total / batched * 1000 if batched else 0.0,
+            "batch_size_counts": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+        }
@@ -0,0 +1,213 @@
+"""Load test for the email backend with a deterministic stub model.
+
+Drives /getUserConfig, /generate_email, /summarize_email and /ai_assistant
+with a weighted request mix, realistic (log-normal) email sizes and a ramp of
+concurrency levels. Reports RPS, p50/p95/p99 latency and CPU per request for
+every stage and saves everything as JSON so runs can be compared.
+
+In-process (default): the app is imported and called through httpx's ASGI
+transport, with the stub backend's latency set from the command line.
+
+    python bench_load.py --ramp 1,8,32,128 --duration 10 --out results.json
+
+Against a running server (e.g. `uvicorn app:app --port 8001 --workers 1`
+started with STUB_LLM_FIRST_TOKEN_MS / STUB_LLM_TOKEN_MS set); pass its pid to
+also measure server CPU:
+
+    python bench_load.py --url http://localhost:8001 --server-pid 1234
+
+Compare against an earlier run; exits non-zero on a regression:
+
+    python bench_load.py --compare baseline.json --out results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+WORDS = (
+    "please review the attached deck before our call tomorrow we need to confirm the allocation "
+    "for the fund and agree next steps on pricing client coverage quarterly numbers risk limits "
+    "settlement trade desk approval meeting follow up thanks regards budget forecast schedule"
+).split()
+
+MIX = {"getUserConfig": 0.25, "generate_email": 0.25, "summarize_email": 0.4, "ai_assistant": 0.1}
+
+
+def make_email(rng: random.Random, median_bytes: int) -> str:
+    """A synthetic email body; sizes are log-normal around `median_bytes`."""
+    target = max(64, int(rng.lognormvariate(0, 0.9) * median_bytes))
+    paragraphs, size = [], 0
+    while size < target:
+        paragraph = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))).capitalize() + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    body = "\n\n".join(paragraphs)
+    if rng.random() < 0.3:
+        body = "<html><body>" + "".join(f"<p style='font-family:Calibri'>{p}</p>" for p in paragraphs) + "</body></html>"
+    if rng.random() < 0.5:
+        body += "\n\nFrom: someone@example.com\nSent: Monday\n" + paragraphs[0]
+    return body
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize_latencies(latencies: List[float]) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def process_cpu_seconds(pid: Optional[int]) -> float:
+    """CPU time (user + system) of `pid`, or of this process when pid is None."""
+    if pid is None:
+        return time.process_time()
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def run_stage(client: httpx.AsyncClient, concurrency: int, duration: float, args, seed: int) -> dict:
+    rng = random.Random(seed)
+    emails = [make_email(rng, args.median_bytes) for _ in range(256)]
+    endpoints, weights = zip(*MIX.items())
+    latencies: Dict[str, List[float]] = {name: [] for name in endpoints}
+    statuses: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int):
+        worker_rng = random.Random(seed * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            endpoint = worker_rng.choices(endpoints, weights)[0]
+            user_id = f"user{worker_rng.randrange(args.users)}"
+            started = time.perf_counter()
+            if endpoint == "getUserConfig":
+                response = await client.get(f"/getUserConfig/{user_id}")
+            else:
+                payload = {"userId": user_id, "emailContent": worker_rng.choice(emails)}
+                response = await client.post(f"/{endpoint}", json=payload)
+            latencies[endpoint].append(time.perf_counter() - started)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    cpu_before = process_cpu_seconds(args.server_pid)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    cpu = process_cpu_seconds(args.server_pid) - cpu_before
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "requests": total,
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "cpu_ms_per_request": round(cpu / total * 1000, 4) if total else 0.0,
+        "statuses": statuses,
+        "overall": summarize_latencies([v for values in latencies.values() for v in values]),
+        "endpoints": {name: summarize_latencies(values) for name, values in latencies.items()},
+    }
+
+
+def make_client(args) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=max(args.ramp), max_keepalive_connections=max(args.ramp))
+    if args.url:
+        return httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60)
+    # The stub backend and limits are read from the environment at import time.
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["STUB_LLM_FIRST_TOKEN_MS"] = str(args.first_token_ms)
+    os.environ["STUB_LLM_TOKEN_MS"] = str(args.token_ms)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("ADMISSION_USER_RATE", "1000000")
+    os.environ.setdefault("ADMISSION_USER_BURST", "1000000")
+    os.environ.setdefault("ADMISSION_MAX_CONCURRENCY", "100000")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """Stages whose RPS dropped or p99 grew by more than `tolerance` (a fraction)."""
+    regressions = []
+    previous = {stage["concurrency"]: stage for stage in baseline["stages"]}
+    for stage in current["stages"]:
+        before = previous.get(stage["concurrency"])
+        if before is None:
+            continue
+        if stage["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"c={stage['concurrency']}: rps {before['rps']} -> {stage['rps']}")
+        if stage["overall"]["p99_ms"] > before["overall"]["p99_ms"] * (1 + tolerance):
+            regressions.append(f"c={stage['concurrency']}: p99 {before['overall']['p99_ms']}ms -> {stage['overall']['p99_ms']}ms")
+    return regressions
+
+
+async def main_async(args) -> dict:
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "out")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "started_at": time.time(),
+        "stages": [],
+    }
+    async with make_client(args) as client:
+        if args.warmup:
+            await run_stage(client, min(args.ramp), args.warmup, args, seed=args.seed - 1)
+        for i, concurrency in enumerate(args.ramp):
+            stage = await run_stage(client, concurrency, args.duration, args, seed=args.seed + i)
+            results["stages"].append(stage)
+            print(
+                f"c={concurrency:>4}  rps={stage['rps']:>9}  p50={stage['overall']['p50_ms']:>8}ms  "
+                f"p95={stage['overall']['p95_ms']:>8}ms  p99={stage['overall']['p99_ms']:>8}ms  "
+                f"cpu/req={stage['cpu_ms_per_request']}ms",
+                file=sys.stderr,
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the email backend")
+    parser.add_argument("--url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--server-pid", type=int, help="Pid of the server process, to measure its CPU")
+    parser.add_argument("--ramp", type=lambda v: [int(c) for c in v.split(",")], default=[1, 8, 32, 128])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency stage")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--median-bytes", type=int, default=2048)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--token-ms", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
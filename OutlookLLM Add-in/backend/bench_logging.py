@@ -0,0 +1,89 @@
+"""Measure event-loop stalls caused by logging from request handlers.
+
+Runs the same workload twice: once with a synchronous StreamHandler (what
+`logging.basicConfig` sets up) and once with the queue-based pipeline from
+`logging_setup`. Both write to a deliberately slow stream. A ticker coroutine
+wakes every millisecond and records how late it was; that lateness is the time
+the loop was blocked.
+
+    python bench_logging.py [--workers 200] [--records 20] [--write-delay-ms 0.5]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from logging_setup import setup_logging
+
+
+class SlowStream:
+    """File-like object whose writes take `delay` seconds (a slow disk or pipe)."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, data: str) -> int:
+        time.sleep(self.delay)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+async def run_workload(workers: int, records: int) -> dict:
+    logger = logging.getLogger("bench")
+    stop = asyncio.Event()
+    lags = []
+
+    async def ticker():
+        interval = 0.001
+        while not stop.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    async def handler(worker: int):
+        for i in range(records):
+            logger.info("Received summarize_email request for user: %s (%d)", f"user{worker}", i)
+            await asyncio.sleep(0)
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(w) for w in range(workers)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    lags.sort()
+    return {
+        "elapsed_s": round(elapsed, 4),
+        "stall_total_ms": round(sum(lags) * 1000, 2),
+        "stall_max_ms": round(lags[-1] * 1000, 2) if lags else 0.0,
+        "stall_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else 0.0,
+        "stall_mean_ms": round(statistics.fmean(lags) * 1000, 3) if lags else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=200)
+    parser.add_argument("--records", type=int, default=20)
+    parser.add_argument("--write-delay-ms", type=float, default=0.5)
+    args = parser.parse_args()
+    stream = SlowStream(args.write_delay_ms / 1000)
+
+    root = logging.getLogger()
+    sync_handler = logging.StreamHandler(stream)
+    root.handlers[:] = [sync_handler]
+    root.setLevel(logging.INFO)
+    results = {"sync": asyncio.run(run_workload(args.workers, args.records))}
+
+    handler = setup_logging(level=logging.INFO, queue_size=args.workers * args.records, stream=stream)
+    results["queued"] = asyncio.run(run_workload(args.workers, args.records))
+    results["queued"]["dropped_records"] = handler.dropped
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
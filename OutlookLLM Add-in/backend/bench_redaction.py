@@ -0,0 +1,116 @@
+"""Throughput of the PII redaction pass over a synthetic email corpus.
+
+Builds a corpus of emails that mention client names from a generated
+dictionary along with account numbers, IBANs, SEDOLs and phone numbers. The
+corpus is redacted with the single-pass `Redactor` and, for comparison, with
+one `re.sub` per pattern and per dictionary term. Both throughputs are
+reported in MB/s.
+
+    python bench_redaction.py [--megabytes 20] [--terms 5000] [--baseline-megabytes 0.1]
+"""
+import argparse
+import json
+import random
+import re
+import time
+from typing import List
+
+from redaction import Redactor
+
+WORDS = (
+    "please review the attached deck before our call tomorrow we need to confirm the allocation "
+    "for the fund and agree next steps on pricing client coverage quarterly numbers risk limits "
+    "settlement trade desk approval meeting follow up thanks regards budget forecast schedule"
+).split()
+NAME_PARTS = (
+    "north south east west river stone oak pine harbor summit crest bridge field park lake "
+    "silver golden granite cedar maple atlas apex vertex meridian orion polaris"
+).split()
+NAME_SUFFIXES = ("Capital", "Partners", "Holdings", "Asset Management", "Advisors", "Group", "Trust", "Investments")
+
+
+def make_terms(rng: random.Random, count: int) -> List[str]:
+    terms = set()
+    while len(terms) < count:
+        terms.add(f"{rng.choice(NAME_PARTS).title()}{rng.choice(NAME_PARTS)} {rng.choice(NAME_SUFFIXES)}")
+    return sorted(terms)
+
+
+def sedol(rng: random.Random) -> str:
+    chars = "".join(rng.choice("0123456789BCDFGHJKLMNPQRSTVWXYZ") for _ in range(6))
+    total = sum(w * (int(c) if c.isdigit() else ord(c) - 55) for w, c in zip((1, 3, 1, 7, 3, 9), chars))
+    return chars + str((10 - total % 10) % 10)
+
+
+def make_corpus(rng: random.Random, terms: List[str], megabytes: float) -> List[str]:
+    pii = (
+        lambda: rng.choice(terms),
+        lambda: str(rng.randrange(10 ** 9, 10 ** 12)),
+        lambda: f"GB{rng.randrange(10, 99)} WEST {rng.randrange(1000, 9999)} {rng.randrange(1000, 9999)} {rng.randrange(1000, 9999)}",
+        lambda: sedol(rng),
+        lambda: f"+44 20 {rng.randrange(1000, 9999)} {rng.randrange(1000, 9999)}",
+    )
+    emails, size = [], 0
+    while size < megabytes * 1e6:
+        words = [rng.choice(pii)() if rng.random() < 0.02 else rng.choice(WORDS) for _ in range(rng.randint(100, 800))]
+        email = " ".join(words)
+        emails.append(email)
+        size += len(email)
+    return emails
+
+
+def naive_redact(patterns: List["re.Pattern"], text: str) -> str:
+    for pattern in patterns:
+        text = pattern.sub("[[REDACTED]]", text)
+    return text
+
+
+def throughput(fn, corpus: List[str]) -> dict:
+    size = sum(len(email) for email in corpus)
+    started = time.perf_counter()
+    for email in corpus:
+        fn(email)
+    elapsed = time.perf_counter() - started
+    return {"megabytes": round(size / 1e6, 2), "seconds": round(elapsed, 3), "mb_per_second": round(size / elapsed / 1e6, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=20.0)
+    parser.add_argument("--terms", type=int, default=5000)
+    parser.add_argument("--baseline-megabytes", type=float, default=0.1, help="Corpus size for the slow sequential baseline")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    terms = make_terms(rng, args.terms)
+    corpus = make_corpus(rng, terms, args.megabytes)
+
+    started = time.perf_counter()
+    redactor = Redactor(terms)
+    results = {"compile_s": round(time.perf_counter() - started, 3)}
+    results["single_pass"] = throughput(redactor.redact, corpus)
+    results["single_pass"]["redacted"] = {key: value for key, value in redactor.stats().items() if key.startswith("redacted_")}
+
+    sequential = [re.compile(r"(?i)(?<!\w)" + re.escape(term) + r"(?!\w)") for term in terms]
+    sequential += [
+        re.compile(pattern)
+        for pattern in (
+            r"\b\d{8,17}\b",
+            r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}\b",
+            r"\b[B-DF-HJ-NP-TV-Z0-9]{6}\d\b",
+            r"\+\d{1,3}(?:[ .-]\d{2,4}){2,4}",
+        )
+    ]
+    baseline, size = [], 0
+    for email in corpus:
+        if size >= args.baseline_megabytes * 1e6:
+            break
+        baseline.append(email)
+        size += len(email)
+    results["sequential_re_sub"] = throughput(lambda text: naive_redact(sequential, text), baseline)
+    results["speedup"] = round(results["single_pass"]["mb_per_second"] / results["sequential_re_sub"]["mb_per_second"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Content-addressed response cache.
+
+Entries are keyed on a hash of the endpoint, the prompt version and the
+normalized email content, so the same message opened again (or forwarded with
+different whitespace) hits the cache. The in-memory tier is an LRU bounded by
+entry count and total bytes, with a per-entry TTL. An optional sqlite tier
+keeps entries across restarts. Disk I/O never runs on the event loop: writes
+are queued and persisted in batches by a writer thread, and `aget` reads the
+disk tier through a worker thread on a memory miss.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_RETRY_WRITE_SECONDS = 1.0
+
+
+def normalize_content(content: str) -> str:
+    """Canonical form of an email body for cache keys."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", content)).strip()
+
+
+def cache_key(endpoint: str, content: str, prompt_version: str) -> str:
+    payload = "\0".join((endpoint, prompt_version, normalize_content(content)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of generated text with an optional sqlite tier."""
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 24 * 3600,
+        db_path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes: Dict[str, Tuple[str, float]] = {}
+        self._writes_ready = threading.Condition(self._lock)
+        self._closed = False
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            self._writer = threading.Thread(target=self._write_behind, daemon=True, name="ResponseCacheWriter")
+            self._writer.start()
+
+    def get(self, key: str) -> Optional[str]:
+        """Look `key` up in the memory tier only; never blocks on disk."""
+        value = self._lookup(key)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Look `key` up in memory, then in the disk tier without blocking the event loop."""
+        value = self._lookup(key)
+        if value is not None:
+            return value
+        row = await asyncio.to_thread(self._read, key) if self._db is not None else None
+        with self._lock:
+            if row is None or row[1] <= time.time():
+                self.misses += 1
+                return None
+            if key not in self._entries:
+                self._insert(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+            self.expirations += 1
+            return None
+
+    def _read(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            return self._db.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+
+    def set(self, key: str, value: str) -> None:
+        """Store in memory now; the disk tier is written behind by the writer thread."""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, value, expires_at)
+            if self._db is not None:
+                self._writes[key] = (value, expires_at)
+                self._writes_ready.notify()
+
+    def _write_behind(self) -> None:
+        while True:
+            with self._lock:
+                while not self._writes and not self._closed:
+                    self._writes_ready.wait()
+                if not self._writes and self._closed:
+                    return
+            if not self.flush() and not self._closed:
+                time.sleep(_RETRY_WRITE_SECONDS)
+
+    def flush(self) -> bool:
+        """Persist every queued write in one transaction; False if the write failed and was requeued."""
+        with self._lock:
+            writes, self._writes = self._writes, {}
+        if not writes or self._db is None:
+            return True
+        rows = [(key, value, expires_at) for key, (value, expires_at) in writes.items()]
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                self._db.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error("Error writing %d response cache entries: %s", len(rows), e)
+            with self._db_lock:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+            with self._lock:
+                # Keep failed writes queued unless a newer value replaced them meanwhile.
+                for key, value in writes.items():
+                    self._writes.setdefault(key, value)
+            return False
+        return True
+
+    def close(self) -> None:
+        """Write out queued entries and stop the writer thread."""
+        if self._db is None:
+            return
+        with self._lock:
+            self._closed = True
+            self._writes_ready.notify()
+        self._writer.join()
+        self.flush()
+        self._db.close()
+        self._db = None
+
+    def _insert(self, key: str, value: str, expires_at: float) -> None:
+        size = len(value.encode("utf-8"))
+        self._entries[key] = (value, expires_at, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= self._entries.pop(key)[2]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "pending_writes": len(self._writes),
+        }
@@ -0,0 +1,96 @@
+"""Versioned, pre-serialized user-config store.
+
+Each user's config is serialized to JSON bytes once, when it is loaded, along
+with a strong ETag over those bytes. Lookups are a dict access, and callers can
+answer `If-None-Match` without touching the payload. Configs can be hot
+reloaded from a JSON file or a sqlite database; a reload builds a complete new
+snapshot and swaps it in with a single assignment, so readers never see a
+partially loaded set.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConfigEntry:
+    body: bytes
+    etag: str
+    latency_slo_ms: Optional[float] = None
+
+
+def _entry(config: dict) -> ConfigEntry:
+    body = json.dumps(config, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return ConfigEntry(
+        body=body,
+        etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+        latency_slo_ms=config.get("latencySloMs"),
+    )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class UserConfigStore:
+    """Holds the current config snapshot and reloads it from `source`."""
+
+    def __init__(self, configs: Dict[str, dict], source: Optional[str] = None, default_user: str = "default"):
+        self.source = source
+        self.default_user = default_user
+        self.version = 0
+        self._source_mtime: Optional[float] = None
+        self._snapshot: Dict[str, ConfigEntry] = {}
+        self.load(configs)
+
+    def load(self, configs: Dict[str, dict]) -> None:
+        """Replace every config at once."""
+        if self.default_user not in configs:
+            raise ValueError(f"Config set has no '{self.default_user}' entry")
+        snapshot = {user_id: _entry(config) for user_id, config in configs.items()}
+        self._snapshot = snapshot
+        self.version += 1
+
+    def get(self, user_id: str) -> ConfigEntry:
+        snapshot = self._snapshot
+        return snapshot.get(user_id) or snapshot[self.default_user]
+
+    def reload(self) -> bool:
+        """Reload from `source` if it changed since the last load."""
+        if not self.source:
+            return False
+        mtime = os.stat(self.source).st_mtime
+        if mtime == self._source_mtime:
+            return False
+        self.load(self._read_source())
+        self._source_mtime = mtime
+        logger.info("Loaded user configs version %d from %s", self.version, self.source)
+        return True
+
+    def _read_source(self) -> Dict[str, dict]:
+        if self.source.endswith(".json"):
+            with open(self.source, encoding="utf-8") as f:
+                return json.load(f)
+        with sqlite3.connect(self.source) as db:
+            rows = db.execute("SELECT user_id, config FROM user_configs").fetchall()
+        return {user_id: json.loads(config) for user_id, config in rows}
+
+    async def watch(self, interval: float) -> None:
+        """Poll `source` every `interval` seconds and reload on change."""
+        while True:
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as e:
+                logger.error("Error reloading user configs from %s: %s", self.source, e)
+            await asyncio.sleep(interval)
@@ -0,0 +1,132 @@
+"""Incremental per-conversation summaries for long email threads.
+
+Every reply in a thread quotes the whole conversation before it. Instead of
+re-summarizing the full text on each call, we keep a running summary per
+conversation ID together with hashes of the messages already folded into it.
+A new call splits the thread into messages, picks out the unseen ones and only
+those are sent to the model along with the stored summary.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from cache import normalize_content
+
+# Separators Outlook and common mail clients put between a reply and the
+# message it quotes. Outlook's header block (From/Sent/To/Cc/Subject) is
+# consumed whole: the Subject gains "RE:" prefixes from copy to copy, so any
+# header line left in the quoted message would change its hash.
+_REPLY_SEPARATOR = re.compile(
+    r"^(?:> ?)*(?:-{2,}\s*Original Message\s*-{2,}"
+    r"|_{10,}"
+    r"|On .{1,200} wrote:"
+    r"|From: .+\n(?:> ?)*(?:Sent|Date): .+(?:\n(?:> ?)*(?:To|Cc|Bcc|Subject|Importance): .*)*)\s*$",
+    re.MULTILINE | re.IGNORECASE,
+)
+_QUOTE_PREFIX = re.compile(r"^(?:> ?)+", re.MULTILINE)
+
+
+def split_thread(content: str) -> List[str]:
+    """Split a reply chain into its messages, oldest first."""
+    parts = _REPLY_SEPARATOR.split(content)
+    messages = [_QUOTE_PREFIX.sub("", part).strip() for part in parts]
+    return [message for message in reversed(messages) if message]
+
+
+def message_hash(message: str) -> str:
+    return hashlib.sha256(normalize_content(message).encode("utf-8")).hexdigest()[:24]
+
+
+@dataclass
+class ConversationState:
+    summary: str = ""
+    seen: Set[str] = field(default_factory=set)
+    updated_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class _ConversationLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0  # holders and waiters
+
+
+class ConversationStore:
+    """Bounded LRU of running summaries keyed by (user ID, conversation ID).
+
+    Conversation IDs come from the client, so they are scoped to the user:
+    one user can never read or extend another user's summary.
+    """
+
+    def __init__(self, max_conversations: int = 5000):
+        self.max_conversations = max_conversations
+        self._states: "OrderedDict[Tuple[str, str], ConversationState]" = OrderedDict()
+        self._locks: Dict[Tuple[str, str], _ConversationLock] = {}
+        self.messages_folded = 0
+        self.messages_skipped = 0
+
+    @asynccontextmanager
+    async def lock(self, user_id: str, conversation_id: str) -> AsyncIterator[None]:
+        """Serializes folds of the same conversation.
+
+        A lock lives only while someone holds or waits for it, so conversations that
+        never commit (or are evicted) don't leave locks behind.
+        """
+        key = (user_id, conversation_id)
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _ConversationLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[key]
+
+    def plan(self, user_id: str, conversation_id: str, content: str) -> Tuple[str, List[str], List[str]]:
+        """Return (stored summary, new messages, their hashes) for `content`."""
+        key = (user_id, conversation_id)
+        state = self._states.get(key)
+        seen = state.seen if state else set()
+        new_messages, new_hashes = [], []
+        for message in split_thread(content):
+            digest = message_hash(message)
+            if digest in seen or digest in new_hashes:
+                self.messages_skipped += 1
+                continue
+            new_messages.append(message)
+            new_hashes.append(digest)
+        if state is not None:
+            self._states.move_to_end(key)
+        return (state.summary if state else ""), new_messages, new_hashes
+
+    def commit(self, user_id: str, conversation_id: str, summary: str, hashes: List[str]) -> None:
+        """Store `summary` as covering the previously seen messages plus `hashes`."""
+        key = (user_id, conversation_id)
+        state = self._states.get(key) or ConversationState()
+        state.summary = summary
+        state.seen.update(hashes)
+        state.updated_at = time.time()
+        self._states[key] = state
+        self._states.move_to_end(key)
+        self.messages_folded += len(hashes)
+        while len(self._states) > self.max_conversations:
+            self._states.popitem(last=False)
+
+    def get_summary(self, user_id: str, conversation_id: str) -> Optional[str]:
+        state = self._states.get((user_id, conversation_id))
+        return state.summary if state else None
+
+    def stats(self) -> dict:
+        return {
+            "conversations": len(self._states),
+            "locks": len(self._locks),
+            "messages_folded": self.messages_folded,
+            "messages_skipped": self.messages_skipped,
+        }
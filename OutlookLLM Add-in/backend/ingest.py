@@ -0,0 +1,180 @@
+"""Streaming ingestion of large raw email bodies.
+
+The JSON endpoints hold the whole request several times over: the raw body,
+the parsed JSON and the model's string. `ingest` instead reads the body
+chunk by chunk. It decompresses each chunk (gzip, deflate or, when the
+`zstandard` package is installed, zstd) in bounded pieces, strips inline
+base64 `data:` URIs (images pasted into HTML mail, which are most of the
+bytes), decodes UTF-8 incrementally and feeds the text straight into an
+`EmailNormalizer`. Memory is bounded by the normalizer's token budget rather
+than the body size. Oversized bodies are rejected with `BodyTooLarge`, from
+Content-Length before anything is read and otherwise as soon as either cap
+is crossed.
+"""
+import codecs
+import re
+import zlib
+from typing import AsyncIterator, Iterator, Optional
+
+from normalize import EmailNormalizer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Largest piece of decompressed output produced per step.
+_PIECE_SIZE = 64 * 1024
+# zstd output can't be capped per call, so feed it small input slices instead.
+_ZSTD_SLICE = 256
+
+
+class BodyTooLarge(Exception):
+    def __init__(self, what: str, limit: int):
+        super().__init__(f"{what} exceeds {limit} bytes")
+        self.limit = limit
+
+
+class UnsupportedEncoding(Exception):
+    pass
+
+
+class _Identity:
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        yield data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _Zlib:
+    def __init__(self, wbits: int):
+        self._decompressor = zlib.decompressobj(wbits)
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            yield self._decompressor.decompress(data, _PIECE_SIZE)
+            data = self._decompressor.unconsumed_tail
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush()
+
+
+class _Zstd:
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        for i in range(0, len(data), _ZSTD_SLICE):
+            yield self._decompressor.decompress(data[i : i + _ZSTD_SLICE])
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def decoder_for(content_encoding: Optional[str]):
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return _Identity()
+    if encoding in ("gzip", "x-gzip"):
+        return _Zlib(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _Zlib(zlib.MAX_WBITS)
+    if encoding == "zstd" and zstandard is not None:
+        return _Zstd()
+    raise UnsupportedEncoding(f"Unsupported Content-Encoding: {content_encoding}")
+
+
+def supported_encodings() -> str:
+    return "gzip, deflate" + (", zstd" if zstandard is not None else "")
+
+
+class DataUriStripper:
+    """Drops the payload of base64 `data:` URIs from streamed text."""
+
+    _START = re.compile(r"data:[\w/+.-]{0,100};base64,", re.IGNORECASE)
+    _END = re.compile(r"[^A-Za-z0-9+/=\r\n]")
+    # Long enough to hold any partial `_START` match at the end of a chunk.
+    _CARRY = 120
+
+    def __init__(self):
+        self._carry = ""
+        self._skipping = False
+        self.removed = 0
+
+    def feed(self, text: str) -> str:
+        text = self._carry + text
+        self._carry = ""
+        out = []
+        pos = 0
+        while pos < len(text):
+            if self._skipping:
+                match = self._END.search(text, pos)
+                if match is None:
+                    self.removed += len(text) - pos
+                    return "".join(out)
+                self.removed += match.start() - pos
+                self._skipping = False
+                pos = match.start()
+                continue
+            match = self._START.search(text, pos)
+            if match is None:
+                keep = max(pos, len(text) - self._CARRY)
+                out.append(text[pos:keep])
+                self._carry = text[keep:]
+                break
+            out.append(text[pos : match.start()] + "data:,")
+            self._skipping = True
+            pos = match.end()
+        return "".join(out)
+
+    def close(self) -> str:
+        text, self._carry = self._carry, ""
+        return "" if self._skipping else text
+
+
+async def ingest(
+    chunks: AsyncIterator[bytes],
+    normalizer: EmailNormalizer,
+    content_encoding: Optional[str] = None,
+    charset: str = "utf-8",
+    content_length: Optional[int] = None,
+    max_body_bytes: int = 32 * 1024 * 1024,
+    max_decoded_bytes: int = 64 * 1024 * 1024,
+) -> int:
+    """Stream a request body into `normalizer`; returns the decoded size in bytes.
+
+    Raises `BodyTooLarge` when the body on the wire exceeds `max_body_bytes`
+    or its decompressed size exceeds `max_decoded_bytes`, and
+    `UnsupportedEncoding` for an unknown Content-Encoding or charset.
+    """
+    if content_length is not None and content_length > max_body_bytes:
+        raise BodyTooLarge("Request body", max_body_bytes)
+    decoder = decoder_for(content_encoding)
+    try:
+        text_decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    except LookupError:
+        raise UnsupportedEncoding(f"Unsupported charset: {charset}") from None
+    stripper = DataUriStripper()
+    received = decoded = 0
+
+    def consume(piece: bytes) -> None:
+        nonlocal decoded
+        decoded += len(piece)
+        if decoded > max_decoded_bytes:
+            raise BodyTooLarge("Decompressed request body", max_decoded_bytes)
+        if not normalizer.done:
+            text = stripper.feed(text_decoder.decode(piece))
+            if text:
+                normalizer.feed(text)
+
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_body_bytes:
+            raise BodyTooLarge("Request body", max_body_bytes)
+        for piece in decoder.feed(chunk):
+            consume(piece)
+    consume(decoder.flush())
+    if not normalizer.done:
+        normalizer.feed(stripper.feed(text_decoder.decode(b"", final=True)) + stripper.close())
+    return decoded
@@ -0,0 +1,198 @@
+"""Background jobs for long-running email generation.
+
+A job is queued and executed by one of a fixed number of worker tasks, so a
+burst of submissions cannot oversubscribe the model backend. Clients follow a
+job by polling `get` or by subscribing to its events. A subscription starts
+with a snapshot of everything produced so far, so a client that reconnects
+misses nothing, and always ends with a `done` or `error` event, even when
+the job had already finished. Finished jobs are kept for `retention_seconds`
+so their result can still be fetched after a dropped connection; expired jobs
+are purged whenever jobs are submitted, finish or are looked up.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+
+TERMINAL = frozenset((JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED))
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class EmailJob:
+    job_id: str
+    user_id: str
+    operation: str
+    status: JobStatus = JobStatus.PENDING
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    partial: List[str] = field(default_factory=list)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    def snapshot(self) -> dict:
+        return {
+            "jobId": self.job_id,
+            "operation": self.operation,
+            "status": self.status.value,
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+            "partial": "".join(self.partial),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+def _terminal_event(job: EmailJob) -> Tuple[str, dict]:
+    return ("done" if job.status == JobStatus.SUCCEEDED else "error"), job.snapshot()
+
+
+JobRunner = Callable[[EmailJob, Callable[[str], None]], Awaitable[dict]]
+
+
+class EmailJobManager:
+    def __init__(self, workers: int = 4, max_pending: int = 1000, retention_seconds: float = 3600):
+        self.workers = workers
+        self.retention = retention_seconds
+        self._jobs: Dict[str, EmailJob] = {}
+        self._runners: Dict[str, JobRunner] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._max_pending = max_pending
+        self._worker_tasks: List[asyncio.Task] = []
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._finished: Deque[Tuple[float, str]] = deque()
+        self._running = 0
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._max_pending)
+        if not self._worker_tasks:
+            self._worker_tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, user_id: str, operation: str, runner: JobRunner) -> EmailJob:
+        """Queue `runner` as a new job; raises `JobQueueFull` when the queue is full."""
+        self._ensure_workers()
+        self._purge_expired()
+        job = EmailJob(job_id=f"job_{uuid.uuid4().hex[:12]}", user_id=user_id, operation=operation)
+        try:
+            self._queue.put_nowait(job.job_id)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"More than {self._max_pending} jobs pending") from None
+        self._jobs[job.job_id] = job
+        self._runners[job.job_id] = runner
+        return job
+
+    def get(self, job_id: str) -> Optional[EmailJob]:
+        self._purge_expired()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.status != JobStatus.PENDING:
+            return False
+        self._finish(job, JobStatus.CANCELLED)
+        return True
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Tuple[str, dict]]:
+        """Yield (event, data) pairs for a job: a snapshot, then deltas and status changes until it ends.
+
+        A job that is unknown or already purged yields a single `error` event with status "GONE".
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            yield "error", {"jobId": job_id, "status": "GONE", "error": "Job not found or expired"}
+            return
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            yield "snapshot", job.snapshot()
+            if job.status in TERMINAL:
+                # Clients wait for done/error, so a finished job still ends with one.
+                yield _terminal_event(job)
+                return
+            while True:
+                event, data = await queue.get()
+                yield event, data
+                if event in ("done", "error"):
+                    return
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+
+    def _publish(self, job: EmailJob, event: str, data: dict) -> None:
+        for queue in self._subscribers.get(job.job_id, ()):
+            queue.put_nowait((event, data))
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            runner = self._runners.pop(job_id, None)
+            if job is None or runner is None or job.status != JobStatus.PENDING:
+                continue
+            self._running += 1
+            job.status = JobStatus.RUNNING
+            job.updated_at = time.time()
+            self._publish(job, "status", {"status": job.status.value})
+
+            def on_delta(delta: str, job: EmailJob = job) -> None:
+                job.partial.append(delta)
+                job.updated_at = time.time()
+                self._publish(job, "delta", {"delta": delta})
+
+            try:
+                job.result = await runner(job, on_delta)
+                self._finish(job, JobStatus.SUCCEEDED)
+            except asyncio.CancelledError:
+                self._finish(job, JobStatus.CANCELLED)
+                raise
+            except Exception as e:
+                logger.error("Job %s failed: %s", job.job_id, e)
+                job.error = str(e)
+                self._finish(job, JobStatus.FAILED)
+            finally:
+                self._running -= 1
+
+    def _finish(self, job: EmailJob, status: JobStatus) -> None:
+        job.status = status
+        job.updated_at = time.time()
+        self._runners.pop(job.job_id, None)
+        self._finished.append((job.updated_at, job.job_id))
+        self._publish(job, *_terminal_event(job))
+        self._purge_expired()
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.retention
+        while self._finished and self._finished[0][0] < cutoff:
+            _, job_id = self._finished.popleft()
+            self._jobs.pop(job_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self._jobs),
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "workers": self.workers,
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+        }
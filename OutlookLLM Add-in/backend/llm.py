@@ -0,0 +1,141 @@
+"""Pluggable LLM backends for the email endpoints.
+
+A backend turns a prompt into text. Every backend exposes the completion both
+as an async token stream (used by the SSE endpoints) and as a single string.
+The stub backend is deterministic and needs no network, so the service can be
+run and exercised offline.
+"""
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional, Type
+
+
+class LLMBackend(ABC):
+    """Base class for model backends."""
+
+    name = "base"
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion for `prompt` piece by piece as it is produced."""
+
+    async def complete(self, prompt: str) -> str:
+        """Return the whole completion for `prompt`."""
+        return "".join([chunk async for chunk in self.stream(prompt)])
+
+    async def complete_batch(self, prompts: List[str]) -> List[str]:
+        """Return completions for several prompts in one inference call.
+
+        Backends that support batched inference should override this; the
+        default just runs the prompts concurrently.
+        """
+        return list(await asyncio.gather(*(self.complete(p) for p in prompts)))
+
+
+class StubLLMBackend(LLMBackend):
+    """Offline backend that echoes the content section of the prompt.
+
+    The prompt's last paragraph (the email content) is replayed word by word,
+    capped at `max_tokens` words. `first_token_delay` and `token_delay` (in
+    seconds) simulate model latency.
+    """
+
+    name = "stub"
+
+    def __init__(self, first_token_delay: float = 0.0, token_delay: float = 0.0, max_tokens: int = 64):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.max_tokens = max_tokens
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        content = prompt.rsplit("\n\n", 1)[-1]
+        words = content.split()[: self.max_tokens] or ["(empty)"]
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+        for i, word in enumerate(words):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+
+class HTTPLLMBackend(LLMBackend):
+    """Backend for an OpenAI-compatible /v1/completions server.
+
+    Requests go through a shared `upstream.UpstreamClient`, so connections are
+    pooled and calls are limited, retried and circuit-broken per upstream.
+    Batches are sent as one request with a list of prompts.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url: str, model: str = "default", max_tokens: int = 512, **client_options):
+        from upstream import UpstreamClient
+
+        self.model = model
+        self.max_tokens = max_tokens
+        self.client = UpstreamClient(base_url, **client_options)
+
+    def _payload(self, prompt, stream: bool) -> dict:
+        return {"model": self.model, "prompt": prompt, "max_tokens": self.max_tokens, "stream": stream}
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async for line in self.client.stream_lines("/v1/completions", self._payload(prompt, True)):
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            text = json.loads(data)["choices"][0].get("text", "")
+            if text:
+                yield text
+
+    async def complete(self, prompt: str) -> str:
+        body = await self.client.post_json("/v1/completions", self._payload(prompt, False))
+        return body["choices"][0]["text"]
+
+    async def complete_batch(self, prompts: List[str]) -> List[str]:
+        body = await self.client.post_json("/v1/completions", self._payload(prompts, False))
+        choices = sorted(body["choices"], key=lambda choice: choice.get("index", 0))
+        return [choice["text"] for choice in choices]
+
+    def stats(self) -> dict:
+        return self.client.stats()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_BACKENDS: Dict[str, Type[LLMBackend]] = {
+    StubLLMBackend.name: StubLLMBackend,
+    HTTPLLMBackend.name: HTTPLLMBackend,
+}
+
+
+def register_backend(name: str, backend_cls: Type[LLMBackend]) -> None:
+    """Make `backend_cls` selectable through `get_backend(name)` / LLM_BACKEND."""
+    _BACKENDS[name] = backend_cls
+
+
+def get_backend(name: Optional[str] = None, **kwargs) -> LLMBackend:
+    """Instantiate the backend called `name` (defaults to $LLM_BACKEND or "stub")."""
+    name = name or os.environ.get("LLM_BACKEND", StubLLMBackend.name)
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}")
+    if name == StubLLMBackend.name and not kwargs:
+        kwargs = {
+            "first_token_delay": float(os.environ.get("STUB_LLM_FIRST_TOKEN_MS", "0")) / 1000,
+            "token_delay": float(os.environ.get("STUB_LLM_TOKEN_MS", "0")) / 1000,
+        }
+    elif name == HTTPLLMBackend.name and not kwargs:
+        hedge_ms = os.environ.get("LLM_UPSTREAM_HEDGE_MS")
+        kwargs = {
+            "base_url": os.environ.get("LLM_UPSTREAM_URL", "http://localhost:8000"),
+            "model": os.environ.get("LLM_UPSTREAM_MODEL", "default"),
+            "max_concurrency": int(os.environ.get("LLM_UPSTREAM_MAX_CONCURRENCY", "32")),
+            "read_timeout": float(os.environ.get("LLM_UPSTREAM_TIMEOUT_S", "60")),
+            "retries": int(os.environ.get("LLM_UPSTREAM_RETRIES", "2")),
+            "hedge_after": float(hedge_ms) / 1000 if hedge_ms else None,
+        }
+    return _BACKENDS[name](**kwargs)
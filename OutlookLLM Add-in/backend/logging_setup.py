@@ -0,0 +1,147 @@
+"""Non-blocking structured logging.
+
+Handlers on the event loop only put the `LogRecord` on a bounded in-process
+queue; a `QueueListener` thread formats it as one JSON line and writes it out.
+A slow stdout or disk then slows that thread instead of every coroutine.
+Message formatting is deferred to the listener, so use %-style arguments
+(`logger.info("... %s", value)`) rather than f-strings. Each record carries the
+request ID of the request that produced it, and high-volume INFO records can
+be sampled per request.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import uuid
+import zlib
+from contextvars import ContextVar
+from typing import Optional
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the current request ID (runs in the caller's context)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a `rate` fraction of INFO-and-below records; warnings always pass.
+
+    Sampling is keyed on the request ID, so a request's records are either all
+    kept or all dropped.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.threshold = int(max(0.0, min(rate, 1.0)) * 10000)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.threshold >= 10000:
+            return True
+        key = getattr(record, "request_id", "-")
+        if key == "-":
+            key = f"{record.created}"
+        return zlib.crc32(key.encode()) % 10000 < self.threshold
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and never formats on the caller's thread."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue is in-process, so the record can travel as-is and be
+        # formatted by the listener.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestIdMiddleware:
+    """ASGI middleware that binds X-Request-ID (or a fresh one) to the request's context."""
+
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header.encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        request_id = next((value.decode("latin-1") for key, value in scope["headers"] if key == self.header), None)
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_stop_registered = False
+
+
+def stop_logging() -> None:
+    """Drain the queue and stop the listener thread; safe to call more than once."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def setup_logging(level: int = logging.INFO, sample_rate: float = 1.0, queue_size: int = 10000, stream=None) -> NonBlockingQueueHandler:
+    """Route the root logger through a queue to a JSON-writing listener thread."""
+    global _listener, _stop_registered
+    stop_logging()
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(SamplingFilter(sample_rate))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    if not _stop_registered:
+        atexit.register(stop_logging)
+        _stop_registered = True
+    return handler
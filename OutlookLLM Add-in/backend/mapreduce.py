@@ -0,0 +1,139 @@
+"""Hierarchical (map-reduce) summarization of documents too long for one call.
+
+The text is cut into chunks of at most `chunk_tokens` on paragraph
+boundaries. Oversized paragraphs are split on sentences, then on words. Each
+chunk is summarized on its own, at most `parallelism` at a time, and summaries
+are yielded as they finish so callers can stream progress. The summaries are
+then merged in groups until they fit into one final merge call of
+`merge_tokens`. Wall time grows with chunks / parallelism plus a few merge
+levels, not with document length.
+"""
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+
+from normalize import estimate_tokens
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _split_oversized(paragraph: str, max_tokens: int) -> List[str]:
+    pieces: List[str] = []
+    for sentence in _SENTENCE_END.split(paragraph):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words, current = [], []
+        for word in sentence.split():
+            # A "word" longer than a whole chunk (a pasted blob) is cut by characters.
+            words.extend(word[i : i + max_tokens * 4] for i in range(0, len(word), max_tokens * 4))
+        for word in words:
+            if current and estimate_tokens(" ".join(current + [word])) > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int, separator: str = "\n\n") -> List[str]:
+    """Pack paragraphs of `text` into chunks of at most `max_tokens` (estimated)."""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    separator_tokens = estimate_tokens(separator)
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = estimate_tokens(paragraph)
+        pieces = [paragraph] if tokens <= max_tokens else _split_oversized(paragraph, max_tokens)
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + separator_tokens + tokens > max_tokens:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+            current_tokens += tokens + (separator_tokens if current else 0)
+            current.append(piece)
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def _group(summaries: List[str], max_tokens: int) -> List[List[str]]:
+    """Consecutive groups of summaries that each fit in `max_tokens`, at least two per group."""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for summary in summaries:
+        tokens = estimate_tokens(summary)
+        if len(current) >= 2 and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(summary)
+        current_tokens += tokens
+    if len(current) == 1 and groups:
+        groups[-1].append(current[0])
+    elif current:
+        groups.append(current)
+    return groups
+
+
+class MapReduceSummarizer:
+    def __init__(
+        self,
+        summarize: Callable[[str], Awaitable[str]],
+        merge: Callable[[List[str]], Awaitable[str]],
+        chunk_tokens: int = 3000,
+        merge_tokens: int = 3000,
+        parallelism: int = 8,
+    ):
+        self.summarize = summarize
+        self.merge = merge
+        self.chunk_tokens = chunk_tokens
+        self.merge_tokens = merge_tokens
+        self.parallelism = parallelism
+
+    async def summarize_chunks(self, text: str) -> AsyncIterator[Tuple[int, int, str]]:
+        """Yield `(index, total, summary)` for every chunk, in completion order."""
+        chunks = chunk_text(text, self.chunk_tokens)
+        semaphore = asyncio.Semaphore(self.parallelism)
+
+        async def run(index: int, chunk: str) -> Tuple[int, str]:
+            async with semaphore:
+                return index, await self.summarize(chunk)
+
+        tasks = [asyncio.ensure_future(run(i, chunk)) for i, chunk in enumerate(chunks)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, summary = await next_done
+                yield index, len(chunks), summary
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def collapse(self, summaries: List[str]) -> List[str]:
+        """Merge `summaries` level by level until together they fit in `merge_tokens`."""
+        semaphore = asyncio.Semaphore(self.parallelism)
+
+        async def merge(group: List[str]) -> str:
+            async with semaphore:
+                return await self.merge(group)
+
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > self.merge_tokens:
+            groups = _group(summaries, self.merge_tokens)
+            summaries = list(await asyncio.gather(*(merge(group) for group in groups)))
+        return summaries
+
+    async def run(self, text: str) -> str:
+        summaries: List[str] = []
+        async for index, total, summary in self.summarize_chunks(text):
+            if not summaries:
+                summaries = [""] * total
+            summaries[index] = summary
+        if not summaries:
+            return ""
+        collapsed = await self.collapse(summaries)
+        return collapsed[0] if len(collapsed) == 1 else await self.merge(collapsed)
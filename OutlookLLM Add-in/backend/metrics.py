@@ -0,0 +1,173 @@
+"""Per-route request metrics in Prometheus text format.
+
+`MetricsMiddleware` is a plain ASGI middleware: it times each request, counts
+request and response bytes and status codes, and tracks in-flight requests,
+all labelled by the route template (e.g. `/getUserConfig/{user_id}`) so user
+IDs don't blow up label cardinality. Everything runs on the event loop thread,
+so the hot path is a few dict lookups and a bisect with no locking.
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, rendered the way Prometheus expects."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: Labels) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = "outlook_llm"):
+        self.namespace = namespace
+        self.requests: Dict[Labels, int] = defaultdict(int)
+        self.in_flight: Dict[Labels, int] = defaultdict(int)
+        self.latency: Dict[Labels, Histogram] = {}
+        self.ttfb: Dict[Labels, Histogram] = {}
+        self.request_bytes: Dict[Labels, Histogram] = {}
+        self.response_bytes: Dict[Labels, Histogram] = {}
+        self._collectors: List[Tuple[str, Callable[[], dict], Tuple[str, ...]]] = []
+
+    def register_stats(self, subsystem: str, stats: Callable[[], dict], counters: Iterable[str] = ()) -> None:
+        """Export the numeric values of `stats()` as `<namespace>_<subsystem>_<key>` gauges.
+
+        Keys ending in `_total` or matching one of the `counters` patterns (e.g. `"routed_*"`)
+        are monotonic and exported as counters instead, named with a `_total` suffix.
+        """
+        self._collectors.append((subsystem, stats, tuple(counters)))
+
+    def observe_request(self, labels: Labels, status: int, seconds: float, ttfb: float, request_bytes: int, response_bytes: int) -> None:
+        self.requests[labels + (("status", str(status)),)] += 1
+        if labels not in self.latency:
+            self.latency[labels] = Histogram(LATENCY_BUCKETS)
+            self.ttfb[labels] = Histogram(LATENCY_BUCKETS)
+            self.request_bytes[labels] = Histogram(SIZE_BUCKETS)
+            self.response_bytes[labels] = Histogram(SIZE_BUCKETS)
+        self.latency[labels].observe(seconds)
+        self.ttfb[labels].observe(ttfb)
+        self.request_bytes[labels].observe(request_bytes)
+        self.response_bytes[labels].observe(response_bytes)
+
+    def render(self) -> str:
+        ns = self.namespace
+        lines = [f"# TYPE {ns}_http_requests_total counter"]
+        lines += [f"{ns}_http_requests_total{_labels(labels)} {value}" for labels, value in self.requests.items()]
+        lines.append(f"# TYPE {ns}_http_requests_in_flight gauge")
+        lines += [f"{ns}_http_requests_in_flight{_labels(labels)} {value}" for labels, value in self.in_flight.items()]
+        for name, histograms in (
+            ("http_request_duration_seconds", self.latency),
+            ("http_time_to_first_byte_seconds", self.ttfb),
+            ("http_request_size_bytes", self.request_bytes),
+            ("http_response_size_bytes", self.response_bytes),
+        ):
+            lines.append(f"# TYPE {ns}_{name} histogram")
+            for labels, histogram in histograms.items():
+                lines += histogram.render(f"{ns}_{name}", labels)
+        for subsystem, stats, counters in self._collectors:
+            for key, value in stats().items():
+                if not isinstance(value, (int, float)):
+                    continue
+                if key.endswith("_total") or any(fnmatchcase(key, pattern) for pattern in counters):
+                    name = f"{ns}_{subsystem}_{key if key.endswith('_total') else key + '_total'}"
+                    lines.append(f"# TYPE {name} counter")
+                else:
+                    name = f"{ns}_{subsystem}_{key}"
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding a `MetricsRegistry`.
+
+    `routes` is the application's (live) route list, used to resolve the route
+    template of each request before it is dispatched.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry, routes: list):
+        self.app = app
+        self.registry = registry
+        self.routes = routes
+
+    def _route_path(self, scope) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        labels = (("method", scope["method"]), ("route", self._route_path(scope)))
+        registry = self.registry
+        started = time.perf_counter()
+        state = {"status": 500, "ttfb": 0.0, "request_bytes": 0, "response_bytes": 0}
+
+        async def counting_receive():
+            message = await receive()
+            state["request_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["ttfb"] = time.perf_counter() - started
+            elif message["type"] == "http.response.body":
+                state["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        registry.in_flight[labels] += 1
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            registry.in_flight[labels] -= 1
+            registry.observe_request(
+                labels,
+                state["status"],
+                time.perf_counter() - started,
+                state["ttfb"],
+                state["request_bytes"],
+                state["response_bytes"],
+            )
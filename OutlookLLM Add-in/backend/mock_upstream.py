@@ -0,0 +1,102 @@
+"""Local mock of an OpenAI-compatible completions server.
+
+Used to exercise `upstream.UpstreamClient` and the "http" LLM backend without
+a real model. Latency and failures are injected per process via POST /_faults
+(or the MOCK_* environment variables at startup), so retries, hedging and the
+circuit breaker can be driven deterministically.
+
+    uvicorn mock_upstream:app --port 8000
+    LLM_BACKEND=http LLM_UPSTREAM_URL=http://localhost:8000 uvicorn app:app --port 8001
+
+    curl -X POST localhost:8000/_faults -H 'Content-Type: application/json' \\
+         -d '{"latencyMs": 200, "jitterMs": 800, "failureRate": 0.2}'
+"""
+import asyncio
+import json
+import os
+import random
+from typing import List, Optional, Union
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+app = FastAPI()
+
+
+class Faults(BaseModel):
+    latencyMs: float = float(os.environ.get("MOCK_LATENCY_MS", "0"))
+    jitterMs: float = float(os.environ.get("MOCK_JITTER_MS", "0"))
+    tokenMs: float = float(os.environ.get("MOCK_TOKEN_MS", "0"))
+    failureRate: float = float(os.environ.get("MOCK_FAILURE_RATE", "0"))
+    failureStatus: int = int(os.environ.get("MOCK_FAILURE_STATUS", "503"))
+    retryAfter: Optional[float] = None
+
+
+class CompletionRequest(BaseModel):
+    model: str = "default"
+    prompt: Union[str, List[str]]
+    max_tokens: int = 64
+    stream: bool = False
+
+
+faults = Faults()
+counters = {"requests": 0, "failures": 0}
+
+
+def completion_text(prompt: str, max_tokens: int) -> List[str]:
+    words = prompt.rsplit("\n\n", 1)[-1].split()[:max_tokens] or ["(empty)"]
+    return [word if i == len(words) - 1 else word + " " for i, word in enumerate(words)]
+
+
+async def inject_faults() -> Optional[JSONResponse]:
+    counters["requests"] += 1
+    await asyncio.sleep((faults.latencyMs + random.uniform(0, faults.jitterMs)) / 1000)
+    if random.random() < faults.failureRate:
+        counters["failures"] += 1
+        headers = {"Retry-After": str(faults.retryAfter)} if faults.retryAfter is not None else None
+        return JSONResponse({"error": "injected failure"}, status_code=faults.failureStatus, headers=headers)
+    return None
+
+
+@app.post("/_faults")
+async def set_faults(new_faults: Faults):
+    global faults
+    faults = new_faults
+    return faults
+
+
+@app.get("/_stats")
+async def get_stats():
+    return counters
+
+
+@app.post("/v1/completions")
+async def completions(request: CompletionRequest):
+    failure = await inject_faults()
+    if failure is not None:
+        return failure
+    prompts = request.prompt if isinstance(request.prompt, list) else [request.prompt]
+    if not request.stream:
+        return {
+            "model": request.model,
+            "choices": [
+                {"index": i, "text": "".join(completion_text(prompt, request.max_tokens))}
+                for i, prompt in enumerate(prompts)
+            ],
+        }
+
+    async def events():
+        for token in completion_text(prompts[0], request.max_tokens):
+            if faults.tokenMs:
+                await asyncio.sleep(faults.tokenMs / 1000)
+            yield f"data: {json.dumps({'choices': [{'index': 0, 'text': token}]})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=int(os.environ.get("MOCK_UPSTREAM_PORT", "8000")))
@@ -0,0 +1,347 @@
+"""Single-pass cleanup of email bodies before they reach the model.
+
+Outlook hands us raw HTML or text that is often mostly markup, quoted reply
+history, legal disclaimers and signatures. `EmailNormalizer` removes these in
+one linear pass: HTML is parsed incrementally and its text is fed straight
+into a line processor, which drops quoted history, signature and disclaimer
+blocks (matched with precompiled patterns), collapses whitespace and stops
+once the token budget is spent. Input can be fed in chunks, so the same code
+serves both whole request bodies and streamed uploads.
+"""
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import List, Optional
+
+QUOTED_MARKER = "[quoted history removed]"
+TRUNCATED_MARKER = "[truncated]"
+
+# Characters (after leading whitespace) needed to tell HTML from text.
+_SNIFF_CHARS = 16
+_HTML_START = re.compile(r"^\s*(?:<!doctype|<html|<head|<body|<div|<p[\s>]|<table|<span|<meta)", re.IGNORECASE)
+_SPACES = re.compile(r"[ \t\r\f\v\xa0\u200b]+")
+# "On ... wrote:" always introduces quoted history. A rule or "Original
+# Message" line usually does, but Outlook uses the same rule for forwards, so
+# the header block after it decides. A bare "From:" line only counts when a
+# Sent:/Date: line follows it. Forwarded messages are kept: in a forward they
+# are often the only content that matters.
+_QUOTE_INTRO = re.compile(r"^On .{1,200} wrote:$", re.IGNORECASE)
+_REPLY_MARKER = re.compile(r"^(?:-{2,}\s*Original Message\s*-{2,}|_{10,})$", re.IGNORECASE)
+_FORWARD_MARKER = re.compile(r"^(?:-{2,}\s*Forwarded Message\s*-{2,}|Begin forwarded message:)$", re.IGNORECASE)
+_HEADER_FIELD = re.compile(r"^(From|Sent|Date|To|Cc|Bcc|Subject|Importance):\s*(.*)$", re.IGNORECASE)
+_FORWARD_SUBJECT = re.compile(r"^(?:FW|Fwd?)\s*:", re.IGNORECASE)
+_MAX_HEADER_LINES = 8
+# Unambiguous signature delimiters: everything after them is signature.
+_SIGNATURE_START = re.compile(r"^(?:--|Sent from my \w+.*|Get Outlook for \w+.*)$", re.IGNORECASE)
+# A sign-off only starts a signature if what follows it, up to the end of the
+# message, is a few short lines (name, title, phone) rather than more prose.
+_SIGN_OFF = re.compile(r"^(?:Best regards|Kind regards|Regards|Thanks|Cheers),?$", re.IGNORECASE)
+_SIGNATURE_MAX_LINES = 6
+_SIGNATURE_MAX_CHARS = 60
+_SENTENCE = re.compile(r"(?:\S+\s+){3,}\S*[.?!]$")
+_DISCLAIMER_START = re.compile(
+    r"^(?:CONFIDENTIALITY NOTICE|DISCLAIMER|IMPORTANT NOTICE"
+    r"|This (?:e-?mail|message|communication)(?: and any attachments?)?(?: \(.*?\))? (?:is|are|may be) (?:confidential|intended|privileged)"
+    r"|If you are not the intended recipient"
+    r"|The information contained in this (?:e-?mail|message|communication))",
+    re.IGNORECASE,
+)
+_BLOCK_TAGS = frozenset(("p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol"))
+_SKIP_TAGS = frozenset(("style", "script", "head", "title"))
+# Both an <hr> and a <blockquote> start mark where quoted history begins in
+# Outlook and Gmail HTML; emit a separator line the line processor recognizes.
+_SEPARATOR_TAGS = frozenset(("hr", "blockquote"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class NormalizedEmail:
+    text: str
+    original_bytes: int
+    bytes_removed: int
+    original_tokens: int
+    tokens_removed: int
+    truncated: bool
+    quoted_removed: bool
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self, emit):
+        super().__init__(convert_charrefs=True)
+        self._emit = emit
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _SEPARATOR_TAGS:
+            self._emit("\n" + "_" * 10 + "\n")
+        elif tag in _BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._emit(data.replace("\n", " "))
+
+
+class EmailNormalizer:
+    """Incremental normalizer; call `feed` with text chunks, then `close`."""
+
+    def __init__(self, token_budget: Optional[int] = None, collapse_quotes: bool = True):
+        self.token_budget = token_budget
+        self.collapse_quotes = collapse_quotes
+        self._html: Optional[_TextExtractor] = None
+        self._started = False
+        self._head = ""
+        self._partial = ""
+        self._lines: List[str] = []
+        self._original_bytes = 0
+        self._original_chars = 0
+        self._tokens = 0
+        self._done = False
+        self._in_signature = False
+        # Lines after a sign-off, held until we know whether they are its signature.
+        self._pending_signature: Optional[List[str]] = None
+        # A possible reply header block, held until it is complete.
+        self._pending_header: Optional[List[str]] = None
+        self._header_intro: Optional[str] = None
+        self._in_disclaimer = False
+        self._in_quote = False
+        self._blank = True
+        self.truncated = False
+        self.quoted_removed = False
+
+    @property
+    def done(self) -> bool:
+        """True once further input would be discarded (budget spent or quoted history reached)."""
+        return self._done
+
+    def feed(self, chunk: str) -> None:
+        self._original_bytes += len(chunk.encode("utf-8"))
+        self._original_chars += len(chunk)
+        if not self._started:
+            # Chunks can be arbitrarily small; sniff the format on the first few characters.
+            self._head += chunk
+            if len(self._head.lstrip()) < _SNIFF_CHARS:
+                return
+            chunk, self._head = self._head, ""
+            self._start(chunk)
+        self._process(chunk)
+
+    def _start(self, head: str) -> None:
+        self._started = True
+        if _HTML_START.match(head):
+            self._html = _TextExtractor(self._text)
+
+    def _process(self, chunk: str) -> None:
+        if self._html is not None:
+            self._html.feed(chunk)
+        else:
+            self._text(chunk)
+
+    def close(self) -> NormalizedEmail:
+        if not self._started:
+            head, self._head = self._head, ""
+            self._start(head)
+            self._process(head)
+        if self._html is not None:
+            self._html.close()
+        if self._partial:
+            self._line(self._partial)
+            self._partial = ""
+        if self._pending_header is not None:
+            self._resolve_header()
+        # A sign-off followed only by short lines up to the end was a signature.
+        self._pending_signature = None
+        while self._lines and not self._lines[-1]:
+            self._lines.pop()
+        text = "\n".join(self._lines)
+        original_tokens = (self._original_chars + 3) // 4
+        return NormalizedEmail(
+            text=text,
+            original_bytes=self._original_bytes,
+            bytes_removed=max(0, self._original_bytes - len(text.encode("utf-8"))),
+            original_tokens=original_tokens,
+            tokens_removed=max(0, original_tokens - estimate_tokens(text)),
+            truncated=self.truncated,
+            quoted_removed=self.quoted_removed,
+        )
+
+    def _text(self, text: str) -> None:
+        if self._done:
+            return
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line)
+            if self._done:
+                self._partial = ""
+                return
+
+    def _line(self, raw: str) -> None:
+        if self._done:
+            return
+        line = _SPACES.sub(" ", raw).strip()
+        if self._pending_header is not None:
+            if not line and len(self._pending_header) == 1 and self._header_intro is not None:
+                return  # HTML puts blank lines between the rule and the headers
+            if line and _HEADER_FIELD.match(line) and len(self._pending_header) < _MAX_HEADER_LINES:
+                self._pending_header.append(line)
+                return
+            self._resolve_header()
+            if self._done:
+                return
+        if _QUOTE_INTRO.match(line):
+            self._quote_start([line])
+        elif _REPLY_MARKER.match(line):
+            self._pending_header, self._header_intro = [line], "reply"
+        elif _FORWARD_MARKER.match(line):
+            self._pending_header, self._header_intro = [line], "forward"
+        elif line[:5].lower() == "from:" and _HEADER_FIELD.match(line):
+            self._pending_header, self._header_intro = [line], None
+        else:
+            self._body_line(line)
+
+    def _resolve_header(self) -> None:
+        lines, intro = self._pending_header, self._header_intro
+        self._pending_header = self._header_intro = None
+        fields = {}
+        for line in lines:
+            match = _HEADER_FIELD.match(line)
+            if match:
+                fields.setdefault(match.group(1).lower(), match.group(2))
+        forwarded = intro == "forward" or bool(_FORWARD_SUBJECT.match(fields.get("subject", "")))
+        if not forwarded and (intro == "reply" or ("from" in fields and ("sent" in fields or "date" in fields))):
+            self._quote_start(lines)
+            return
+        if forwarded:
+            # The forwarding note ends with the forward; its sign-off was a signature.
+            self._pending_signature = None
+            self._in_signature = self._in_disclaimer = False
+        for line in lines:
+            self._body_line(line)
+
+    def _quote_start(self, lines: List[str]) -> None:
+        self._pending_signature = None
+        if self.collapse_quotes:
+            self._append(QUOTED_MARKER)
+            self.quoted_removed = True
+            self._done = True
+            return
+        # Keeping the history: a new message starts with its own body.
+        self._in_signature = self._in_disclaimer = False
+        for line in lines:
+            self._append(line)
+
+    def _body_line(self, line: str) -> None:
+        if self._done:
+            return
+        if not line:
+            self._in_disclaimer = False
+            self._in_quote = False
+            if self._pending_signature is not None:
+                self._pending_signature.append(line)
+            else:
+                self._append("")
+            return
+        if self.collapse_quotes:
+            if line.startswith(">"):
+                if not self._in_quote:
+                    self._pending_signature = None
+                    self._in_quote = True
+                    self.quoted_removed = True
+                    self._append(QUOTED_MARKER)
+                return
+        self._in_quote = False
+        if self._in_signature or self._in_disclaimer:
+            return
+        if _DISCLAIMER_START.match(line):
+            self._pending_signature = None
+            self._in_disclaimer = True
+            return
+        if self._pending_signature is not None:
+            self._pending_signature.append(line)
+            if not _signature_like(line) or sum(1 for held in self._pending_signature if held) > _SIGNATURE_MAX_LINES:
+                # More message after the sign-off: it was just a line of the body.
+                held, self._pending_signature = self._pending_signature, None
+                for held_line in held:
+                    self._body_line(held_line)
+            return
+        if _SIGNATURE_START.match(line):
+            self._in_signature = True
+            if line != "--":
+                self._append(line)
+            return
+        self._append(line)
+        if _SIGN_OFF.match(line):
+            self._pending_signature = []
+
+    def _append(self, line: str) -> None:
+        if not line:
+            if not self._blank:
+                self._lines.append("")
+            self._blank = True
+            return
+        cost = estimate_tokens(line) + 1
+        if self.token_budget is not None and self._tokens + cost > self.token_budget:
+            remaining = (self.token_budget - self._tokens - 1) * 4
+            if remaining > 0:
+                self._lines.append(line[:remaining].rsplit(" ", 1)[0])
+            self._lines.append(TRUNCATED_MARKER)
+            self.truncated = True
+            self._done = True
+            return
+        self._tokens += cost
+        self._lines.append(line)
+        self._blank = False
+
+
+def _signature_like(line: str) -> bool:
+    return len(line) <= _SIGNATURE_MAX_CHARS and not _SENTENCE.match(line)
+
+
+def normalize_email(content: str, token_budget: Optional[int] = None, collapse_quotes: bool = True) -> NormalizedEmail:
+    normalizer = EmailNormalizer(token_budget=token_budget, collapse_quotes=collapse_quotes)
+    normalizer.feed(content)
+    return normalizer.close()
+
+
+class NormalizationStats:
+    """Running totals of what normalization removed."""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_removed = 0
+        self.tokens_in = 0
+        self.tokens_removed = 0
+        self.truncated = 0
+
+    def record(self, result: NormalizedEmail) -> None:
+        self.requests += 1
+        self.bytes_in += result.original_bytes
+        self.bytes_removed += result.bytes_removed
+        self.tokens_in += result.original_tokens
+        self.tokens_removed += result.tokens_removed
+        self.truncated += result.truncated
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "bytes_in": self.bytes_in,
+            "bytes_removed": self.bytes_removed,
+            "tokens_in": self.tokens_in,
+            "tokens_removed": self.tokens_removed,
+            "truncated": self.truncated,
+            "token_reduction": self.tokens_removed / self.tokens_in if self.tokens_in else 0.0,
+        }
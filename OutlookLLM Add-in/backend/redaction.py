@@ -0,0 +1,166 @@
+"""Reversible PII redaction at the model boundary.
+
+Account numbers (plain and IBAN), SEDOLs, phone numbers and dictionary terms
+such as client names are found in one pass. Every detector is a named group
+in a single compiled regex. The dictionary is folded into a trie before it is
+compiled, so the regex engine walks a prefix tree rather than trying
+thousands of alternatives at each position. Each distinct value is replaced by
+a stable placeholder such as `[[CLIENT_1]]`. The mapping stays in the backend
+and is used to put the original values back into the model's output, either
+all at once (`Redaction.restore`) or chunk by chunk for streams
+(`StreamRestorer`).
+"""
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+_PLACEHOLDER = re.compile(r"\[\[([A-Z]+_\d+)\]\]")
+# A stream chunk may end part-way through a placeholder.
+_PLACEHOLDER_PREFIX = re.compile(r"\[(?:\[[A-Z]*(?:_\d*)?\]?)?")
+_MAX_PLACEHOLDER = 32
+
+_SEDOL_WEIGHTS = (1, 3, 1, 7, 3, 9, 1)
+
+_PATTERNS = (
+    ("IBAN", r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b"),
+    ("ACCOUNT", r"\b\d{8,17}\b"),
+    ("SEDOL", r"\b[B-DF-HJ-NP-TV-Z0-9]{6}\d\b"),
+    # A parenthesized area code is itself a group, so one fewer has to follow it.
+    (
+        "PHONE",
+        r"(?<![\w+])(?:\+\d{1,3}[ .-]?)?"
+        r"(?:\(\d{1,4}\)[ .-]?\d{2,4}(?:[ .-]\d{2,4}){1,4}|\d{2,4}(?:[ .-]\d{2,4}){2,4})(?!\w)",
+    ),
+)
+
+
+def sedol_valid(code: str) -> bool:
+    total = sum(w * (int(c) if c.isdigit() else ord(c) - 55) for w, c in zip(_SEDOL_WEIGHTS, code))
+    return total % 10 == 0
+
+
+def trie_regex(terms: Iterable[str]) -> Optional[str]:
+    """A case-insensitive regex matching any of `terms` as whole words, built from their trie."""
+    trie: dict = {}
+    for term in terms:
+        term = " ".join(term.lower().split())
+        if not term:
+            continue
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    if not trie:
+        return None
+
+    def build(node: dict) -> str:
+        branches = [
+            (r"\s+" if ch == " " else re.escape(ch)) + build(child)
+            for ch, child in sorted(node.items())
+            if ch
+        ]
+        if not branches:
+            return ""
+        if "" not in node and len(branches) == 1:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if "" in node else group
+
+    return r"(?i:(?<!\w)" + build(trie) + r"(?!\w))"
+
+
+@dataclass
+class Redaction:
+    text: str
+    mapping: Dict[str, str] = field(default_factory=dict)
+
+    def restore(self, text: str) -> str:
+        if not self.mapping:
+            return text
+        return _PLACEHOLDER.sub(lambda m: self.mapping.get(m.group(1), m.group(0)), text)
+
+
+class StreamRestorer:
+    """Restores placeholders in a stream of chunks, holding back a placeholder split across chunks."""
+
+    def __init__(self, redaction: Redaction):
+        self.redaction = redaction
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        cut = len(self._buffer)
+        start = self._buffer.rfind("[", max(0, cut - _MAX_PLACEHOLDER))
+        if start > 0 and self._buffer[start - 1] == "[":
+            start -= 1
+        if start != -1 and _PLACEHOLDER_PREFIX.fullmatch(self._buffer, start):
+            cut = start
+        ready, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return self.redaction.restore(ready)
+
+    def close(self) -> str:
+        ready, self._buffer = self._buffer, ""
+        return self.redaction.restore(ready)
+
+
+class Redactor:
+    def __init__(self, terms: Iterable[str] = (), term_label: str = "CLIENT"):
+        self.term_label = term_label
+        groups = [f"(?P<{label}>{pattern})" for label, pattern in _PATTERNS]
+        terms_pattern = trie_regex(terms)
+        if terms_pattern is not None:
+            # Dictionary terms win over the generic patterns at the same position.
+            groups.insert(0, f"(?P<{term_label}>{terms_pattern})")
+        # Every detector starts at a word start; checking that once up front
+        # skips the mid-word positions before any alternative is tried.
+        self._pattern = re.compile(r"(?<![\w+])(?:" + "|".join(groups) + ")")
+        self.requests = 0
+        self.bytes_scanned = 0
+        self.seconds = 0.0
+        self.redacted: Dict[str, int] = {}
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "Redactor":
+        """A redactor with one dictionary term per line of `path` (blank lines and #comments ignored)."""
+        if not path:
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    def redact(self, text: str) -> Redaction:
+        started = time.perf_counter()
+        mapping: Dict[str, str] = {}
+        by_value: Dict[str, str] = {}
+        counts: Dict[str, int] = {}
+
+        def replace(match: "re.Match") -> str:
+            label, value = match.lastgroup, match.group()
+            if label == "SEDOL" and not sedol_valid(value):
+                return value
+            if label == "PHONE" and sum(ch.isdigit() for ch in value) < 9:
+                # Dates and short references, not phone numbers.
+                return value
+            key = " ".join(value.lower().split()) if label == self.term_label else value
+            placeholder = by_value.get(key)
+            if placeholder is None:
+                counts[label] = counts.get(label, 0) + 1
+                placeholder = by_value[key] = f"{label}_{counts[label]}"
+                mapping[placeholder] = value
+            return f"[[{placeholder}]]"
+
+        redacted = self._pattern.sub(replace, text)
+        self.requests += 1
+        self.bytes_scanned += len(text)
+        self.seconds += time.perf_counter() - started
+        for label, count in counts.items():
+            self.redacted[label] = self.redacted.get(label, 0) + count
+        return Redaction(redacted, mapping)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "bytes_scanned": self.bytes_scanned,
+            "mb_per_second": self.bytes_scanned / self.seconds / 1e6 if self.seconds else 0.0,
+            **{f"redacted_{label.lower()}": count for label, count in sorted(self.redacted.items())},
+        }
@@ -0,0 +1,188 @@
+"""Cost- and latency-aware routing of model calls across model tiers.
+
+A tier is one model deployment: a backend with its own micro-batcher, an input
+size limit, a price per 1k input tokens and, optionally, the operations it may
+serve. For each call the router keeps the tiers that can take the operation at
+this input size and predicts each one's latency from recent traffic. It picks
+the cheapest tier predicted to meet the caller's latency SLO, or the fastest
+one when none is. With a `redactor`, prompts are redacted before they reach
+any tier and the placeholders are restored in what comes back.
+
+Latency is learned per tier and per input-size bucket (powers of two of
+tokens) as an EWMA of observed call durations. It starts from the tier's
+configured estimate, so a new tier gets traffic before it has history.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional
+
+from batching import MicroBatcher
+from llm import LLMBackend, get_backend
+from normalize import estimate_tokens
+from redaction import Redactor, StreamRestorer
+
+
+class LatencyModel:
+    """EWMA of observed latency, bucketed by input size."""
+
+    def __init__(self, prior_ms: float, alpha: float = 0.2):
+        self.prior_ms = prior_ms
+        self.alpha = alpha
+        self._buckets: Dict[int, float] = {}
+
+    @staticmethod
+    def bucket(tokens: int) -> int:
+        return max(0, int(tokens)).bit_length()
+
+    def predict(self, tokens: int) -> float:
+        """Expected latency in ms for an input of `tokens` tokens."""
+        bucket = self.bucket(tokens)
+        if bucket in self._buckets:
+            return self._buckets[bucket]
+        if self._buckets:
+            # Scale the nearest observed bucket; latency grows at most linearly with input.
+            nearest = min(self._buckets, key=lambda b: abs(b - bucket))
+            return self._buckets[nearest] * 2.0 ** max(0, bucket - nearest)
+        return self.prior_ms * max(1.0, tokens / 1000)
+
+    def observe(self, tokens: int, latency_ms: float) -> None:
+        bucket = self.bucket(tokens)
+        previous = self._buckets.get(bucket)
+        self._buckets[bucket] = latency_ms if previous is None else previous + self.alpha * (latency_ms - previous)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {f"le_{2 ** b}_tokens": round(ms, 1) for b, ms in sorted(self._buckets.items())}
+
+
+@dataclass
+class ModelTier:
+    name: str
+    backend: LLMBackend
+    max_input_tokens: Optional[int] = None
+    cost_per_1k_tokens: float = 0.0
+    latency_ms: float = 1000.0
+    operations: Optional[FrozenSet[str]] = None
+    batcher: Optional[MicroBatcher] = None
+    latency: LatencyModel = field(init=False)
+
+    def __post_init__(self):
+        if self.batcher is None:
+            self.batcher = MicroBatcher(self.backend)
+        self.latency = LatencyModel(self.latency_ms)
+
+    def serves(self, operation: str, tokens: int) -> bool:
+        if self.operations is not None and operation not in self.operations:
+            return False
+        return self.max_input_tokens is None or tokens <= self.max_input_tokens
+
+    def cost(self, tokens: int) -> float:
+        return self.cost_per_1k_tokens * tokens / 1000
+
+
+def load_tiers(specs: List[dict], max_batch_size: int = 16, max_wait_ms: float = 5.0) -> List[ModelTier]:
+    """Build tiers from config entries such as
+
+        {"name": "small", "backend": "http", "options": {"base_url": "...", "model": "..."},
+         "maxInputTokens": 2000, "costPer1kTokens": 0.1, "latencyMs": 300,
+         "operations": ["summarize_email", "ai_assistant"]}
+    """
+    tiers = []
+    for spec in specs:
+        backend = get_backend(spec.get("backend"), **spec.get("options", {}))
+        tiers.append(
+            ModelTier(
+                name=spec["name"],
+                backend=backend,
+                max_input_tokens=spec.get("maxInputTokens"),
+                cost_per_1k_tokens=float(spec.get("costPer1kTokens", 0.0)),
+                latency_ms=float(spec.get("latencyMs", 1000.0)),
+                operations=frozenset(spec["operations"]) if spec.get("operations") else None,
+                batcher=MicroBatcher(backend, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms),
+            )
+        )
+    return tiers
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        tiers: List[ModelTier],
+        default_slo_ms: Optional[Dict[str, float]] = None,
+        redactor: Optional[Redactor] = None,
+    ):
+        if not tiers:
+            raise ValueError("At least one model tier is required")
+        self.tiers = tiers
+        self.default_slo_ms = default_slo_ms or {}
+        self.redactor = redactor
+        self.routed: Dict[str, int] = {tier.name: 0 for tier in tiers}
+        self.slo_misses = 0
+
+    def choose(self, operation: str, tokens: int, slo_ms: Optional[float] = None) -> ModelTier:
+        """The cheapest tier predicted to answer within `slo_ms`, else the fastest eligible one."""
+        candidates = [tier for tier in self.tiers if tier.serves(operation, tokens)]
+        if not candidates:
+            # Nothing is configured for this size; the largest tier truncates least.
+            candidates = [max(self.tiers, key=lambda tier: tier.max_input_tokens or float("inf"))]
+        slo_ms = slo_ms if slo_ms is not None else self.default_slo_ms.get(operation)
+        within = [tier for tier in candidates if slo_ms is None or tier.latency.predict(tokens) <= slo_ms]
+        if within:
+            tier = min(within, key=lambda tier: (tier.cost(tokens), tier.latency.predict(tokens)))
+        else:
+            self.slo_misses += 1
+            tier = min(candidates, key=lambda tier: tier.latency.predict(tokens))
+        self.routed[tier.name] += 1
+        return tier
+
+    async def complete(self, operation: str, prompt: str, slo_ms: Optional[float] = None) -> str:
+        """Complete `prompt` on the tier chosen for it, through that tier's batcher."""
+        tokens = estimate_tokens(prompt)
+        tier = self.choose(operation, tokens, slo_ms)
+        if self.redactor is None:
+            started = time.perf_counter()
+            result = await tier.batcher.submit(prompt)
+            tier.latency.observe(tokens, (time.perf_counter() - started) * 1000)
+            return result
+        redaction = self.redactor.redact(prompt)
+        started = time.perf_counter()
+        result = await tier.batcher.submit(redaction.text)
+        tier.latency.observe(tokens, (time.perf_counter() - started) * 1000)
+        return redaction.restore(result)
+
+    async def stream(self, operation: str, prompt: str, slo_ms: Optional[float] = None) -> AsyncIterator[str]:
+        """Stream the completion of `prompt` from the tier chosen for it."""
+        tokens = estimate_tokens(prompt)
+        tier = self.choose(operation, tokens, slo_ms)
+        restorer = None
+        if self.redactor is not None:
+            redaction = self.redactor.redact(prompt)
+            prompt, restorer = redaction.text, StreamRestorer(redaction)
+        started = time.perf_counter()
+        async for chunk in tier.backend.stream(prompt):
+            if restorer is not None:
+                chunk = restorer.feed(chunk)
+            if chunk:
+                yield chunk
+        if restorer is not None:
+            tail = restorer.close()
+            if tail:
+                yield tail
+        tier.latency.observe(tokens, (time.perf_counter() - started) * 1000)
+
+    def counters(self) -> dict:
+        """Flat numeric counters, for the metrics registry."""
+        return {"slo_misses": self.slo_misses, **{f"routed_{name}": count for name, count in self.routed.items()}}
+
+    def stats(self) -> dict:
+        return {
+            "slo_misses": self.slo_misses,
+            "tiers": {
+                tier.name: {
+                    "routed": self.routed[tier.name],
+                    "max_input_tokens": tier.max_input_tokens,
+                    "cost_per_1k_tokens": tier.cost_per_1k_tokens,
+                    "predicted_latency_ms": tier.latency.snapshot(),
+                }
+                for tier in self.tiers
+            },
+        }
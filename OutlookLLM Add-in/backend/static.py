@@ -0,0 +1,223 @@
+"""Precompressed, cache-friendly serving of the built add-in bundle (`dist/`).
+
+Every file is read once at startup and hashed. Compressible files also get
+gzip and, when the `brotli` package is installed, brotli variants,
+precomputed at maximum compression so requests never compress on the fly.
+Script and stylesheet references in the HTML pages are rewritten to carry
+the target's content hash (`vendor.js?v=<hash>`). A request for the current
+hash is served as immutable for a year; the HTML itself is revalidated with
+its ETag on every load. A new build therefore reaches clients at once, while
+unchanged bundles are never downloaded again. Single byte ranges are served
+from the uncompressed file.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from config_store import etag_matches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml", "font/ttf")
+_MIN_COMPRESS_BYTES = 1024
+_ASSET_REF = re.compile(r"""(\b(?:src|href)=["'])([^"':?#]+\.(?:js|css))(["'])""")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_TYPES = {".js": "application/javascript", ".map": "application/json", ".woff": "font/woff", ".woff2": "font/woff2", ".ttf": "font/ttf"}
+
+
+@dataclass
+class StaticFile:
+    content_type: str
+    digest: str
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+@dataclass
+class StaticResponse:
+    status: int
+    headers: Dict[str, str]
+    body: bytes = b""
+
+
+def _content_type(path: str) -> str:
+    # Webpack's asset names carry a "!static" suffix after the real extension.
+    name = path.split("!", 1)[0]
+    ext = os.path.splitext(name)[1].lower()
+    content_type = _TYPES.get(ext) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class StaticBundle:
+    def __init__(self, root: str, gzip_level: int = 9, brotli_quality: int = 11, include_source_maps: bool = False):
+        self.root = root
+        self.include_source_maps = include_source_maps
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.files: Dict[str, StaticFile] = {}
+        self.bytes_saved: Dict[str, int] = {"gzip": 0, "br": 0}
+
+    def load(self) -> None:
+        """Read, hash and precompress every file under `root`, then rewrite the HTML pages."""
+        files: Dict[str, StaticFile] = {}
+        raw: Dict[str, bytes] = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".map") and not self.include_source_maps:
+                    continue
+                full = os.path.join(directory, name)
+                path = os.path.relpath(full, self.root).replace(os.sep, "/")
+                with open(full, "rb") as f:
+                    raw[path] = f.read()
+        for path, data in raw.items():
+            if not path.endswith(".html"):
+                files[path] = self._build(path, data)
+        for path, data in raw.items():
+            if path.endswith(".html"):
+                files[path] = self._build(path, self._rewrite_html(path, data, files))
+        self.files = files
+        logger.info("Loaded %d static files from %s (brotli %s)", len(files), self.root, "on" if brotli else "off")
+
+    def _build(self, path: str, data: bytes) -> StaticFile:
+        content_type = _content_type(path)
+        static = StaticFile(content_type=content_type, digest=hashlib.sha256(data).hexdigest()[:16], variants={"identity": data})
+        if len(data) >= _MIN_COMPRESS_BYTES and content_type.startswith(_COMPRESSIBLE):
+            candidates = {"gzip": gzip.compress(data, self.gzip_level, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(data, quality=self.brotli_quality)
+            for encoding, compressed in candidates.items():
+                if len(compressed) < len(data):
+                    static.variants[encoding] = compressed
+                    self.bytes_saved[encoding] += len(data) - len(compressed)
+        return static
+
+    def _rewrite_html(self, path: str, data: bytes, files: Dict[str, StaticFile]) -> bytes:
+        base = os.path.dirname(path)
+
+        def versioned(match: "re.Match") -> str:
+            target = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, "/")
+            static = files.get(target)
+            if static is None:
+                return match.group(0)
+            return f"{match.group(1)}{match.group(2)}?v={static.digest}{match.group(3)}"
+
+        return _ASSET_REF.sub(versioned, data.decode("utf-8")).encode("utf-8")
+
+    def serve(
+        self,
+        path: str,
+        version: Optional[str] = None,
+        accept_encoding: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None,
+        head: bool = False,
+    ) -> Optional[StaticResponse]:
+        """Build the response for `path`, or None when there is no such file."""
+        static = self.files.get(path)
+        if static is None:
+            return None
+        encoding = self._negotiate(static, accept_encoding)
+        headers = {
+            "Content-Type": static.content_type,
+            "Cache-Control": IMMUTABLE if version == static.digest else REVALIDATE,
+            "Accept-Ranges": "bytes",
+            "Vary": "Accept-Encoding",
+        }
+
+        if range_header and (if_range is None or if_range == static.etag("identity")):
+            # Ranges are served from the uncompressed representation.
+            body = static.variants["identity"]
+            byte_range = _parse_range(range_header, len(body))
+            if byte_range is None:
+                return StaticResponse(416, {**headers, "Content-Range": f"bytes */{len(body)}"})
+            if byte_range != (0, len(body) - 1):
+                start, end = byte_range
+                headers.update(
+                    {"ETag": static.etag("identity"), "Content-Range": f"bytes {start}-{end}/{len(body)}", "Content-Length": str(end - start + 1)}
+                )
+                return StaticResponse(206, headers, b"" if head else body[start : end + 1])
+
+        etag = static.etag(encoding)
+        headers["ETag"] = etag
+        if etag_matches(if_none_match, etag):
+            return StaticResponse(304, headers)
+        body = static.variants[encoding]
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(body))
+        return StaticResponse(200, headers, b"" if head else body)
+
+    @staticmethod
+    def _negotiate(static: StaticFile, accept_encoding: Optional[str]) -> str:
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best, best_q = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, wildcard)
+            if encoding in static.variants and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.files),
+            "bytes": sum(len(f.variants["identity"]) for f in self.files.values()),
+            "gzip_bytes_saved": self.bytes_saved["gzip"],
+            "brotli_bytes_saved": self.bytes_saved["br"],
+        }
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """The (start, end) of a single `bytes=` range; the whole file for ranges we don't serve; None if unsatisfiable."""
+    match = _RANGE.match(header.strip())
+    if match is None:
+        # Multiple or malformed ranges: ignore the header and send everything.
+        return (0, size - 1) if size else None
+    first, last = match.groups()
+    if not first and not last:
+        return (0, size - 1) if size else None
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
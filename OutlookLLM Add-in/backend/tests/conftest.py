@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The backend is a flat set of modules run from its own directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import app
+    from jobs import EmailJobManager
+
+    # Job workers are tasks on the event loop, and each TestClient runs its own.
+    monkeypatch.setattr(app, "jobs", EmailJobManager(workers=2))
+    with TestClient(app.app) as test_client:
+        yield test_client
+
+
+def sse_frames(body: str):
+    """(event, data) pairs of an SSE body; event is None for plain data frames."""
+    frames = []
+    for block in body.strip().split("\n\n"):
+        event, data = None, None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = line[len("data: "):]
+        if data is not None:
+            frames.append((event, json.loads(data)))
+    return frames
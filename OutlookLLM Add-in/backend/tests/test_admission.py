@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+import app
+from admission import AdmissionController, AdmissionRejected, Priority
+
+
+@pytest.mark.anyio
+async def test_waiters_are_admitted_by_priority():
+    controller = AdmissionController(max_concurrency=1)
+    holder = await controller.acquire("a", Priority.STANDARD)
+    order = []
+
+    async def wait(user, priority):
+        ticket = await controller.acquire(user, priority)
+        order.append(user)
+        ticket.release()
+
+    tasks = [asyncio.ensure_future(wait("background", Priority.BACKGROUND))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.ensure_future(wait("interactive", Priority.INTERACTIVE)))
+    await asyncio.sleep(0)
+    holder.release()
+    await asyncio.gather(*tasks)
+    assert order == ["interactive", "background"]
+    assert controller.stats()["active"] == 0
+
+
+@pytest.mark.anyio
+async def test_rate_limit_and_queue_timeout_reject():
+    controller = AdmissionController(max_concurrency=1, user_rate=1.0, user_burst=1.0, queue_timeouts={Priority.STANDARD: 0.01})
+    ticket = await controller.acquire("a", Priority.STANDARD)
+    with pytest.raises(AdmissionRejected, match="rate limit"):
+        await controller.acquire("a", Priority.STANDARD)
+    with pytest.raises(AdmissionRejected, match="timed out"):
+        await controller.acquire("b", Priority.STANDARD)
+    ticket.release()
+    assert controller.stats()["active"] == 0
+
+
+@pytest.mark.parametrize("path", ["/generate_email", "/generate_email?stream=true", "/summarize_email", "/summarize_email?stream=true"])
+def test_failed_preparation_releases_the_ticket(client, monkeypatch, path):
+    def broken(*args, **kwargs):
+        raise RuntimeError("normalizer failed")
+
+    monkeypatch.setattr(app, "prepare_content", broken)
+    response = client.post(path, json={"userId": "admission-leak", "emailContent": "Hello"})
+    assert response.status_code == 500
+    assert app.admission.stats()["active"] == 0
+
+
+def test_streaming_response_releases_the_ticket_when_done(client):
+    response = client.post("/summarize_email?stream=true", json={"userId": "admission-stream", "emailContent": "Budget review"})
+    assert response.status_code == 200
+    assert app.admission.stats()["active"] == 0
@@ -0,0 +1,79 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from batching import MicroBatcher
+from llm import LLMBackend
+
+
+class RecordingBackend(LLMBackend):
+    name = "recording"
+
+    def __init__(self, fail: bool = False):
+        self.batches: List[List[str]] = []
+        self.fail = fail
+
+    async def stream(self, prompt: str):
+        yield prompt.upper()
+
+    async def complete_batch(self, prompts: List[str]) -> List[str]:
+        self.batches.append(list(prompts))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return [prompt.upper() for prompt in prompts]
+
+
+@pytest.mark.anyio
+async def test_concurrent_prompts_share_one_backend_call():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch_size=8, max_wait_ms=20)
+    results = await asyncio.gather(*(batcher.submit(f"p{i}") for i in range(5)))
+    assert results == [f"P{i}" for i in range(5)]
+    assert backend.batches == [[f"p{i}" for i in range(5)]]
+    assert batcher.stats()["mean_batch_size"] == 5
+
+
+@pytest.mark.anyio
+async def test_full_batch_is_flushed_without_waiting_for_the_window():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch_size=2, max_wait_ms=10_000)
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(f"p{i}") for i in range(4))), timeout=1)
+    assert results == ["P0", "P1", "P2", "P3"]
+    assert [len(batch) for batch in backend.batches] == [2, 2]
+
+
+@pytest.mark.anyio
+async def test_backend_failure_reaches_every_caller_in_the_batch():
+    batcher = MicroBatcher(RecordingBackend(fail=True), max_batch_size=4, max_wait_ms=1)
+    results = await asyncio.gather(*(batcher.submit("p") for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.anyio
+async def test_in_flight_batches_are_referenced_until_done():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch_size=1, max_wait_ms=1)
+    pending = asyncio.ensure_future(batcher.submit("p"))
+    await asyncio.sleep(0)
+    assert len(batcher._tasks) == 1
+    assert await pending == "P"
+    await asyncio.sleep(0)
+    assert not batcher._tasks
+
+
+@pytest.mark.anyio
+async def test_cancelled_caller_does_not_take_a_batch_slot():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch_size=4, max_wait_ms=20)
+    abandoned = asyncio.ensure_future(batcher.submit("gone"))
+    await asyncio.sleep(0)
+    abandoned.cancel()
+    assert await batcher.submit("kept") == "KEPT"
+    assert backend.batches == [["kept"]]
+
+
+def test_batch_size_must_be_positive():
+    with pytest.raises(ValueError):
+        MicroBatcher(RecordingBackend(), max_batch_size=0)
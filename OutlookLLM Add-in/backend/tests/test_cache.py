@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from cache import ResponseCache, cache_key
+
+
+def test_cache_key_ignores_whitespace_differences():
+    assert cache_key("summarize_email", "Hello  world\n", "1") == cache_key("summarize_email", "Hello world", "1")
+    assert cache_key("summarize_email", "Hello world", "1") != cache_key("summarize_email", "Hello world", "2")
+
+
+def test_lru_evicts_least_recently_used_entry():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget_and_ttl_are_enforced():
+    cache = ResponseCache(max_bytes=10, ttl_seconds=0.01)
+    cache.set("a", "x" * 8)
+    cache.set("b", "y" * 8)
+    assert cache.get("a") is None
+    time.sleep(0.02)
+    assert cache.get("b") is None
+    assert cache.stats()["expirations"] == 1
+
+
+@pytest.mark.anyio
+async def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path=path)
+    cache.set("k", "summary")
+    cache.close()
+
+    reopened = ResponseCache(db_path=path)
+    assert reopened.get("k") is None  # memory-only lookup
+    assert await reopened.aget("k") == "summary"
+    assert reopened.get("k") == "summary"
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
+
+
+@pytest.mark.anyio
+async def test_disk_reads_and_writes_stay_off_the_event_loop(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    loop_thread = threading.get_ident()
+    disk_threads = set()
+    read = cache._read
+
+    def recording_read(key):
+        disk_threads.add(threading.get_ident())
+        return read(key)
+
+    cache._read = recording_read
+    cache.set("k", "v")
+    assert cache.stats()["entries"] == 1
+    assert await cache.aget("missing") is None
+    assert disk_threads and loop_thread not in disk_threads
+    cache.close()
+
+
+def test_queued_writes_are_persisted_on_close(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    for i in range(200):
+        cache.set(f"k{i}", str(i))
+    cache.set("k0", "latest")
+    cache.close()
+    reopened = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    assert reopened._read("k0")[0] == "latest"
+    assert reopened._read("k199")[0] == "199"
+    reopened.close()
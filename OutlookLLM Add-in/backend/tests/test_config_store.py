@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+
+from config_store import UserConfigStore, etag_matches
+
+CONFIGS = {
+    "default": {"userId": "default", "buttons": []},
+    "alice": {"userId": "alice", "buttons": [{"label": "Summarize"}], "latencySloMs": 1500},
+}
+
+
+def test_unknown_users_get_the_default_config():
+    store = UserConfigStore(CONFIGS)
+    assert json.loads(store.get("nobody").body) == CONFIGS["default"]
+    assert store.get("alice").latency_slo_ms == 1500
+
+
+def test_config_set_must_have_a_default():
+    with pytest.raises(ValueError):
+        UserConfigStore({"alice": CONFIGS["alice"]})
+
+
+def test_etag_changes_only_with_content():
+    first = UserConfigStore(CONFIGS).get("alice").etag
+    assert UserConfigStore(dict(CONFIGS)).get("alice").etag == first
+    changed = {**CONFIGS, "alice": {**CONFIGS["alice"], "buttons": []}}
+    assert UserConfigStore(changed).get("alice").etag != first
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc", "def"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"def"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_reload_swaps_in_a_changed_source_file(tmp_path):
+    source = tmp_path / "configs.json"
+    source.write_text(json.dumps(CONFIGS))
+    store = UserConfigStore(CONFIGS, source=str(source))
+    assert store.reload()
+    assert not store.reload()
+    source.write_text(json.dumps({**CONFIGS, "bob": {"userId": "bob"}}))
+    os.utime(source, (0, 12345))
+    assert store.reload()
+    assert json.loads(store.get("bob").body) == {"userId": "bob"}
+
+
+def test_get_user_config_answers_304_for_a_matching_etag(client):
+    response = client.get("/getUserConfig/user1")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    again = client.get("/getUserConfig/user1", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import app
+from conversation import ConversationStore, message_hash, split_thread
+
+FIRST = "Hi Bob,\n\nCan we move the closing to Friday?\n\nAlice"
+SECOND_BODY = "Friday works. I'll update the documents."
+THIRD_BODY = "Great, see you Friday."
+
+SECOND = (
+    f"{SECOND_BODY}\n\n"
+    "From: Alice Smith <alice@example.com>\n"
+    "Sent: Monday, March 3, 2025 9:12 AM\n"
+    "To: Bob Jones <bob@example.com>\n"
+    "Cc: Deals Team <deals@example.com>\n"
+    "Subject: Deal closing\n\n"
+    f"{FIRST}"
+)
+THIRD = (
+    f"{THIRD_BODY}\n\n"
+    "From: Bob Jones <bob@example.com>\n"
+    "Sent: Monday, March 3, 2025 10:40 AM\n"
+    "To: Alice Smith <alice@example.com>\n"
+    "Subject: RE: Deal closing\n\n"
+    f"{SECOND}"
+)
+
+
+def test_outlook_header_block_is_removed_whole():
+    assert split_thread(THIRD) == [FIRST, SECOND_BODY, THIRD_BODY]
+
+
+def test_quoted_copies_hash_like_the_original_message():
+    assert message_hash(split_thread(SECOND)[0]) == message_hash(FIRST)
+    assert message_hash(split_thread(THIRD)[1]) == message_hash(split_thread(SECOND)[1])
+
+
+def test_other_reply_separators():
+    gmail = f"{SECOND_BODY}\n\nOn Mon, Mar 3, 2025 at 9:12 AM Alice <alice@example.com> wrote:\n> Hi Bob,\n>\n> Can we move it?"
+    assert split_thread(gmail) == ["Hi Bob,\n\nCan we move it?", SECOND_BODY]
+    original = f"{SECOND_BODY}\n\n-----Original Message-----\nFrom: Alice\nSent: Monday\nTo: Bob\nSubject: x\n\n{FIRST}"
+    assert split_thread(original)[-1] == SECOND_BODY
+
+
+def test_only_new_outlook_replies_are_folded():
+    store = ConversationStore()
+    summary, new, hashes = store.plan("u1", "c1", SECOND)
+    assert new == [FIRST, SECOND_BODY]
+    store.commit("u1", "c1", "summary v1", hashes)
+    summary, new, hashes = store.plan("u1", "c1", THIRD)
+    assert summary == "summary v1"
+    assert new == [THIRD_BODY]
+
+
+def test_conversations_are_scoped_to_the_user():
+    store = ConversationStore()
+    _, _, hashes = store.plan("alice", "shared-id", SECOND)
+    store.commit("alice", "shared-id", "alice's summary", hashes)
+    summary, new, _ = store.plan("mallory", "shared-id", THIRD)
+    assert summary == ""
+    assert len(new) == 3
+    assert store.get_summary("mallory", "shared-id") is None
+
+
+def test_lru_bounds_the_number_of_conversations():
+    store = ConversationStore(max_conversations=2)
+    for conversation_id in ("a", "b", "c"):
+        store.commit("u", conversation_id, conversation_id, [])
+    assert store.get_summary("u", "a") is None
+    assert store.get_summary("u", "c") == "c"
+
+
+@pytest.mark.anyio
+async def test_locks_are_dropped_once_released():
+    store = ConversationStore()
+    order = []
+
+    async def fold(name):
+        async with store.lock("u", "c1"):
+            order.append(name)
+            await asyncio.sleep(0.01)
+            order.append(name)
+
+    await asyncio.gather(fold("first"), fold("second"))
+    assert order == ["first", "first", "second", "second"]
+    # Neither fold committed a state; nothing is left behind.
+    with pytest.raises(RuntimeError):
+        async with store.lock("u", "c2"):
+            raise RuntimeError("fold failed")
+    assert store.stats()["locks"] == 0
+
+
+@pytest.fixture
+def counted_prompts(monkeypatch):
+    prompts = []
+    real_stream = app.router.stream
+
+    def stream(operation, prompt, slo_ms=None):
+        prompts.append(prompt)
+        return real_stream(operation, prompt, slo_ms)
+
+    monkeypatch.setattr(app.router, "stream", stream)
+    return prompts
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_endpoint_folds_only_the_new_reply(client, counted_prompts, monkeypatch, stream):
+    real_complete = app.router.complete
+
+    async def complete(operation, prompt, slo_ms=None):
+        counted_prompts.append(prompt)
+        return await real_complete(operation, prompt, slo_ms)
+
+    monkeypatch.setattr(app.router, "complete", complete)
+    conversation_id = f"deal-{stream}"
+    for content in (SECOND, THIRD):
+        body = {"userId": "conversation-user", "emailContent": content, "conversationId": conversation_id}
+        assert client.post(f"/summarize_email?stream={str(stream).lower()}", json=body).status_code == 200
+    assert len(counted_prompts) == 2
+    assert "Can we move the closing" not in counted_prompts[1]
+    assert THIRD_BODY in counted_prompts[1]
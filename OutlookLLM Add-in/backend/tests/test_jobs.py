@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from jobs import EmailJobManager, JobStatus
+
+
+async def echo(job, on_delta):
+    for word in ("hello ", "world"):
+        on_delta(word)
+        await asyncio.sleep(0)
+    return {"body": "hello world"}
+
+
+async def fail(job, on_delta):
+    raise RuntimeError("model unavailable")
+
+
+async def wait_finished(manager, job_id):
+    while manager.get(job_id).status not in (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED):
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.anyio
+async def test_live_subscription_gets_deltas_then_done():
+    manager = EmailJobManager(workers=1)
+    job = manager.submit("u1", "generate_email", echo)
+    events = [event async for event in manager.subscribe(job.job_id)]
+    assert [name for name, _ in events] == ["snapshot", "status", "delta", "delta", "done"]
+    assert events[-1][1]["result"] == {"body": "hello world"}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("runner, terminal", [(echo, "done"), (fail, "error")])
+async def test_subscribing_to_a_finished_job_still_ends_with_its_terminal_event(runner, terminal):
+    manager = EmailJobManager(workers=1)
+    job = manager.submit("u1", "generate_email", runner)
+    await wait_finished(manager, job.job_id)
+    events = [event async for event in manager.subscribe(job.job_id)]
+    assert [name for name, _ in events] == ["snapshot", terminal]
+    assert events[-1][1]["status"] == job.status.value
+
+
+@pytest.mark.anyio
+async def test_expired_jobs_are_purged_on_lookup():
+    manager = EmailJobManager(workers=1, retention_seconds=0.01)
+    job = manager.submit("u1", "generate_email", echo)
+    await wait_finished(manager, job.job_id)
+    time.sleep(0.02)
+    assert manager.get(job.job_id) is None
+    assert manager.stats()["jobs"] == 0
+
+
+@pytest.mark.anyio
+async def test_subscribing_to_a_purged_job_ends_with_a_gone_error():
+    manager = EmailJobManager(workers=1, retention_seconds=0.01)
+    job = manager.submit("u1", "generate_email", echo)
+    await wait_finished(manager, job.job_id)
+    time.sleep(0.02)
+    manager.get(job.job_id)
+    events = [event async for event in manager.subscribe(job.job_id)]
+    assert events == [("error", {"jobId": job.job_id, "status": "GONE", "error": "Job not found or expired"})]
+
+
+def test_websocket_feed_of_a_finished_job_closes_after_done(client):
+    response = client.post("/generate_email?async_job=true", json={"userId": "jobs-ws", "emailContent": "Agenda for Monday"})
+    job_id = response.json()["jobId"]
+    for _ in range(200):
+        if client.get(f"/jobs/{job_id}").json()["status"] == "SUCCEEDED":
+            break
+        time.sleep(0.01)
+    with client.websocket_connect(f"/jobs/{job_id}/ws") as websocket:
+        assert websocket.receive_json()["event"] == "snapshot"
+        done = websocket.receive_json()
+    assert done["event"] == "done" and done["data"]["status"] == "SUCCEEDED"
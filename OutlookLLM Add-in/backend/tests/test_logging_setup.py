@@ -0,0 +1,33 @@
+import io
+import json
+import logging
+
+import logging_setup
+from logging_setup import request_id_var, setup_logging, stop_logging
+
+
+def test_records_are_written_as_json_with_request_id():
+    stream = io.StringIO()
+    setup_logging(stream=stream)
+    token = request_id_var.set("req-1")
+    try:
+        logging.getLogger("test").info("hello %s", "world", extra={"user": "u1"})
+    finally:
+        request_id_var.reset(token)
+    stop_logging()
+    entry = json.loads(stream.getvalue().splitlines()[-1])
+    assert entry["msg"] == "hello world"
+    assert entry["request_id"] == "req-1" and entry["user"] == "u1"
+    setup_logging()
+
+
+def test_repeated_setup_registers_one_exit_hook_and_stop_is_idempotent(monkeypatch):
+    registered = []
+    monkeypatch.setattr(logging_setup.atexit, "register", registered.append)
+    monkeypatch.setattr(logging_setup, "_stop_registered", False)
+    for _ in range(3):
+        setup_logging(stream=io.StringIO())
+    assert registered == [stop_logging]
+    stop_logging()
+    stop_logging()
+    setup_logging()
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from mapreduce import MapReduceSummarizer, chunk_text
+from normalize import estimate_tokens
+
+
+def test_chunks_respect_the_budget_and_paragraphs():
+    text = "\n\n".join(f"Paragraph {i} " + "word " * 30 for i in range(20))
+    chunks = chunk_text(text, 100)
+    assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+    assert "\n\n".join(chunks).split() == text.split()
+
+
+def test_oversized_paragraphs_are_split_on_sentences_then_words():
+    text = "First sentence here. " * 50 + "x" * 2000
+    chunks = chunk_text(text, 50)
+    assert all(estimate_tokens(chunk) <= 50 for chunk in chunks)
+    assert "".join("".join(chunks).split()) == "".join(text.split())
+
+
+@pytest.mark.anyio
+async def test_chunks_are_summarized_in_parallel_then_merged_to_one():
+    running = peak = 0
+
+    async def summarize(chunk: str) -> str:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "s" * 40
+
+    async def merge(summaries):
+        return "m" * 40
+
+    summarizer = MapReduceSummarizer(summarize, merge, chunk_tokens=50, merge_tokens=30, parallelism=3)
+    text = "\n\n".join("word " * 35 for _ in range(9))
+    seen = [index async for index, total, _ in summarizer.summarize_chunks(text)]
+    assert sorted(seen) == list(range(9))
+    assert peak == 3
+    assert await summarizer.run(text) == "m" * 40
+
+
+@pytest.mark.anyio
+async def test_empty_text_needs_no_model_call():
+    async def fail(_):
+        raise AssertionError("should not be called")
+
+    assert await MapReduceSummarizer(fail, fail).run("   ") == ""
@@ -0,0 +1,83 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from metrics import Histogram, MetricsMiddleware, MetricsRegistry
+
+
+def make_client(registry: MetricsRegistry) -> TestClient:
+    app = FastAPI()
+    seen_in_flight = []
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        seen_in_flight.append(dict(registry.in_flight))
+        if item_id == "missing":
+            raise HTTPException(status_code=404)
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, registry=registry, routes=app.router.routes)
+    client = TestClient(app)
+    client.seen_in_flight = seen_in_flight
+    return client
+
+
+def test_requests_are_labelled_by_route_template_and_status():
+    registry = MetricsRegistry(namespace="t")
+    client = make_client(registry)
+    client.get("/items/a")
+    client.get("/items/b")
+    client.get("/items/missing")
+    client.get("/nowhere")
+    route = (("method", "GET"), ("route", "/items/{item_id}"))
+    assert registry.requests[route + (("status", "200"),)] == 2
+    assert registry.requests[route + (("status", "404"),)] == 1
+    assert registry.requests[(("method", "GET"), ("route", "unmatched"), ("status", "404"))] == 1
+    assert registry.latency[route].count == 3
+    rendered = registry.render()
+    assert 't_http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in rendered
+    assert "item_id=" not in rendered and "/items/a" not in rendered
+
+
+def test_in_flight_gauge_covers_the_request():
+    registry = MetricsRegistry(namespace="t")
+    client = make_client(registry)
+    client.get("/items/a")
+    route = (("method", "GET"), ("route", "/items/{item_id}"))
+    assert client.seen_in_flight == [{route: 1}]
+    assert registry.in_flight[route] == 0
+    assert 't_http_requests_in_flight{method="GET",route="/items/{item_id}"} 0' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative_and_upper_inclusive():
+    histogram = Histogram((1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+    assert histogram.render("h", (("route", "/x"),)) == [
+        'h_bucket{route="/x",le="1"} 2',
+        'h_bucket{route="/x",le="5"} 3',
+        'h_bucket{route="/x",le="+Inf"} 4',
+        'h_sum{route="/x"} 14.5',
+        'h_count{route="/x"} 4',
+    ]
+
+
+def test_monotonic_stats_are_counters():
+    registry = MetricsRegistry(namespace="t")
+    registry.register_stats(
+        "cache", lambda: {"entries": 3, "hits": 7, "batches_total": 2, "routed_fast": 1, "sizes": {"1": 2}},
+        counters=("hits", "routed_*"),
+    )
+    lines = registry.render().splitlines()
+    assert lines[lines.index("# TYPE t_cache_entries gauge") + 1] == "t_cache_entries 3.0"
+    assert lines[lines.index("# TYPE t_cache_hits_total counter") + 1] == "t_cache_hits_total 7.0"
+    assert lines[lines.index("# TYPE t_cache_batches_total counter") + 1] == "t_cache_batches_total 2.0"
+    assert "# TYPE t_cache_routed_fast_total counter" in lines
+    assert not any("sizes" in line for line in lines)
+
+
+def test_app_exports_its_metrics(client):
+    client.get("/getUserConfig/metrics-user")
+    body = client.get("/metrics").text
+    assert 'route="/getUserConfig/{user_id}"' in body
+    assert "# TYPE outlook_llm_admission_admitted_total counter" in body
+    assert "# TYPE outlook_llm_admission_active gauge" in body
@@ -0,0 +1,52 @@
+from normalize import QUOTED_MARKER, TRUNCATED_MARKER, EmailNormalizer, normalize_email
+
+
+def test_trailing_signature_is_dropped_but_sign_off_kept():
+    result = normalize_email("Hi,\n\nSee attached.\n\nThanks,\nBob Jones\nVP Sales\n+44 20 1234 5678")
+    assert result.text == "Hi,\n\nSee attached.\n\nThanks,"
+
+
+def test_mid_body_sign_off_keeps_the_rest_of_the_message():
+    body = "Hi,\n\nThanks,\n\nAlso the deadline moved to Friday, please update the tracker.\n\nBob"
+    assert normalize_email(body).text == body
+
+
+def test_sign_off_before_quoted_history_drops_signature():
+    result = normalize_email("Sounds good.\n\nRegards,\nJane\n\nOn Mon, 1 Jan 2024, Bob wrote:\n> old")
+    assert result.text == "Sounds good.\n\nRegards,\n" + QUOTED_MARKER
+    assert result.quoted_removed
+
+
+def test_outlook_reply_header_collapses_history():
+    body = "Works for me.\n\n________________________________\nFrom: Alice\nSent: Monday\nTo: Bob\nSubject: RE: Deal\n\nold"
+    assert normalize_email(body).text == "Works for me.\n\n" + QUOTED_MARKER
+
+
+def test_bare_from_line_is_not_a_separator():
+    body = "Please check the memo.\nFrom: the desk of the CEO\nmore text"
+    assert normalize_email(body).text == body
+    assert normalize_email("Reply\n\nFrom: Alice\nDate: Mon\n\nold").text == "Reply\n\n" + QUOTED_MARKER
+
+
+def test_forwarded_messages_are_kept():
+    gmail = "FYI\n\n---------- Forwarded message ---------\nFrom: Alice\nDate: Mon\nSubject: Deal\n\nThe price is 10."
+    outlook = "FYI\n\n________________________________\nFrom: Alice\nSent: Mon\nTo: Bob\nSubject: FW: Deal\n\nThe price is 10."
+    for body in (gmail, outlook):
+        result = normalize_email(body)
+        assert result.text == body
+        assert not result.quoted_removed
+
+
+def test_html_reply_is_collapsed_in_chunks():
+    html = "<div>Hi</div><p>Thanks,</p><p>Jane</p><hr><p><b>From:</b> Bob</p><p><b>Sent:</b> Mon</p><p>old</p>"
+    normalizer = EmailNormalizer()
+    for i in range(0, len(html), 7):
+        normalizer.feed(html[i:i + 7])
+    assert normalizer.close().text == "Hi\n\nThanks,\n" + QUOTED_MARKER
+
+
+def test_disclaimer_dropped_and_budget_truncates():
+    assert normalize_email("Hello\n\nThis email and any attachments are confidential.").text == "Hello"
+    result = normalize_email("word " * 400, token_budget=20)
+    assert result.truncated
+    assert result.text.endswith(TRUNCATED_MARKER)
@@ -0,0 +1,327 @@
+"""Job bookkeeping of the portfolio agent demo (src/taskpane/components/test.py)."""
+import asyncio
+import gc
+import importlib.util
+import os
+import sys
+import threading
+import time
+import weakref
+
+import pytest
+
+WORKFLOW = os.path.join(os.path.dirname(__file__), "..", "..", "src", "taskpane", "components", "test.py")
+
+
+@pytest.fixture(scope="module")
+def workflow():
+    # Loaded under its own name: "test" would clash with the standard library package.
+    spec = importlib.util.spec_from_file_location("portfolio_workflow", WORKFLOW)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    try:
+        spec.loader.exec_module(module)
+    except ModuleNotFoundError as e:
+        del sys.modules[spec.name]
+        # Only a missing agent framework skips these; any other import error is a failure.
+        if (e.name or "").split(".")[0] not in ("langgraph", "langchain_core"):
+            raise
+        pytest.skip(f"the portfolio workflow needs {e.name}")
+    yield module
+    del sys.modules[spec.name]
+
+
+def test_finished_job_is_kept_while_more_jobs_than_max_jobs_are_running(workflow):
+    manager = workflow.JobManager(retention=workflow.RetentionPolicy(max_jobs=2, max_age_seconds=None))
+    job_ids = [manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS) for _ in range(5)]
+    for job_id in job_ids:
+        manager.update_job(job_id, status=workflow.JobStatus.RUNNING)
+    manager.update_job(job_ids[0], status=workflow.JobStatus.SUCCEEDED)
+    assert manager.get_job(job_ids[0]) is not None
+    for job_id in job_ids[1:]:
+        manager.update_job(job_id, status=workflow.JobStatus.SUCCEEDED)
+    assert manager.evicted == 3
+    assert [job.job_id for job in manager.list_jobs()] == job_ids[3:]
+
+
+def test_sqlite_store_survives_a_restart(workflow, tmp_path):
+    path = str(tmp_path / "jobs.db")
+    manager = workflow.JobManager(store=workflow.SQLiteJobStore(path))
+    done = manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS, {"account": "ACC1"})
+    manager.update_job(done, status=workflow.JobStatus.SUCCEEDED, progress=1.0,
+                       result={"report": workflow.ArtifactRef(uri="s3://r", schema_hash="h")})
+    running = manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS)
+    manager.update_job(running, status=workflow.JobStatus.RUNNING)
+    manager.store.close()
+
+    restarted = workflow.JobManager(store=workflow.SQLiteJobStore(path), recovery="fail")
+    assert restarted.interrupted == [running]
+    assert restarted.get_job(running).status == workflow.JobStatus.FAILED
+    assert restarted.get_job(done).result["report"].uri == "s3://r"
+    assert [job.job_id for job in restarted.list_jobs(account="ACC1")] == [done]
+    restarted.store.close()
+
+
+def test_failed_flush_keeps_the_jobs_for_the_next_one(workflow, tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = workflow.SQLiteJobStore(path, flush_interval=60)
+
+    def broken_row(job):
+        raise OSError("disk full")
+
+    store._row = broken_row
+    manager = workflow.JobManager(store=store)
+    job_id = manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS)
+    try:
+        store.flush()
+    except OSError:
+        pass
+    del store._row
+    store.close()
+    reloaded = workflow.SQLiteJobStore(path)
+    assert [job.job_id for job in reloaded.load()] == [job_id]
+    reloaded.close()
+
+
+def test_store_writes_the_snapshot_taken_at_save(workflow, tmp_path):
+    store = workflow.SQLiteJobStore(str(tmp_path / "jobs.db"), flush_interval=60)
+    manager = workflow.JobManager(store=store)
+    job_id = manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS, {"account": "ACC1"})
+    manager.get_job(job_id).metadata["account"] = "changed outside the manager"
+    store.close()
+    reloaded = workflow.SQLiteJobStore(str(tmp_path / "jobs.db"))
+    assert reloaded.load()[0].metadata == {"account": "ACC1"}
+    reloaded.close()
+
+
+def test_store_is_safe_to_flush_and_load_from_many_threads(workflow, tmp_path):
+    store = workflow.SQLiteJobStore(str(tmp_path / "jobs.db"), flush_interval=0.001, batch_size=1)
+    manager = workflow.JobManager(store=store)
+    errors = []
+
+    def churn():
+        try:
+            for _ in range(50):
+                job_id = manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS)
+                manager.update_job(job_id, status=workflow.JobStatus.RUNNING)
+                store.flush()
+                store.load()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=churn) for _ in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    store.close()
+    assert errors == []
+    reloaded = workflow.SQLiteJobStore(str(tmp_path / "jobs.db"))
+    assert len(reloaded.load()) == 200
+    reloaded.close()
+
+
+def test_closed_store_is_released(workflow, tmp_path):
+    store = workflow.SQLiteJobStore(str(tmp_path / "jobs.db"))
+    store.close()
+    store.close()
+    ref = weakref.ref(store)
+    del store
+    gc.collect()
+    assert ref() is None
+
+
+def test_unknown_recovery_mode_is_rejected(workflow):
+    with pytest.raises(ValueError):
+        workflow.JobManager(recovery="resume")
+
+
+class GatedGraph:
+    """A stand-in compiled graph whose single step waits for `gate`."""
+
+    def __init__(self, gate):
+        self.gate = gate
+
+    def stream(self, inputs):
+        self.gate.wait(5)
+        yield {"analyze": {"report": inputs["account"]}}
+
+
+def test_bounded_executor_rejects_beyond_capacity_and_queue(workflow):
+    manager = workflow.JobManager()
+    executor = workflow.ThreadPoolTaskExecutor(manager, max_workers=1, queue_size=1)
+    gate = threading.Event()
+    jobs = [manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS) for _ in range(3)]
+    executor.submit_task(GatedGraph(gate), jobs[0], {"account": "A"})
+    executor.submit_task(GatedGraph(gate), jobs[1], {"account": "B"})
+    with pytest.raises(workflow.ExecutorSaturated):
+        executor.submit_task(GatedGraph(gate), jobs[2], {"account": "C"})
+    assert manager.get_job(jobs[2]).status == workflow.JobStatus.CANCELLED
+    gate.set()
+    executor.shutdown()
+    assert [manager.get_job(job_id).result for job_id in jobs[:2]] == [{"report": "A"}, {"report": "B"}]
+    stats = executor.stats()
+    assert (stats["submitted"], stats["completed"], stats["rejected"], stats["active"]) == (2, 2, 1, 0)
+
+
+def test_task_executor_is_abstract(workflow):
+    with pytest.raises(TypeError):
+        workflow.TaskExecutor(workflow.JobManager(), capacity=1, queue_size=1, on_full="reject", submit_timeout=None)
+
+
+def test_batch_service_state_is_per_instance_and_dropped_on_retrieval(workflow):
+    service = workflow.BatchProcessingService(runtime_s=0.01)
+    other = workflow.BatchProcessingService()
+    done, failed = service.start_prediction_job([], {}), service.start_prediction_job([], {})
+    assert service.wait_for_job(done, timeout=5) == workflow.JobStatus.SUCCEEDED
+    service.get_job_results(done)
+    service.forget(failed)
+    assert service.stats()["jobs"] == 0
+    assert other.stats() == {"jobs": 0, "pending": 0, "notifications": 0, "status_checks": 0}
+
+
+def test_batch_wait_benchmark_leaves_the_service_defaults_alone(workflow):
+    result = workflow.benchmark_batch_waits(5, runtime_s=0.01, notifications=False)
+    assert result["status_checks"] >= 5
+    service = workflow.BatchProcessingService()
+    assert (service.runtime_s, service.supports_notifications) == (2.0, True)
+
+
+class WaitingGraph(GatedGraph):
+    """Like GatedGraph, but waits the way a node waiting on an external service does."""
+
+    def __init__(self, gate, workflow):
+        super().__init__(gate)
+        self.workflow = workflow
+
+    def stream(self, inputs):
+        with self.workflow.blocking_wait():
+            yield from super().stream(inputs)
+
+
+def test_job_waiting_on_a_service_frees_its_worker(workflow):
+    manager = workflow.JobManager()
+    executor = workflow.ThreadPoolTaskExecutor(manager, max_workers=1, queue_size=2, max_waiting=1)
+    service_done, gate = threading.Event(), threading.Event()
+    slow, fast, queued = (manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS) for _ in range(3))
+    executor.submit_task(WaitingGraph(service_done, workflow), slow, {"account": "A"})
+    executor.submit_task(GatedGraph(gate), fast, {"account": "B"})
+    gate.set()
+    executor.submit_task(WaitingGraph(service_done, workflow), queued, {"account": "C"})
+    # Only one job can wait off-slot; the second waits holding the worker.
+    for _ in range(100):
+        if manager.get_job(fast).status == workflow.JobStatus.SUCCEEDED: break
+        threading.Event().wait(0.05)
+    assert manager.get_job(fast).result == {"report": "B"}
+    assert executor.stats()["waiting"] == 1
+    service_done.set()
+    executor.shutdown()
+    assert [manager.get_job(job_id).status for job_id in (slow, queued)] == [workflow.JobStatus.SUCCEEDED] * 2
+    assert executor.stats()["waiting"] == 0
+
+
+class ThematicGraph(GatedGraph):
+    """GatedGraph taking the thematic workflow's inputs."""
+
+    def stream(self, inputs):
+        yield from super().stream({"account": inputs["portfolio_account"]})
+
+
+def test_recovery_beyond_executor_capacity_fails_the_overflow(workflow, tmp_path):
+    path = str(tmp_path / "jobs.db")
+    manager = workflow.JobManager(store=workflow.SQLiteJobStore(path))
+    job_ids = [manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS, {"account": "ACC1", "query": "q"}) for _ in range(5)]
+    for job_id in job_ids:
+        manager.update_job(job_id, status=workflow.JobStatus.RUNNING)
+    manager.store.close()
+
+    restarted = workflow.JobManager(store=workflow.SQLiteJobStore(path))
+    executor = workflow.ThreadPoolTaskExecutor(restarted, max_workers=1, queue_size=1)
+    gate = threading.Event()
+    resubmitted = workflow.resubmit_interrupted(restarted, executor, ThematicGraph(gate))
+    assert resubmitted == job_ids[:2]
+    for job_id in job_ids[2:]:
+        job = restarted.get_job(job_id)
+        assert job.status == workflow.JobStatus.FAILED
+        assert "executor at capacity" in job.error
+    gate.set()
+    executor.shutdown()
+    assert [restarted.get_job(job_id).status for job_id in resubmitted] == [workflow.JobStatus.SUCCEEDED] * 2
+    restarted.store.close()
+
+
+class SleepingGraph:
+    """Works for `busy` seconds, then waits on a service for `wait` seconds."""
+
+    def __init__(self, workflow, busy, wait):
+        self.workflow, self.busy, self.wait = workflow, busy, wait
+
+    def stream(self, inputs):
+        time.sleep(self.busy)
+        with self.workflow.blocking_wait():
+            time.sleep(self.wait)
+        yield {"analyze": {"report": inputs["account"]}}
+
+
+def test_waiting_jobs_are_not_counted_as_active_or_busy(workflow):
+    manager = workflow.JobManager()
+    executor = workflow.ThreadPoolTaskExecutor(manager, max_workers=2, queue_size=8)
+    for i in range(5):
+        job_id = manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS)
+        executor.submit_task(SleepingGraph(workflow, busy=0.02, wait=0.3), job_id, {"account": str(i)})
+    peak_active = 0
+    while executor.stats()["completed"] < 5:
+        stats = executor.stats()
+        peak_active = max(peak_active, stats["active"])
+        time.sleep(0.005)
+    executor.shutdown()
+    stats = executor.stats()
+    assert peak_active <= 2
+    assert 0 < stats["utilization"] <= 1.0
+    assert (stats["active"], stats["waiting"]) == (0, 0)
+
+
+class AsyncGatedGraph(GatedGraph):
+    """GatedGraph for the asyncio executor."""
+
+    async def astream(self, inputs):
+        while not self.gate.is_set():
+            await asyncio.sleep(0.01)
+        yield {"analyze": {"report": inputs["account"]}}
+
+
+def test_asyncio_executor_shutdown_cancels_outstanding_jobs_and_is_idempotent(workflow):
+    manager = workflow.JobManager()
+    executor = workflow.AsyncioTaskExecutor(manager, max_concurrency=1, queue_size=1)
+    gate = threading.Event()
+    running, queued = (manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS) for _ in range(2))
+    executor.submit_task(AsyncGatedGraph(gate), running, {"account": "A"})
+    executor.submit_task(AsyncGatedGraph(gate), queued, {"account": "B"})
+    while manager.get_job(running).status != workflow.JobStatus.RUNNING:
+        time.sleep(0.01)
+    executor.shutdown(wait=False)
+    executor.shutdown()
+    assert [manager.get_job(job_id).status for job_id in (running, queued)] == [workflow.JobStatus.CANCELLED] * 2
+    stats = executor.stats()
+    assert (stats["active"], stats["queued"], stats["tasks"]) == (0, 0, 0)
+    with pytest.raises(RuntimeError):
+        executor.submit_task(AsyncGatedGraph(gate), manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS), {"account": "C"})
+
+
+def test_asyncio_executor_runs_the_async_thematic_workflow(workflow):
+    manager = workflow.JobManager()
+    executor = workflow.AsyncioTaskExecutor(manager, max_concurrency=2, queue_size=0)
+    graph = workflow.build_thematic_analysis_workflow(
+        None, use_async=True, batch_service=workflow.BatchProcessingService(runtime_s=0.05))
+    metadata = {"account": "ACC12345", "query": "AI innovation"}
+    job_ids = [manager.create_job(workflow.TaskType.THEMATIC_ANALYSIS, metadata) for _ in range(3)]
+    for job_id in job_ids[:2]:
+        executor.submit_task(graph, job_id, workflow.thematic_workflow_inputs(metadata))
+    with pytest.raises(workflow.ExecutorSaturated):
+        executor.submit_task(graph, job_ids[2], workflow.thematic_workflow_inputs(metadata))
+    executor.shutdown()
+    for job_id in job_ids[:2]:
+        job = manager.get_job(job_id)
+        assert job.status == workflow.JobStatus.SUCCEEDED
+        assert job.result["optimized_weights_ref"].metadata == {"account": "ACC12345"}
+    stats = executor.stats()
+    assert (stats["submitted"], stats["completed"], stats["rejected"], stats["active"]) == (2, 2, 1, 0)
+    assert 0 < stats["utilization"] <= 1.0
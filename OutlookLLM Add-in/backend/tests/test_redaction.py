@@ -0,0 +1,44 @@
+import pytest
+
+from redaction import Redactor, StreamRestorer
+
+
+@pytest.mark.parametrize(
+    "phone",
+    [
+        "+1 (212) 555-1234",
+        "(212) 555-1234",
+        "(212)555-1234",
+        "212-555-1234",
+        "212.555.1234",
+        "+1 212 555 1234",
+        "+1-212-555-1234",
+        "+44 (0) 20 7946 0958",
+        "+44 20 7946 0958",
+    ],
+)
+def test_phone_numbers_are_redacted(phone):
+    redaction = Redactor().redact(f"Call me on {phone} today.")
+    assert redaction.text == "Call me on [[PHONE_1]] today."
+    assert redaction.restore(redaction.text) == f"Call me on {phone} today."
+
+
+@pytest.mark.parametrize("text", ["Meeting on 2024-01-15", "See item (3) 10-20 of the list", "Version 1.2.3"])
+def test_dates_and_short_references_are_not_phones(text):
+    assert Redactor().redact(text).text == text
+
+
+def test_accounts_sedols_and_client_terms():
+    redactor = Redactor(["Acme Holdings", "Acme"])
+    redaction = redactor.redact("Acme Holdings moved 12345678 into GB82 WEST 1234 5698 7654 32; buy 0263494, not 0263495. acme  holdings agreed.")
+    assert redaction.text == (
+        "[[CLIENT_1]] moved [[ACCOUNT_1]] into [[IBAN_1]]; buy [[SEDOL_1]], not 0263495. [[CLIENT_1]] agreed."
+    )
+    assert redactor.stats()["redacted_client"] == 1
+
+
+def test_stream_restorer_handles_placeholders_split_across_chunks():
+    redaction = Redactor(["Acme"]).redact("Acme called from (212) 555-1234")
+    restorer = StreamRestorer(redaction)
+    chunks = ["Reply to [[CLI", "ENT_1]] at [", "[PHONE_1]]", "."]
+    assert "".join(restorer.feed(chunk) for chunk in chunks) + restorer.close() == "Reply to Acme at (212) 555-1234."
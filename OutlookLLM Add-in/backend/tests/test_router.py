@@ -0,0 +1,50 @@
+import pytest
+
+from llm import StubLLMBackend
+from router import LatencyModel, ModelRouter, ModelTier
+
+
+def tiers():
+    return [
+        ModelTier("small", StubLLMBackend(), max_input_tokens=1000, cost_per_1k_tokens=0.1, latency_ms=800),
+        ModelTier("large", StubLLMBackend(), cost_per_1k_tokens=1.0, latency_ms=200),
+    ]
+
+
+def test_cheapest_tier_within_slo_wins():
+    router = ModelRouter(tiers())
+    assert router.choose("summarize_email", 500, slo_ms=1000).name == "small"
+    assert router.choose("summarize_email", 500, slo_ms=300).name == "large"
+    assert router.slo_misses == 0
+
+
+def test_fastest_tier_when_none_meets_the_slo_and_size_limits_apply():
+    router = ModelRouter(tiers())
+    assert router.choose("summarize_email", 500, slo_ms=10).name == "large"
+    assert router.slo_misses == 1
+    assert router.choose("summarize_email", 5000).name == "large"
+
+
+def test_operations_restrict_tiers():
+    only_assistant = ModelTier("assistant", StubLLMBackend(), operations=frozenset({"ai_assistant"}), latency_ms=1)
+    router = ModelRouter([only_assistant, ModelTier("general", StubLLMBackend(), cost_per_1k_tokens=5.0)])
+    assert router.choose("generate_email", 10).name == "general"
+    assert router.choose("ai_assistant", 10).name == "assistant"
+
+
+def test_latency_model_learns_per_size_bucket():
+    model = LatencyModel(prior_ms=100, alpha=0.5)
+    assert model.predict(2000) == 200
+    model.observe(2000, 50)
+    model.observe(2000, 150)
+    assert model.predict(2000) == 100
+    assert model.predict(4000) == 200
+
+
+@pytest.mark.anyio
+async def test_complete_and_stream_go_through_the_chosen_tier():
+    router = ModelRouter(tiers())
+    assert await router.complete("summarize_email", "Summarize.\n\nhello world", slo_ms=1000) == "hello world"
+    chunks = [chunk async for chunk in router.stream("summarize_email", "Summarize.\n\nhello world", slo_ms=1000)]
+    assert "".join(chunks) == "hello world"
+    assert router.routed == {"small": 2, "large": 0}
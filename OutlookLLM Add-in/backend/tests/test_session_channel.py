@@ -0,0 +1,44 @@
+def receive_until(websocket, frame_id, last):
+    frames = []
+    while True:
+        frame = websocket.receive_json()
+        if frame["id"] == frame_id:
+            frames.append(frame)
+            if last(frame):
+                return frames
+
+
+def test_hello_then_config_with_matching_etag_is_not_modified(client):
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"id": 1, "type": "hello", "userId": "ws-config"})
+        hello = websocket.receive_json()
+        assert hello["type"] == "hello" and hello["userId"] == "ws-config"
+        assert "config" in hello
+        websocket.send_json({"id": 2, "type": "config", "etag": hello["etag"]})
+        assert websocket.receive_json() == {"id": 2, "type": "config", "etag": hello["etag"], "notModified": True}
+
+
+def test_streamed_action_sends_deltas_then_result(client):
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"id": "a", "type": "action", "action": "generate_email", "userId": "ws-stream", "emailContent": "Lunch on Friday", "stream": True})
+        frames = receive_until(websocket, "a", lambda frame: frame["type"] != "delta")
+    assert frames[-1]["type"] == "result"
+    assert "".join(frame["delta"] for frame in frames[:-1]) == frames[-1]["generatedContent"]
+
+
+def test_async_action_pushes_job_events_until_done(client):
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"id": 7, "type": "action", "action": "generate_email", "userId": "ws-async", "emailContent": "Offsite plan", "async": True})
+        frames = receive_until(websocket, 7, lambda frame: frame.get("event") in ("done", "error"))
+    assert frames[0]["type"] == "accepted"
+    assert frames[-1]["event"] == "done" and frames[-1]["jobId"] == frames[0]["jobId"]
+
+
+def test_bad_frames_get_error_frames(client):
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_text("not json")
+        assert websocket.receive_json()["status"] == 400
+        websocket.send_json({"id": 3, "type": "bogus"})
+        assert websocket.receive_json() == {"id": 3, "type": "error", "status": 400, "detail": "Unknown frame type: bogus"}
+        websocket.send_json({"id": 4, "type": "subscribe", "jobId": "job_missing"})
+        assert websocket.receive_json()["status"] == 404
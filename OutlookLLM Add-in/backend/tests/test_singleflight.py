@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+@pytest.mark.anyio
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "summary"
+
+    results = await asyncio.gather(*(flight.do("k", fn) for _ in range(5)))
+    assert results == ["summary"] * 5
+    assert calls == 1
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 4, "abandoned": 0}
+
+
+@pytest.mark.anyio
+async def test_errors_reach_every_caller_and_are_not_cached():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def ok():
+        return "fine"
+
+    assert await flight.do("k", ok) == "fine"
+
+
+@pytest.mark.anyio
+async def test_one_caller_leaving_does_not_cancel_the_others():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def fn():
+        started.set()
+        await asyncio.sleep(0.02)
+        return "done"
+
+    leaving = asyncio.ensure_future(flight.do("k", fn))
+    staying = asyncio.ensure_future(flight.do("k", fn))
+    await started.wait()
+    leaving.cancel()
+    assert await staying == "done"
+    assert flight.stats()["abandoned"] == 0
+
+
+@pytest.mark.anyio
+async def test_call_is_cancelled_when_every_caller_leaves():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def fn():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.ensure_future(flight.do("k", fn))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flight.stats()["abandoned"] == 1 and flight.stats()["in_flight"] == 0
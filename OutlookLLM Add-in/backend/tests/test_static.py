@@ -0,0 +1,54 @@
+import gzip
+
+import pytest
+
+from static import IMMUTABLE, REVALIDATE, StaticBundle, parse_accept_encoding
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    (tmp_path / "taskpane.html").write_text('<script src="taskpane.js"></script><link href="missing.css">')
+    (tmp_path / "taskpane.js").write_text("console.log('taskpane');\n" * 200)
+    (tmp_path / "taskpane.js.map").write_text("{}")
+    static = StaticBundle(str(tmp_path))
+    static.load()
+    return static
+
+
+def test_html_references_carry_the_content_hash(bundle):
+    digest = bundle.files["taskpane.js"].digest
+    html = bundle.serve("taskpane.html").body.decode()
+    assert f'src="taskpane.js?v={digest}"' in html
+    assert 'href="missing.css"' in html
+    assert "taskpane.js.map" not in bundle.files
+
+
+def test_current_version_is_immutable_and_html_revalidates(bundle):
+    digest = bundle.files["taskpane.js"].digest
+    assert bundle.serve("taskpane.js", version=digest).headers["Cache-Control"] == IMMUTABLE
+    assert bundle.serve("taskpane.js", version="stale").headers["Cache-Control"] == REVALIDATE
+    assert bundle.serve("taskpane.html").headers["Cache-Control"] == REVALIDATE
+    assert bundle.serve("nope.js") is None
+
+
+def test_precompressed_variant_is_negotiated_and_revalidated(bundle):
+    response = bundle.serve("taskpane.js", accept_encoding="gzip;q=0.8, identity")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.body) == bundle.files["taskpane.js"].variants["identity"]
+    assert bundle.serve("taskpane.js", accept_encoding="gzip;q=0").headers.get("Content-Encoding") is None
+    etag = response.headers["ETag"]
+    assert bundle.serve("taskpane.js", accept_encoding="gzip", if_none_match=etag).status == 304
+
+
+def test_byte_ranges(bundle):
+    body = bundle.files["taskpane.js"].variants["identity"]
+    partial = bundle.serve("taskpane.js", range_header="bytes=0-9", accept_encoding="gzip")
+    assert partial.status == 206 and partial.body == body[:10]
+    assert partial.headers["Content-Range"] == f"bytes 0-9/{len(body)}"
+    assert bundle.serve("taskpane.js", range_header="bytes=-5").body == body[-5:]
+    assert bundle.serve("taskpane.js", range_header=f"bytes={len(body)}-").status == 416
+    assert bundle.serve("taskpane.js", range_header="bytes=0-9", if_range='"other"').status == 200
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.5, *;q=bogus") == {"gzip": 1.0, "br": 0.5, "*": 0.0}
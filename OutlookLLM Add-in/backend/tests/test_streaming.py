@@ -0,0 +1,37 @@
+import pytest
+
+from conftest import sse_frames
+from llm import StubLLMBackend, get_backend
+
+
+@pytest.mark.anyio
+async def test_stub_backend_streams_the_content_word_by_word():
+    backend = StubLLMBackend()
+    chunks = [chunk async for chunk in backend.stream("Instructions.\n\nhello there world")]
+    assert chunks == ["hello ", "there ", "world"]
+    assert await backend.complete("Instructions.\n\nhello there world") == "hello there world"
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_backend("no-such-backend")
+
+
+def test_generate_email_streams_deltas_then_done(client):
+    response = client.post(
+        "/generate_email?stream=true", json={"userId": "stream-user", "emailContent": "Please confirm the meeting"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = sse_frames(response.text)
+    deltas = [data["delta"] for event, data in frames if event is None]
+    event, done = frames[-1]
+    assert event == "done"
+    assert "".join(deltas) == done["generatedContent"]
+    assert done["originalContent"] == "Please confirm the meeting"
+
+
+def test_non_streaming_response_matches_the_streamed_result(client):
+    body = {"userId": "stream-user", "emailContent": "Quarterly numbers attached"}
+    streamed = sse_frames(client.post("/generate_email?stream=true", json=body).text)[-1][1]
+    assert client.post("/generate_email", json=body).json() == streamed
@@ -0,0 +1,64 @@
+import asyncio
+
+from conftest import sse_frames
+
+import app
+
+
+def test_every_item_gets_a_result_then_done(client):
+    items = [{"id": f"m{i}", "emailContent": f"Message number {i} about pricing"} for i in range(5)]
+    response = client.post("/summarize_batch", json={"userId": "batch-user", "items": items, "parallelism": 2})
+    assert response.status_code == 200
+    frames = sse_frames(response.text)
+    results = {data["id"]: data for event, data in frames if event == "result"}
+    assert set(results) == {item["id"] for item in items}
+    assert all("body" in result for result in results.values())
+    assert frames[-1] == ("done", {"total": 5, "failed": 0})
+
+
+def test_oversized_batches_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(app, "SUMMARIZE_BATCH_MAX_ITEMS", 2)
+    items = [{"id": str(i), "emailContent": "x"} for i in range(3)]
+    response = client.post("/summarize_batch", json={"userId": "batch-user", "items": items})
+    assert response.status_code == 400
+
+
+def test_a_failing_item_only_fails_itself(client, monkeypatch):
+    real_summarize = app.summarize
+
+    async def flaky(content, slo_ms=None, limit=None):
+        if "boom" in content:
+            raise RuntimeError("model error")
+        return await real_summarize(content, slo_ms, limit)
+
+    monkeypatch.setattr(app, "summarize", flaky)
+    items = [{"id": "ok", "emailContent": "fine"}, {"id": "bad", "emailContent": "boom"}]
+    frames = sse_frames(client.post("/summarize_batch", json={"userId": "batch-user-2", "items": items}).text)
+    results = {data["id"]: data for event, data in frames if event == "result"}
+    assert "body" in results["ok"]
+    assert results["bad"]["error"] == "model error"
+    assert frames[-1] == ("done", {"total": 2, "failed": 1})
+
+
+def test_long_items_are_map_reduced_within_the_admitted_fan_out(client, monkeypatch):
+    monkeypatch.setattr(app, "MAPREDUCE_CHUNK_TOKENS", 500)
+    prompts, running, peak = [], 0, 0
+
+    async def complete(operation, prompt, slo_ms=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        prompts.append(prompt)
+        return "summary"
+
+    monkeypatch.setattr(app.router, "complete", complete)
+    paragraphs = [f"Paragraph {i} on the renewal terms, with enough words to fill a chunk." for i in range(400)]
+    items = [{"id": "long", "emailContent": "\n\n".join(paragraphs)}, {"id": "short", "emailContent": "Lunch at noon?"}]
+    frames = sse_frames(client.post("/summarize_batch", json={"userId": "batch-user-3", "items": items}).text)
+    assert frames[-1] == ("done", {"total": 2, "failed": 0})
+    # The item is over INPUT_TOKEN_BUDGET; its tail reached a chunk call instead of being truncated away.
+    assert any("Paragraph 399" in prompt for prompt in prompts)
+    assert len(prompts) > 3
+    assert peak <= len(items)
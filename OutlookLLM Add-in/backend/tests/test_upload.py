@@ -0,0 +1,53 @@
+import gzip
+
+import app
+from conftest import sse_frames
+
+
+def test_gzipped_html_upload_is_normalized_and_summarized(client):
+    html = "<html><body><p>Budget approved for Q3.</p><img src='data:image/png;base64," + "A" * 50000 + "'></body></html>"
+    response = client.post(
+        "/upload/summarize_email?userId=upload-gzip",
+        content=gzip.compress(html.encode()),
+        headers={"Content-Type": "text/html; charset=utf-8", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"body": "Budget approved for Q3."}
+
+
+def test_streamed_upload_releases_its_ticket(client):
+    response = client.post(
+        "/upload/generate_email?userId=upload-stream&stream=true", content=b"Draft a reply", headers={"Content-Type": "text/plain"}
+    )
+    assert sse_frames(response.text)[-1][1]["generatedContent"] == "Draft a reply"
+    assert app.admission.stats()["active"] == 0
+
+
+def test_oversized_and_unsupported_bodies_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(app, "UPLOAD_MAX_BODY_BYTES", 10)
+    response = client.post("/upload/ai_assistant?userId=upload-big", content=b"x" * 100)
+    assert response.status_code == 413
+    monkeypatch.setattr(app, "UPLOAD_MAX_BODY_BYTES", 1024)
+    response = client.post("/upload/ai_assistant?userId=upload-big", content=b"x", headers={"Content-Encoding": "br-nope"})
+    assert response.status_code == 415
+    assert app.admission.stats()["active"] == 0
+
+
+def test_admission_is_checked_before_the_body_is_read(client, monkeypatch):
+    read = []
+
+    async def fake_ingest(*args, **kwargs):
+        read.append(True)
+
+    monkeypatch.setattr(app, "ingest", fake_ingest)
+    for _ in range(25):
+        response = client.post("/upload/summarize_email?userId=upload-flood", content=b"hello")
+    assert response.status_code == 429
+    assert len(read) == 20
+    response = client.post("/upload/generate_email?userId=upload-flood&async_job=true", content=b"hello")
+    assert response.status_code == 429
+    assert len(read) == 20
+
+
+def test_unknown_action_is_not_found(client):
+    assert client.post("/upload/delete_everything?userId=upload-404", content=b"hi").status_code == 404
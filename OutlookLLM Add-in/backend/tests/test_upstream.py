@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+
+import mock_upstream
+from upstream import CircuitBreaker, CircuitOpen, UpstreamClient, UpstreamError
+
+PAYLOAD = {"prompt": "Summarize.\n\nhello world", "max_tokens": 8}
+
+
+@pytest.fixture
+def faults(monkeypatch):
+    """Set the mock upstream's injected faults for one test."""
+    monkeypatch.setattr(mock_upstream, "faults", mock_upstream.Faults())
+
+    def set_faults(**values):
+        monkeypatch.setattr(mock_upstream, "faults", mock_upstream.Faults(**values))
+
+    return set_faults
+
+
+def make_client(**options) -> UpstreamClient:
+    options.setdefault("backoff_base", 0.001)
+    return UpstreamClient("http://mock", transport=httpx.ASGITransport(app=mock_upstream.app), **options)
+
+
+@pytest.mark.anyio
+async def test_breaker_opens_then_a_successful_probe_closes_it(faults):
+    client = make_client(retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.05))
+    faults(failureRate=1.0)
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            await client.post_json("/v1/completions", PAYLOAD)
+    with pytest.raises(CircuitOpen):
+        await client.post_json("/v1/completions", PAYLOAD)
+    faults()
+    await asyncio.sleep(0.06)
+    body = await client.post_json("/v1/completions", PAYLOAD)
+    assert body["choices"][0]["text"] == "hello world"
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    await client.aclose()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_cancelled_half_open_probe_reopens_the_breaker(faults, streaming):
+    client = make_client(retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+    faults(failureRate=1.0)
+    with pytest.raises(UpstreamError):
+        await client.post_json("/v1/completions", PAYLOAD)
+    await asyncio.sleep(0.06)
+    faults(latencyMs=1000)
+
+    async def call():
+        if streaming:
+            return [line async for line in client.stream_lines("/v1/completions", {**PAYLOAD, "stream": True})]
+        return await client.post_json("/v1/completions", PAYLOAD)
+
+    probe = asyncio.ensure_future(call())
+    await asyncio.sleep(0.02)
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    assert client.breaker.state == CircuitBreaker.OPEN
+    # The next call after reset_timeout is let through as a new probe.
+    faults()
+    await asyncio.sleep(0.06)
+    await client.post_json("/v1/completions", PAYLOAD)
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    await client.aclose()
+
+
+@pytest.mark.anyio
+async def test_cancelled_call_while_closed_does_not_count_as_failure(faults):
+    client = make_client(retries=0, breaker=CircuitBreaker(failure_threshold=1))
+    faults(latencyMs=1000)
+    call = asyncio.ensure_future(client.post_json("/v1/completions", PAYLOAD))
+    await asyncio.sleep(0.02)
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    assert client.breaker.state == CircuitBreaker.CLOSED and client.breaker.failures == 0
+    await client.aclose()
+
+
+@pytest.mark.anyio
+async def test_short_retry_after_is_honoured_and_long_one_fails_fast(faults):
+    client = make_client(retries=1, max_retry_after=0.05)
+    faults(failureRate=1.0, failureStatus=429, retryAfter=0.01)
+    with pytest.raises(UpstreamError):
+        await client.post_json("/v1/completions", PAYLOAD)
+    assert client.retried == 1
+
+    faults(failureRate=1.0, failureStatus=429, retryAfter=3600)
+    started = asyncio.get_running_loop().time()
+    for call in (client.post_json("/v1/completions", PAYLOAD), anext_line(client)):
+        with pytest.raises(UpstreamError) as error:
+            await call
+        assert error.value.status == 429
+    assert asyncio.get_running_loop().time() - started < 1
+    assert client.retried == 1
+    await client.aclose()
+
+
+async def anext_line(client: UpstreamClient) -> str:
+    async for line in client.stream_lines("/v1/completions", {**PAYLOAD, "stream": True}):
+        return line
+
+
+@pytest.mark.anyio
+async def test_stream_lines_yields_the_event_stream(faults):
+    client = make_client()
+    lines = [line async for line in client.stream_lines("/v1/completions", {**PAYLOAD, "stream": True}) if line]
+    assert lines[-1] == "data: [DONE]"
+    assert len(lines) == 3
+    await client.aclose()
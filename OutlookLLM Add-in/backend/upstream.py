@@ -0,0 +1,284 @@
+"""Shared client layer for upstream model servers.
+
+One `UpstreamClient` per upstream holds a pooled keep-alive `httpx.AsyncClient`
+(HTTP/2 when the `h2` package is installed, so concurrent requests share a
+connection). It caps the requests in flight to that upstream and applies
+timeouts. Failed calls are retried with full-jitter exponential backoff, and
+Retry-After is honoured up to `max_retry_after` seconds (a longer one fails the
+call instead). A circuit breaker fails fast while the upstream is
+down, and optional hedging fires a second attempt when the first is slower
+than `hedge_after` seconds.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+except ImportError:
+    h2 = None
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = frozenset((429, 500, 502, 503, 504))
+
+
+class UpstreamError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpen(UpstreamError):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures.
+
+    While open, calls fail immediately. After `reset_timeout` seconds one
+    probe is let through (half-open): success closes the circuit, failure
+    opens it again. A probe that is abandoned before the upstream answers
+    (cancelled by a client disconnect or a winning hedge) counts as a
+    failure, so the breaker can't stay half-open with nothing in flight.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def record_abandoned(self) -> None:
+        """A call ended without an answer through no fault of the upstream."""
+        if self.state == self.HALF_OPEN:
+            self.record_failure()
+
+
+class UpstreamClient:
+    def __init__(
+        self,
+        base_url: str,
+        max_concurrency: int = 32,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 60.0,
+        retries: int = 2,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        max_retry_after: float = 10.0,
+        hedge_after: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        headers: Optional[dict] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=h2 is not None,
+            headers=headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            transport=transport,
+        )
+        self.requests = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    async def post_json(self, path: str, payload: dict) -> dict:
+        """POST `payload` and return the decoded JSON body, retrying (and hedging) as configured."""
+        if self.hedge_after is None:
+            return await self._with_retries(path, payload)
+        return await self._hedged(path, payload)
+
+    async def _hedged(self, path: str, payload: dict) -> dict:
+        primary = asyncio.ensure_future(self._with_retries(path, payload))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        self.hedged += 1
+        hedge = asyncio.ensure_future(self._with_retries(path, payload))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.hedge_wins += task is hedge
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _with_retries(self, path: str, payload: dict) -> dict:
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(path, payload)
+            except CircuitOpen:
+                raise
+            except (UpstreamError, httpx.TransportError) as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None or (isinstance(e, UpstreamError) and e.status not in RETRYABLE_STATUS and e.status is not None):
+                    self.failures += 1
+                    raise
+                self.retried += 1
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None to give up."""
+        if attempt >= self.retries:
+            return None
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is None:
+            return self._backoff(attempt)
+        # Waiting longer would blow the caller's latency budget; fail now instead.
+        return retry_after if retry_after <= self.max_retry_after else None
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _attempt(self, path: str, payload: dict) -> dict:
+        if not self.breaker.allow():
+            raise CircuitOpen(f"Circuit open for {self.base_url}")
+        self.requests += 1
+        try:
+            async with self._semaphore:
+                response = await self._client.post(path, json=payload)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled before the upstream answered.
+            self.breaker.record_abandoned()
+            raise
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+            raise UpstreamError(
+                f"{self.base_url}{path} returned {response.status_code}",
+                status=response.status_code,
+                retry_after=_retry_after(response),
+            )
+        self.breaker.record_success()
+        if response.status_code >= 400:
+            raise UpstreamError(f"{self.base_url}{path} returned {response.status_code}: {response.text}", status=response.status_code)
+        return response.json()
+
+    async def stream_lines(self, path: str, payload: dict) -> AsyncIterator[str]:
+        """POST `payload` and yield the response body line by line.
+
+        Only the connection attempt is retried; once data has started to flow
+        a failure is raised to the caller.
+        """
+        attempt = 0
+        started = False
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpen(f"Circuit open for {self.base_url}")
+            self.requests += 1
+            answered = False
+            try:
+                async with self._semaphore:
+                    async with self._client.stream("POST", path, json=payload) as response:
+                        answered = True
+                        if response.status_code >= 500 or response.status_code == 429:
+                            raise UpstreamError(
+                                f"{self.base_url}{path} returned {response.status_code}",
+                                status=response.status_code,
+                                retry_after=_retry_after(response),
+                            )
+                        self.breaker.record_success()
+                        if response.status_code >= 400:
+                            await response.aread()
+                            raise UpstreamError(f"{self.base_url}{path} returned {response.status_code}: {response.text}", status=response.status_code)
+                        async for line in response.aiter_lines():
+                            started = True
+                            yield line
+                        return
+            except (UpstreamError, httpx.TransportError) as e:
+                status = getattr(e, "status", None)
+                if status is not None and status not in RETRYABLE_STATUS:
+                    raise
+                self.breaker.record_failure()
+                delay = None if started else self._retry_delay(e, attempt)
+                if delay is None:
+                    self.failures += 1
+                    raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Cancelled, or the consumer closed the generator, before the
+                # upstream answered; after that, success is already recorded.
+                if not answered:
+                    self.breaker.record_abandoned()
+                raise
+            self.retried += 1
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "circuit_open": int(self.breaker.state == CircuitBreaker.OPEN),
+            "circuit_trips": self.breaker.trips,
+        }
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
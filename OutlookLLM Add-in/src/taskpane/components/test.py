@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+import asyncio
+import atexit
+import heapq
+import os
+import random
+import sqlite3
 import time
 import uuid
 import threading
 import json
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import TypedDict, Literal, Annotated, Any, Optional
 from enum import Enum
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 
 from pydantic import BaseModel, Field, ConfigDict
 from langgraph.graph import StateGraph, END, MessagesState, START
-from langgraph.graph.message import AIMessage, HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from langgraph.types import Send
@@ -72,33 +82,252 @@ class JobState:
     error: Optional[str] = None
     metadata: dict[str, Any] = field(default_factory=dict)
 
+TERMINAL_STATUSES = frozenset({JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED})
+
+class JobStore:
+    """Persistence backend for JobManager. The base class keeps nothing (in-memory fast mode)."""
+    def load(self) -> list[JobState]:
+        return []
+
+    def save(self, job: JobState):
+        """Marks `job` as changed; backends may write it later."""
+
+    def delete(self, job_id: str):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+InMemoryJobStore = JobStore
+
+# Outside the working directory, so running the demo from a checkout leaves no database in it.
+DEFAULT_JOB_STORE_PATH = os.path.join(os.path.expanduser("~"), ".portfolio_agent", "jobs.db")
+
+_ARTIFACT_TYPES = {cls.__name__: cls for cls in (ArtifactRef, ExposureFrameRef, OptimizationResultRef)}
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return {"__artifact__": type(value).__name__, **value.model_dump()}
+    raise TypeError(f"Cannot persist {type(value).__name__}")
+
+def _decode_value(obj: dict) -> Any:
+    artifact = obj.pop("__artifact__", None)
+    return _ARTIFACT_TYPES[artifact](**obj) if artifact in _ARTIFACT_TYPES else obj
+
+class SQLiteJobStore(JobStore):
+    """Durable job store on sqlite in WAL mode with batched, coalesced writes.
+
+    `save` only records a snapshot of the job as dirty; a writer thread persists all
+    dirty jobs in one transaction every `flush_interval` seconds (sooner on status
+    changes or once `batch_size` jobs are dirty), so a burst of progress updates to one
+    job costs a single row write and durability never sits on the caller's path. A
+    failed write keeps its jobs dirty, to be retried with the next flush. The connection
+    is shared by the writer and callers of `load`/`flush`, so every use holds `_db_lock`.
+    """
+    def __init__(self, path: str, flush_interval: float = 0.5, batch_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, status TEXT, task_type TEXT, created_at TEXT,"
+            " updated_at TEXT, progress REAL, result TEXT, error TEXT, metadata TEXT)"
+        )
+        self._db.commit()
+        self._dirty: dict[str, JobState] = {}
+        self._deleted: set[str] = set()
+        self._statuses: dict[str, JobStatus] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self.batches = 0
+        self.rows_written = 0
+        self._writer = threading.Thread(target=self._run, daemon=True, name="JobStoreWriter")
+        self._writer.start()
+        atexit.register(self.close)
+
+    def load(self) -> list[JobState]:
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT job_id, status, task_type, created_at, updated_at, progress, result, error, metadata FROM jobs"
+            ).fetchall()
+        return [
+            JobState(
+                job_id=job_id, status=JobStatus(status), task_type=TaskType(task_type),
+                created_at=datetime.fromisoformat(created_at), updated_at=datetime.fromisoformat(updated_at),
+                progress=progress, result=json.loads(result, object_hook=_decode_value) if result else None,
+                error=error, metadata=json.loads(metadata) if metadata else {},
+            )
+            for job_id, status, task_type, created_at, updated_at, progress, result, error, metadata in rows
+        ]
+
+    def save(self, job: JobState):
+        # JobManager calls this under its lock, so the copy is consistent; the writer
+        # thread never reads a job while it is being updated.
+        snapshot = replace(job, metadata=dict(job.metadata))
+        with self._cond:
+            self._deleted.discard(job.job_id)
+            self._dirty[job.job_id] = snapshot
+            # Status changes matter for recovery; don't let them wait for the timer.
+            if self._statuses.get(job.job_id) != job.status or len(self._dirty) >= self.batch_size:
+                self._statuses[job.job_id] = job.status
+                self._cond.notify()
+
+    def delete(self, job_id: str):
+        with self._cond:
+            self._dirty.pop(job_id, None)
+            self._statuses.pop(job_id, None)
+            self._deleted.add(job_id)
+
+    def flush(self):
+        # Holding _db_lock while taking the batch keeps flushes in order, so an older
+        # snapshot can never be written over a newer one.
+        with self._db_lock:
+            with self._cond:
+                dirty, self._dirty = self._dirty, {}
+                deleted, self._deleted = self._deleted, set()
+            if not dirty and not deleted: return
+            try:
+                rows = [self._row(job) for job in dirty.values()]
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    self._db.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in deleted])
+            except Exception:
+                with self._cond:
+                    # Put the batch back unless a newer save or delete has superseded it.
+                    for job_id, job in dirty.items():
+                        if job_id not in self._deleted:
+                            self._dirty.setdefault(job_id, job)
+                    self._deleted.update(job_id for job_id in deleted if job_id not in self._dirty)
+                raise
+            self.batches += 1
+            self.rows_written += len(rows)
+
+    @staticmethod
+    def _row(job: JobState) -> tuple:
+        return (
+            job.job_id, job.status.value, job.task_type.value, job.created_at.isoformat(), job.updated_at.isoformat(),
+            job.progress, json.dumps(job.result, default=_encode_value) if job.result is not None else None,
+            job.error, json.dumps(job.metadata, default=str),
+        )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"ERROR: Job store flush failed: {e}")
+            if closed: return
+
+    def close(self):
+        with self._cond:
+            if self._closed: return
+            self._closed = True
+            self._cond.notify()
+        atexit.unregister(self.close)
+        self._writer.join()
+        with self._db_lock:
+            self._db.close()
+
+@dataclass
+class RetentionPolicy:
+    """How long finished jobs are kept. Jobs that have not finished are never evicted."""
+    max_jobs: int = 100                          # finished jobs kept at most; pending and running jobs don't count
+    max_age_seconds: Optional[float] = 3600.0    # finished jobs older than this are evicted regardless
+
 class JobManager:
-    """Thread-safe job management with in-memory storage and cleanup."""
-    def __init__(self, max_jobs: int = 100):
+    """Thread-safe in-memory job registry with indexed lookups and O(1) eviction.
+
+    Jobs are indexed by status, task type and account (``metadata["account"]``), so
+    queries such as "all running jobs" touch only the matching jobs. Finished jobs
+    are kept in completion order; eviction pops from the oldest end, so each
+    eviction costs O(1) and running or pending jobs are never dropped.
+    """
+    def __init__(self, max_jobs: int = 100, retention: Optional[RetentionPolicy] = None,
+                 store: Optional[JobStore] = None, recovery: Literal["requeue", "fail"] = "requeue"):
+        if recovery not in ("requeue", "fail"):
+            raise ValueError(f"recovery must be 'requeue' or 'fail', not {recovery!r}")
         self._jobs: dict[str, JobState] = {}
         self._lock = threading.RLock()
-        self._cleanup_threshold = max_jobs
+        self.retention = retention or RetentionPolicy(max_jobs=max_jobs)
+        self.store = store or InMemoryJobStore()
+        self._by_status: dict[JobStatus, set[str]] = {status: set() for status in JobStatus}
+        self._by_task_type: dict[TaskType, set[str]] = {task_type: set() for task_type in TaskType}
+        self._by_account: dict[str, set[str]] = {}
+        self._finished: OrderedDict[str, datetime] = OrderedDict()
+        self.evicted = 0
+        self.interrupted = self._recover(recovery)
+
+    def _recover(self, recovery: str) -> list[str]:
+        """Loads persisted jobs; jobs that were pending or running when the process died are re-queued
+        as PENDING (for the caller to resubmit) or marked FAILED. Returns their IDs."""
+        interrupted = []
+        for job in sorted(self.store.load(), key=lambda j: j.updated_at):
+            self._jobs[job.job_id] = job
+            self._by_status[job.status].add(job.job_id)
+            self._by_task_type[job.task_type].add(job.job_id)
+            self._index_account(job)
+            if job.status in TERMINAL_STATUSES:
+                self._finished[job.job_id] = job.updated_at
+            else:
+                interrupted.append(job.job_id)
+        for job_id in interrupted:
+            if recovery == "fail":
+                self.update_job(job_id, status=JobStatus.FAILED, error="Interrupted by a restart", progress=1.0)
+            else:
+                self.update_job(job_id, status=JobStatus.PENDING, progress=0.0)
+        return interrupted
 
     def create_job(self, task_type: TaskType, metadata: Optional[dict] = None) -> str:
         """Creates a new job and returns its ID."""
         job_id = f"job_{uuid.uuid4().hex[:12]}"
         now = datetime.now()
         with self._lock:
-            self._jobs[job_id] = JobState(
+            job = JobState(
                 job_id=job_id, status=JobStatus.PENDING, task_type=task_type,
                 created_at=now, updated_at=now, metadata=metadata or {}
             )
-            self._cleanup_old_jobs()
+            self._jobs[job_id] = job
+            self._by_status[job.status].add(job_id)
+            self._by_task_type[task_type].add(job_id)
+            self._index_account(job)
+            self.store.save(job)
+            self._evict_finished_jobs(now)
         return job_id
 
     def update_job(self, job_id: str, **updates: Any) -> bool:
-        """Updates a job's state safely."""
+        """Updates a job's state safely, keeping the indexes in step."""
         with self._lock:
-            if job_id not in self._jobs: return False
-            job = self._jobs[job_id]
+            job = self._jobs.get(job_id)
+            if job is None: return False
             job.updated_at = datetime.now()
+            old_status, old_account = job.status, job.metadata.get("account")
             for key, value in updates.items():
                 if hasattr(job, key): setattr(job, key, value)
+            if job.status != old_status:
+                self._by_status[old_status].discard(job_id)
+                self._by_status[job.status].add(job_id)
+                if job.status in TERMINAL_STATUSES:
+                    self._finished[job_id] = job.updated_at
+                    self._finished.move_to_end(job_id)
+                    self._evict_finished_jobs(job.updated_at)
+                else:
+                    self._finished.pop(job_id, None)
+            if job.metadata.get("account") != old_account:
+                self._unindex_account(job_id, old_account)
+                self._index_account(job)
+            self.store.save(job)
             return True
 
     def get_job(self, job_id: str) -> Optional[JobState]:
@@ -106,43 +335,358 @@ class JobManager:
         with self._lock:
             return self._jobs.get(job_id)
 
-    def _cleanup_old_jobs(self):
-        """Internal method to prune old, completed jobs to prevent memory leaks."""
-        if len(self._jobs) <= self._cleanup_threshold: return
-        sorted_jobs = sorted(self._jobs.values(), key=lambda j: j.updated_at, reverse=True)
-        self._jobs = {job.job_id: job for job in sorted_jobs[:self._cleanup_threshold]}
+    def list_jobs(self, status: Optional[JobStatus] = None, task_type: Optional[TaskType] = None,
+                  account: Optional[str] = None) -> list[JobState]:
+        """Jobs matching every given filter; cost is proportional to the smallest matching index."""
+        with self._lock:
+            candidates = [index for index in (
+                self._by_status[status] if status is not None else None,
+                self._by_task_type[task_type] if task_type is not None else None,
+                self._by_account.get(account, set()) if account is not None else None,
+            ) if index is not None]
+            if not candidates:
+                return list(self._jobs.values())
+            smallest = min(candidates, key=len)
+            others = [index for index in candidates if index is not smallest]
+            return [self._jobs[job_id] for job_id in smallest if all(job_id in index for index in others)]
 
-class AsyncTaskExecutor:
-    """Executes LangGraph agents in background threads with progress tracking."""
-    def __init__(self, job_manager: JobManager):
+    def count_by_status(self) -> dict[str, int]:
+        with self._lock:
+            return {status.value: len(ids) for status, ids in self._by_status.items()}
+
+    def _index_account(self, job: JobState):
+        account = job.metadata.get("account")
+        if account is not None:
+            self._by_account.setdefault(account, set()).add(job.job_id)
+
+    def _unindex_account(self, job_id: str, account: Optional[str]):
+        ids = self._by_account.get(account)
+        if ids is None: return
+        ids.discard(job_id)
+        if not ids: del self._by_account[account]
+
+    def _evict_finished_jobs(self, now: datetime):
+        """Drops finished jobs beyond the retention policy, oldest first."""
+        max_age = self.retention.max_age_seconds
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            # Only finished jobs count, so a burst of running jobs can't evict a result as it lands.
+            over_capacity = len(self._finished) > self.retention.max_jobs
+            expired = max_age is not None and (now - finished_at).total_seconds() > max_age
+            if not (over_capacity or expired): break
+            self._finished.popitem(last=False)
+            job = self._jobs.pop(job_id)
+            self._by_status[job.status].discard(job_id)
+            self._by_task_type[job.task_type].discard(job_id)
+            self._unindex_account(job_id, job.metadata.get("account"))
+            self.store.delete(job_id)
+            self.evicted += 1
+
+class ExecutorSaturated(Exception):
+    """Raised when a job is submitted while every worker is busy and the queue is full."""
+
+class TaskExecutor(ABC):
+    """Common interface and job bookkeeping for the workflow executors.
+
+    At most `capacity` jobs run at once and at most `queue_size` more wait. Beyond that,
+    submissions are rejected (`on_full="reject"`) or the caller blocks until a slot frees
+    up (`on_full="block"`, optionally for `submit_timeout` seconds).
+    """
+    def __init__(self, job_manager: JobManager, capacity: int, queue_size: int,
+                 on_full: Literal["reject", "block"], submit_timeout: Optional[float]):
         self.job_manager = job_manager
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.on_full = on_full
+        self.submit_timeout = submit_timeout
+        self._slots = threading.BoundedSemaphore(capacity + queue_size)
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._active = 0
+        self._queued = 0
+        self._busy_seconds = 0.0
+        self.submitted = self.completed = self.failed = self.rejected = 0
 
+    @abstractmethod
     def submit_task(self, agent_graph, job_id: str, inputs: dict):
-        """Submits a graph for asynchronous execution."""
-        def task_runner():
-            try:
-                self.job_manager.update_job(job_id, status=JobStatus.RUNNING, progress=0.1)
+        """Queues a graph for asynchronous execution; raises ExecutorSaturated when at capacity."""
+
+    def shutdown(self, wait: bool = True):
+        pass
+
+    def _admit(self, job_id: str):
+        blocking = self.on_full == "block"
+        if not self._slots.acquire(blocking, self.submit_timeout if blocking else None):
+            with self._lock:
+                self.rejected += 1
+            self.job_manager.update_job(job_id, status=JobStatus.CANCELLED, error="Rejected: executor at capacity", progress=1.0)
+            raise ExecutorSaturated(f"{self.capacity} jobs running and {self.queue_size} queued")
+        with self._lock:
+            self.submitted += 1
+            self._queued += 1
+
+    def _begin(self, job_id: str) -> float:
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        self.job_manager.update_job(job_id, status=JobStatus.RUNNING, progress=0.1)
+        return time.perf_counter()
+
+    def _step(self, job_id: str, step_count: int, state_update: dict) -> dict:
+        node_name = list(state_update.keys())[0]
+        progress = min(0.1 + (step_count * 0.15), 0.9)
+        self.job_manager.update_job(job_id, progress=progress)
+        print(f"TASK [{job_id}]: Completed step '{node_name}' (Progress: {progress:.1%})")
+        return state_update[node_name]
+
+    def _finish(self, job_id: str, final_state: Optional[dict]) -> bool:
+        if final_state and final_state.get("error"):
+            self.job_manager.update_job(job_id, status=JobStatus.FAILED, error=final_state["error"], progress=1.0)
+            return False
+        self.job_manager.update_job(job_id, status=JobStatus.SUCCEEDED, result=final_state, progress=1.0)
+        return True
+
+    def _withdraw(self, job_id: str):
+        """Cancels an admitted job that never started."""
+        with self._lock:
+            self._queued -= 1
+        self._slots.release()
+        self.job_manager.update_job(job_id, status=JobStatus.CANCELLED, error="Cancelled: executor shut down", progress=1.0)
+
+    def _fail(self, job_id: str, e: Exception):
+        error_msg = f"Critical failure in job {job_id}: {e}"
+        print(f"ERROR: {error_msg}")
+        self.job_manager.update_job(job_id, status=JobStatus.FAILED, error=error_msg, progress=1.0)
+
+    def _end(self, started: float, succeeded: bool):
+        with self._lock:
+            self._active -= 1
+            self._busy_seconds += time.perf_counter() - started
+            if succeeded: self.completed += 1
+            else: self.failed += 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        """Occupancy and lifetime counters; utilization is busy slot-time over available slot-time."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._started_at
+            return {
+                "executor": type(self).__name__, "capacity": self.capacity, "queue_size": self.queue_size,
+                "active": self._active, "queued": self._queued,
+                "submitted": self.submitted, "completed": self.completed, "failed": self.failed, "rejected": self.rejected,
+                "utilization": round(self._busy_seconds / (self.capacity * elapsed), 4) if elapsed else 0.0,
+            }
+
+_worker = threading.local()
+
+@contextmanager
+def blocking_wait():
+    """Marks a node's wait on an external service so the running executor can lend out its slot.
+
+    Inside a `ThreadPoolTaskExecutor` worker the job gives up its worker slot for the duration
+    and takes one back (waiting if need be) afterwards; anywhere else this does nothing.
+    """
+    executor = getattr(_worker, "executor", None)
+    if executor is None:
+        yield
+        return
+    executor._lend_slot()
+    try:
+        yield
+    finally:
+        executor._reclaim_slot()
+
+class ThreadPoolTaskExecutor(TaskExecutor):
+    """Executes LangGraph agents with `stream` on a pool of `max_workers` threads.
+
+    A job waiting inside `blocking_wait()` (e.g. on a batch job) hands its worker slot to the
+    next queued job, so long waits don't starve the pool; up to `max_waiting` jobs can wait
+    that way at once, each on an extra thread. A job resuming from a wait gets the next free
+    slot ahead of queued jobs. Waiting jobs are reported as `waiting`, not `active`, and
+    don't count towards utilization.
+    With `cpu_workers` set, CPU-heavy nodes can offload work to `cpu_pool`.
+    """
+    def __init__(self, job_manager: JobManager, max_workers: int = 8, queue_size: int = 64,
+                 on_full: Literal["reject", "block"] = "reject", submit_timeout: Optional[float] = None,
+                 cpu_workers: int = 0, max_waiting: int = 64):
+        super().__init__(job_manager, max_workers, queue_size, on_full, submit_timeout)
+        self.max_workers = max_workers
+        self.max_waiting = max_waiting
+        self.cpu_workers = cpu_workers
+        self._slot_cond = threading.Condition()
+        self._free = max_workers
+        self._waiting = 0
+        self._reclaiming = 0
+        self._pending: deque[tuple] = deque()
+        self._closing = False
+        self._pool = ThreadPoolExecutor(max_workers=max_workers + max_waiting, thread_name_prefix="TaskWorker")
+        self.cpu_pool = ProcessPoolExecutor(max_workers=cpu_workers) if cpu_workers else None
+
+    def submit_task(self, agent_graph, job_id: str, inputs: dict):
+        self._admit(job_id)
+        with self._slot_cond:
+            self._pending.append((agent_graph, job_id, inputs))
+            self._dispatch()
+
+    def _dispatch(self):
+        # Called with _slot_cond held; slots wanted by resuming jobs are left for them.
+        while self._pending and self._free > self._reclaiming:
+            self._free -= 1
+            self._pool.submit(self._run, *self._pending.popleft())
+
+    def _release_slot(self):
+        # Called with _slot_cond held.
+        self._free += 1
+        self._slot_cond.notify_all()
+        self._dispatch()
+        if self._closing and self._idle():
+            self._pool.shutdown(wait=False)
+
+    def _idle(self) -> bool:
+        return not self._pending and self._free == self.max_workers and self._waiting == 0
+
+    def _run(self, agent_graph, job_id: str, inputs: dict):
+        _worker.executor = self
+        _worker.busy_since = self._begin(job_id)
+        succeeded = False
+        try:
+            final_state = None
+            for step_count, state_update in enumerate(agent_graph.stream(inputs), 1):
+                final_state = self._step(job_id, step_count, state_update)
+            succeeded = self._finish(job_id, final_state)
+        except Exception as e:
+            self._fail(job_id, e)
+        finally:
+            self._end(_worker.busy_since, succeeded)
+            _worker.executor = None
+            with self._slot_cond:
+                self._release_slot()
+
+    def _lend_slot(self):
+        with self._slot_cond:
+            if self._waiting >= self.max_waiting:
+                return  # no spare threads left: wait while holding the slot
+            self._waiting += 1
+            _worker.lent = True
+            # A lent slot is neither active nor busy until the job takes one back.
+            with self._lock:
+                self._active -= 1
+                self._busy_seconds += time.perf_counter() - _worker.busy_since
+            self._release_slot()
+
+    def _reclaim_slot(self):
+        if not getattr(_worker, "lent", False): return
+        _worker.lent = False
+        with self._slot_cond:
+            self._reclaiming += 1
+            self._slot_cond.wait_for(lambda: self._free > 0)
+            self._free -= 1
+            self._reclaiming -= 1
+            self._waiting -= 1
+            with self._lock:
+                self._active += 1
+            _worker.busy_since = time.perf_counter()
+
+    def stats(self) -> dict:
+        with self._slot_cond:
+            waiting = self._waiting
+        return {**super().stats(), "waiting": waiting, "cpu_workers": self.cpu_workers}
+
+    def shutdown(self, wait: bool = True):
+        """Stops accepting work once queued jobs have run; with `wait`, blocks until then."""
+        with self._slot_cond:
+            self._closing = True
+            if wait:
+                self._slot_cond.wait_for(self._idle)
+            if self._idle():
+                self._pool.shutdown(wait=wait)
+        if self.cpu_pool: self.cpu_pool.shutdown(wait=wait)
+
+# Kept for callers that predate the asyncio executor.
+AsyncTaskExecutor = ThreadPoolTaskExecutor
+
+class AsyncioTaskExecutor(TaskExecutor):
+    """Executes LangGraph agents with `astream` as tasks on one event loop in a background thread.
+
+    Waiting workflows cost a suspended coroutine rather than a thread, so `max_concurrency`
+    can be in the thousands. Graphs should be built with async nodes
+    (`build_thematic_analysis_workflow(..., use_async=True)`); a blocking node would stall
+    every workflow on the loop.
+    """
+    def __init__(self, job_manager: JobManager, max_concurrency: int = 1_000, queue_size: int = 10_000,
+                 on_full: Literal["reject", "block"] = "reject", submit_timeout: Optional[float] = None):
+        super().__init__(job_manager, max_concurrency, queue_size, on_full, submit_timeout)
+        self.max_concurrency = max_concurrency
+        self._loop = asyncio.new_event_loop()
+        self._running = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+        self._draining = False  # only touched on the loop
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="TaskLoop")
+        self._thread.start()
+
+    def submit_task(self, agent_graph, job_id: str, inputs: dict):
+        if self._closed: raise RuntimeError("cannot submit after shutdown")
+        self._admit(job_id)
+        self._loop.call_soon_threadsafe(self._spawn, agent_graph, job_id, inputs)
+
+    def _spawn(self, agent_graph, job_id: str, inputs: dict):
+        if self._draining:  # raced with shutdown
+            self._withdraw(job_id)
+            return
+        task = self._loop.create_task(self._run(agent_graph, job_id, inputs), name=f"Task-{job_id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, agent_graph, job_id: str, inputs: dict):
+        started = None
+        succeeded = False
+        try:
+            async with self._running:
+                started = self._begin(job_id)
                 final_state = None
                 step_count = 0
-                for state_update in agent_graph.stream(inputs):
+                async for state_update in agent_graph.astream(inputs):
                     step_count += 1
-                    node_name = list(state_update.keys())[0]
-                    final_state = state_update[node_name]
-                    progress = min(0.1 + (step_count * 0.15), 0.9)
-                    self.job_manager.update_job(job_id, progress=progress)
-                    print(f"TASK [{job_id}]: Completed step '{node_name}' (Progress: {progress:.1%})")
-
-                if final_state and final_state.get("error"):
-                    self.job_manager.update_job(job_id, status=JobStatus.FAILED, error=final_state["error"], progress=1.0)
-                else:
-                    self.job_manager.update_job(job_id, status=JobStatus.SUCCEEDED, result=final_state, progress=1.0)
-            except Exception as e:
-                error_msg = f"Critical failure in job {job_id}: {e}"
-                print(f"ERROR: {error_msg}")
-                self.job_manager.update_job(job_id, status=JobStatus.FAILED, error=error_msg, progress=1.0)
+                    final_state = self._step(job_id, step_count, state_update)
+                succeeded = self._finish(job_id, final_state)
+        except asyncio.CancelledError:
+            if started is None:
+                self._withdraw(job_id)
+            else:
+                self.job_manager.update_job(job_id, status=JobStatus.CANCELLED, error="Cancelled: executor shut down", progress=1.0)
+            raise
+        except Exception as e:
+            self._fail(job_id, e)
+        finally:
+            if started is not None:
+                self._end(started, succeeded)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "tasks": len(self._tasks)}
 
-        thread = threading.Thread(target=task_runner, daemon=True, name=f"Task-{job_id}")
-        thread.start()
+    def shutdown(self, wait: bool = True):
+        """Stops the loop; with `wait` running and queued jobs finish first, otherwise they are cancelled.
+
+        Safe to call more than once.
+        """
+        with self._lock:
+            if self._closed: return
+            self._closed = True
+
+        async def drain():
+            # Jobs submitted before shutdown() were spawned ahead of this coroutine.
+            self._draining = True
+            if wait and self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            for task in list(self._tasks):
+                task.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(drain(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
 
 # ==============================================================================
 # 3. State Definitions
@@ -178,6 +722,16 @@ class PortfolioService:
     def optimize_portfolio(cls, exposures_ref: ExposureFrameRef, account: str) -> OptimizationResultRef:
         print(f"SERVICE: Running optimization for account {account}...")
         time.sleep(1) # Simulate processing time
+        return cls._optimization_result(account)
+    
+    @classmethod
+    async def aoptimize_portfolio(cls, exposures_ref: ExposureFrameRef, account: str) -> OptimizationResultRef:
+        print(f"SERVICE: Running optimization for account {account}...")
+        await asyncio.sleep(1) # Simulate waiting on the remote optimizer
+        return cls._optimization_result(account)
+    
+    @classmethod
+    def _optimization_result(cls, account: str) -> OptimizationResultRef:
         return OptimizationResultRef(
             uri=f"s3://results/opt_{uuid.uuid4().hex[:8]}.parquet",
             schema_hash=uuid.uuid4().hex,
@@ -186,26 +740,140 @@ class PortfolioService:
         )
 
 class BatchProcessingService:
-    """Service for handling batch prediction jobs."""
-    _job_counters = {}
+    """Service for handling batch prediction jobs.
+
+    Completion is pushed: every job has a future that resolves when it finishes, so callers
+    can register callbacks or block/await it instead of polling. `wait_for_job` and
+    `await_job` still re-check the status with exponential backoff, which covers services
+    (or lost notifications) that never resolve the future.
+    A job is tracked until its results are fetched or it is `forget`-ten.
+    """
+    SIMULATED_RUNTIME_S = 2.0
+
+    def __init__(self, runtime_s: float = SIMULATED_RUNTIME_S, supports_notifications: bool = True):
+        self.runtime_s = runtime_s
+        self.supports_notifications = supports_notifications
+        self._due: dict[str, float] = {}
+        self._futures: dict[str, Future] = {}
+        self._schedule: list[tuple[float, str]] = []
+        self._cond = threading.Condition()
+        self._clock: Optional[threading.Thread] = None
+        self.status_checks = 0
+        self.notifications = 0
     
-    @classmethod
-    def start_prediction_job(cls, stocks: list[str], schema: dict) -> str:
+    def start_prediction_job(self, stocks: list[str], schema: dict) -> str:
         job_id = f"batch_{uuid.uuid4().hex[:8]}"
-        cls._job_counters[job_id] = 0
+        due = time.monotonic() + self.runtime_s
+        with self._cond:
+            self._due[job_id] = due
+            self._futures[job_id] = Future()
+            heapq.heappush(self._schedule, (due, job_id))
+            if self._clock is None:
+                self._clock = threading.Thread(target=self._run_clock, daemon=True, name="BatchServiceClock")
+                self._clock.start()
+            self._cond.notify()
         print(f"SERVICE: Started batch prediction job {job_id} for {len(stocks)} stocks")
         return job_id
     
-    @classmethod
-    def check_job_status(cls, job_id: str) -> JobStatus:
-        cls._job_counters[job_id] = cls._job_counters.get(job_id, 0) + 1
-        status = JobStatus.SUCCEEDED if cls._job_counters[job_id] > 2 else JobStatus.RUNNING
+    def _run_clock(self):
+        """Completes simulated jobs as they fall due; one thread per service, and only while jobs are pending."""
+        while True:
+            with self._cond:
+                if not self._schedule:
+                    self._clock = None
+                    return
+                delay = self._schedule[0][0] - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                _, job_id = heapq.heappop(self._schedule)
+                future = self._futures.get(job_id)
+                self.notifications += 1
+            if future is not None and not future.done():
+                future.set_result(JobStatus.SUCCEEDED)
+    
+    def check_job_status(self, job_id: str) -> JobStatus:
+        with self._cond:
+            self.status_checks += 1
+            due = self._due.get(job_id)
+        if due is None:
+            status = JobStatus.FAILED
+        else:
+            status = JobStatus.SUCCEEDED if time.monotonic() >= due else JobStatus.RUNNING
         print(f"SERVICE: Job {job_id} status: {status.value}")
         return status
     
-    @classmethod
-    def get_job_results(cls, job_id: str) -> ExposureFrameRef:
+    def completion_future(self, job_id: str) -> Optional[Future]:
+        """Future resolving to the job's final status, or None when the service can't notify."""
+        if not self.supports_notifications: return None
+        with self._cond:
+            return self._futures.get(job_id)
+    
+    def on_complete(self, job_id: str, callback) -> bool:
+        """Calls `callback(job_id, status)` when the job finishes; False if notifications are unavailable."""
+        future = self.completion_future(job_id)
+        if future is None: return False
+        future.add_done_callback(lambda f: callback(job_id, f.result()))
+        return True
+    
+    def wait_for_job(self, job_id: str, timeout: Optional[float] = None,
+                     initial_delay: float = 0.5, max_delay: float = 30.0) -> JobStatus:
+        """Blocks until the job finishes or `timeout` passes; returns its last known status.
+
+        Runs inside `blocking_wait()`, so a thread-pool worker is free for other jobs meanwhile.
+        """
+        future = self.completion_future(job_id)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = initial_delay
+        with blocking_wait():
+            while True:
+                wait = delay if deadline is None else max(0.0, min(delay, deadline - time.monotonic()))
+                if future is not None:
+                    try:
+                        return future.result(timeout=wait)
+                    except FutureTimeoutError:
+                        pass
+                else:
+                    time.sleep(wait)
+                status = self.check_job_status(job_id)
+                if status in TERMINAL_STATUSES or (deadline is not None and time.monotonic() >= deadline):
+                    return status
+                delay = min(delay * 2, max_delay) * random.uniform(0.8, 1.0)
+    
+    async def await_job(self, job_id: str, timeout: Optional[float] = None,
+                        initial_delay: float = 0.5, max_delay: float = 30.0) -> JobStatus:
+        """Async `wait_for_job`: suspends the calling coroutine until the job finishes."""
+        future = self.completion_future(job_id)
+        waiter = asyncio.wrap_future(future) if future is not None else None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = initial_delay
+        while True:
+            wait = delay if deadline is None else max(0.0, min(delay, deadline - time.monotonic()))
+            if waiter is not None:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(waiter), wait)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(wait)
+            status = self.check_job_status(job_id)
+            if status in TERMINAL_STATUSES or (deadline is not None and time.monotonic() >= deadline):
+                return status
+            delay = min(delay * 2, max_delay) * random.uniform(0.8, 1.0)
+    
+    def forget(self, job_id: str):
+        """Stops tracking a job whose results won't be fetched (it failed or timed out)."""
+        with self._cond:
+            self._due.pop(job_id, None)
+            self._futures.pop(job_id, None)
+    
+    def stats(self) -> dict:
+        with self._cond:
+            return {"jobs": len(self._due), "pending": len(self._schedule), "notifications": self.notifications, "status_checks": self.status_checks}
+    
+    def get_job_results(self, job_id: str) -> ExposureFrameRef:
         print(f"SERVICE: Fetching results for job {job_id}")
+        self.forget(job_id)
         return ExposureFrameRef(
             uri=f"s3://exposures/exp_{uuid.uuid4().hex[:8]}.parquet",
             schema_hash=uuid.uuid4().hex,
@@ -216,8 +884,17 @@ class BatchProcessingService:
 # 5. Thematic Analysis Workflow (The encapsulated sub-agent graph)
 # ==============================================================================
 
-def build_thematic_analysis_workflow(llm) -> StateGraph:
-    """Builds the complete, multi-step workflow for thematic analysis."""
+def build_thematic_analysis_workflow(llm, cpu_pool: Optional[ProcessPoolExecutor] = None, use_async: bool = False,
+                                     batch_timeout: Optional[float] = 600.0,
+                                     batch_service: Optional[BatchProcessingService] = None) -> StateGraph:
+    """Builds the complete, multi-step workflow for thematic analysis; optimization runs in `cpu_pool` if given.
+
+    With `use_async` the service-calling nodes are coroutines, for running with `astream`.
+    `monitor_batch` runs once and waits for the batch job's completion notification, so a
+    waiting workflow is a suspended coroutine, or a thread parked outside the executor's
+    worker slots (see `blocking_wait`), rather than a polling loop.
+    """
+    batch_service = batch_service or BatchProcessingService()
     
     def generate_schema(state: ThematicAnalysisState) -> dict:
         # In a real system, this would be an LLM call.
@@ -225,34 +902,60 @@ def build_thematic_analysis_workflow(llm) -> StateGraph:
         return {"exposure_schema": schema}
 
     def start_batch_job(state: ThematicAnalysisState) -> dict:
-        job_id = BatchProcessingService.start_prediction_job(state['stocks'], state['exposure_schema'])
+        job_id = batch_service.start_prediction_job(state['stocks'], state['exposure_schema'])
         return {"batch_job_id": job_id, "job_status": JobStatus.PENDING}
 
+    def batch_outcome(batch_job_id: str, status: JobStatus) -> dict:
+        if status == JobStatus.SUCCEEDED: return {"job_status": status}
+        batch_service.forget(batch_job_id)
+        return {"job_status": status, "error": f"Batch job {batch_job_id} did not succeed (status: {status.value})"}
+
     def monitor_batch_job(state: ThematicAnalysisState) -> dict:
-        time.sleep(1)
-        status = BatchProcessingService.check_job_status(state['batch_job_id'])
-        return {"job_status": status}
+        status = batch_service.wait_for_job(state['batch_job_id'], timeout=batch_timeout)
+        return batch_outcome(state['batch_job_id'], status)
 
     def retrieve_results(state: ThematicAnalysisState) -> dict:
-        return {"raw_exposure_ref": BatchProcessingService.get_job_results(state['batch_job_id'])}
+        return {"raw_exposure_ref": batch_service.get_job_results(state['batch_job_id'])}
 
     def execute_optimization(state: ThematicAnalysisState) -> dict:
-        return {"optimized_weights_ref": PortfolioService.optimize_portfolio(state['raw_exposure_ref'], state['portfolio_account'])}
+        args = (state['raw_exposure_ref'], state['portfolio_account'])
+        if cpu_pool is None:
+            return {"optimized_weights_ref": PortfolioService.optimize_portfolio(*args)}
+        return {"optimized_weights_ref": cpu_pool.submit(PortfolioService.optimize_portfolio, *args).result()}
+
+    # The mock service returns at once, so these nodes call it inline rather than in a thread.
+    async def start_batch_job_async(state: ThematicAnalysisState) -> dict:
+        return start_batch_job(state)
+
+    async def retrieve_results_async(state: ThematicAnalysisState) -> dict:
+        return retrieve_results(state)
+
+    async def monitor_batch_job_async(state: ThematicAnalysisState) -> dict:
+        status = await batch_service.await_job(state['batch_job_id'], timeout=batch_timeout)
+        return batch_outcome(state['batch_job_id'], status)
+
+    async def execute_optimization_async(state: ThematicAnalysisState) -> dict:
+        args = (state['raw_exposure_ref'], state['portfolio_account'])
+        if cpu_pool is None:
+            return {"optimized_weights_ref": await PortfolioService.aoptimize_portfolio(*args)}
+        loop = asyncio.get_running_loop()
+        return {"optimized_weights_ref": await loop.run_in_executor(cpu_pool, PortfolioService.optimize_portfolio, *args)}
 
     workflow = StateGraph(ThematicAnalysisState)
     workflow.add_node("generate_schema", generate_schema)
-    workflow.add_node("start_batch", start_batch_job)
-    workflow.add_node("monitor_batch", monitor_batch_job)
-    workflow.add_node("get_results", retrieve_results)
-    workflow.add_node("optimize", execute_optimization)
+    workflow.add_node("start_batch", start_batch_job_async if use_async else start_batch_job)
+    workflow.add_node("monitor_batch", monitor_batch_job_async if use_async else monitor_batch_job)
+    workflow.add_node("get_results", retrieve_results_async if use_async else retrieve_results)
+    workflow.add_node("optimize", execute_optimization_async if use_async else execute_optimization)
     workflow.add_node("handle_error", lambda s: s)
     
     workflow.set_entry_point("generate_schema")
     workflow.add_edge("generate_schema", "start_batch")
     workflow.add_edge("start_batch", "monitor_batch")
-    workflow.add_conditional_edges("monitor_batch", lambda s: "get_results" if s.get("job_status") == JobStatus.SUCCEEDED else "monitor_batch")
+    workflow.add_conditional_edges("monitor_batch", lambda s: "get_results" if s.get("job_status") == JobStatus.SUCCEEDED else "handle_error")
     workflow.add_edge("get_results", "optimize")
     workflow.add_edge("optimize", END)
+    workflow.add_edge("handle_error", END)
     
     return workflow.compile()
 
@@ -260,7 +963,35 @@ def build_thematic_analysis_workflow(llm) -> StateGraph:
 # 6. Specialist Agent Nodes (Interfaces to the Supervisor)
 # ==============================================================================
 
-def thematic_analysis_agent_node(state: MessagesState, job_manager: JobManager, async_executor: AsyncTaskExecutor, thematic_analysis_workflow: StateGraph) -> dict:
+def thematic_workflow_inputs(metadata: dict) -> ThematicAnalysisState:
+    """Workflow inputs for a thematic analysis job, rebuilt from its metadata (also used to re-queue recovered jobs)."""
+    return ThematicAnalysisState(
+        portfolio_account=metadata["account"],
+        thematic_query=metadata["query"],
+        stocks=["AAPL", "GOOG", "MSFT", "NVDA", "TSLA"],
+    )
+
+def resubmit_interrupted(job_manager: JobManager, async_executor: TaskExecutor, thematic_analysis_workflow: StateGraph) -> list[str]:
+    """Re-queues thematic analysis jobs left PENDING by a restart; returns the IDs that were resubmitted.
+
+    Jobs the executor has no room for are marked FAILED rather than left waiting for a drain that never comes.
+    """
+    resubmitted = []
+    for job_id in job_manager.interrupted:
+        job = job_manager.get_job(job_id)
+        if job.status != JobStatus.PENDING or job.task_type != TaskType.THEMATIC_ANALYSIS: continue
+        try:
+            async_executor.submit_task(thematic_analysis_workflow, job_id, thematic_workflow_inputs(job.metadata))
+        except ExecutorSaturated:
+            print(f"WARNING: No room to re-queue job {job_id} interrupted by a restart")
+            job_manager.update_job(job_id, status=JobStatus.FAILED, progress=1.0,
+                                   error="Interrupted by a restart and not resumed: executor at capacity; please resubmit")
+            continue
+        print(f"INFO: Re-queued job {job_id} interrupted by a restart")
+        resubmitted.append(job_id)
+    return resubmitted
+
+def thematic_analysis_agent_node(state: MessagesState, job_manager: JobManager, async_executor: TaskExecutor, thematic_analysis_workflow: StateGraph) -> dict:
     """Node that receives a task from the supervisor and starts the async workflow."""
     print("--- Thematic Analysis Agent Activated ---")
     task_description = state['messages'][-1].content
@@ -270,15 +1001,12 @@ def thematic_analysis_agent_node(state: MessagesState, job_manager: JobManager,
     if not PortfolioService.validate_account(account):
         return {"messages": [AIMessage(content=f"❌ Error: Account '{account}' is not valid.", name="thematic_analysis_agent")]}
 
-    job_id = job_manager.create_job(TaskType.THEMATIC_ANALYSIS, {"account": account, "query": task_description})
-    
-    workflow_inputs = ThematicAnalysisState(
-        portfolio_account=account,
-        thematic_query=task_description,
-        stocks=["AAPL", "GOOG", "MSFT", "NVDA", "TSLA"],
-    )
-    
-    async_executor.submit_task(thematic_analysis_workflow, job_id, workflow_inputs)
+    metadata = {"account": account, "query": task_description}
+    job_id = job_manager.create_job(TaskType.THEMATIC_ANALYSIS, metadata)
+    try:
+        async_executor.submit_task(thematic_analysis_workflow, job_id, thematic_workflow_inputs(metadata))
+    except ExecutorSaturated:
+        return {"messages": [AIMessage(content="⏳ The analysis queue is full right now. Please try again shortly.", name="thematic_analysis_agent")]}
     
     result = f"✅ **Thematic Analysis Started**\n**Job ID:** `{job_id}`\nUse 'status of {job_id}' to check progress."
     return {"messages": [AIMessage(content=result, name="thematic_analysis_agent")]}
@@ -345,12 +1073,42 @@ class PortfolioSystem:
                 return self
 
         # --- Initialize Core Services ---
-        self.job_manager = JobManager()
-        self.async_executor = AsyncTaskExecutor(self.job_manager)
+        # JOB_STORE=memory keeps jobs in memory only; otherwise they survive restarts in sqlite.
+        if os.environ.get("JOB_STORE", "sqlite") == "memory":
+            store = InMemoryJobStore()
+        else:
+            store = SQLiteJobStore(os.environ.get("JOB_STORE_PATH", DEFAULT_JOB_STORE_PATH))
+        self.job_manager = JobManager(store=store, recovery=os.environ.get("JOB_RECOVERY", "requeue"))
+        # EXECUTOR=asyncio runs workflows as coroutines on one event loop instead of a thread pool.
+        use_async = os.environ.get("EXECUTOR", "thread") == "asyncio"
+        on_full = os.environ.get("EXECUTOR_ON_FULL", "reject")
+        if use_async:
+            self.async_executor = AsyncioTaskExecutor(
+                self.job_manager,
+                max_concurrency=int(os.environ.get("EXECUTOR_MAX_CONCURRENCY", "1000")),
+                queue_size=int(os.environ.get("EXECUTOR_QUEUE_SIZE", "10000")),
+                on_full=on_full,
+            )
+            cpu_pool = ProcessPoolExecutor(max_workers=int(os.environ["EXECUTOR_CPU_WORKERS"])) if os.environ.get("EXECUTOR_CPU_WORKERS") else None
+        else:
+            self.async_executor = ThreadPoolTaskExecutor(
+                self.job_manager,
+                max_workers=int(os.environ.get("EXECUTOR_WORKERS", "8")),
+                queue_size=int(os.environ.get("EXECUTOR_QUEUE_SIZE", "64")),
+                on_full=on_full,
+                cpu_workers=int(os.environ.get("EXECUTOR_CPU_WORKERS", "0")),
+                max_waiting=int(os.environ.get("EXECUTOR_MAX_WAITING", "64")),
+            )
+            cpu_pool = self.async_executor.cpu_pool
         self.llm = EnhancedMockLLM()
+        self.batch_service = BatchProcessingService()
         
         # --- Build Workflows & Supervisor ---
-        thematic_analysis_workflow = build_thematic_analysis_workflow(self.llm)
+        thematic_analysis_workflow = build_thematic_analysis_workflow(
+            self.llm, cpu_pool=cpu_pool, use_async=use_async, batch_timeout=float(os.environ.get("BATCH_TIMEOUT_S", "600")),
+            batch_service=self.batch_service,
+        )
+        resubmit_interrupted(self.job_manager, self.async_executor, thematic_analysis_workflow)
         
         delegate_to_thematic_agent = create_handoff_tool("thematic_analysis_agent", "Handle complex thematic analysis and portfolio optimization tasks")
         delegate_to_status_agent = create_handoff_tool("job_status_agent", "Check status and progress of running jobs")
@@ -399,9 +1157,131 @@ class PortfolioSystem:
         print("\n" + "="*60 + "\n✅ DEMO COMPLETED\n" + "="*60)
 
 # ==============================================================================
-# 9. Main Execution Block
+# 9. Microbenchmarks
+# ==============================================================================
+
+def benchmark_job_manager(num_jobs: int = 100_000, still_running: float = 0.05, accounts: int = 1_000,
+                          store: Optional[JobStore] = None) -> dict:
+    """Times create/update/query on a JobManager holding `num_jobs` jobs, optionally backed by `store`."""
+    def timed(fn, calls: list) -> list[float]:
+        latencies = []
+        for args in calls:
+            started = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    def summary(latencies: list[float]) -> dict:
+        ordered = sorted(latencies)
+        return {
+            "ops_per_s": round(len(ordered) / sum(ordered)) if sum(ordered) else 0,
+            "p99_us": round(ordered[int(len(ordered) * 0.99)] * 1e6, 2),
+            "max_us": round(ordered[-1] * 1e6, 2),
+        }
+
+    manager = JobManager(retention=RetentionPolicy(max_jobs=num_jobs // 2, max_age_seconds=None), store=store)
+    task_types = list(TaskType)
+    job_ids = []
+    create = timed(lambda i: job_ids.append(manager.create_job(task_types[i % len(task_types)], {"account": f"ACC{i % accounts:05d}"})),
+                   [(i,) for i in range(num_jobs)])
+    start = timed(lambda job_id: manager.update_job(job_id, status=JobStatus.RUNNING, progress=0.1), [(job_id,) for job_id in job_ids])
+    progress = timed(lambda job_id: manager.update_job(job_id, progress=0.5), [(job_id,) for job_id in job_ids])
+    finishing = job_ids[:int(num_jobs * (1 - still_running))]
+    finish = timed(lambda job_id: manager.update_job(job_id, status=JobStatus.SUCCEEDED, progress=1.0), [(job_id,) for job_id in finishing])
+    running = timed(lambda: manager.list_jobs(status=JobStatus.RUNNING), [()] * 100)
+    by_account = timed(lambda i: manager.list_jobs(account=f"ACC{i:05d}", status=JobStatus.RUNNING), [(i,) for i in range(accounts)])
+    counts = manager.count_by_status()
+    assert counts[JobStatus.RUNNING.value] == num_jobs - len(finishing), "eviction must never drop running jobs"
+    durability = {}
+    if isinstance(store, SQLiteJobStore):
+        started = time.perf_counter()
+        store.flush()
+        durability = {"final_flush_s": round(time.perf_counter() - started, 3), "batches": store.batches, "rows_written": store.rows_written}
+    return {
+        **({"store": durability} if durability else {}),
+        "jobs": num_jobs, "retained": len(manager._jobs), "evicted": manager.evicted, "by_status": counts,
+        "create": summary(create), "start": summary(start), "progress_update": summary(progress),
+        "finish_with_eviction": summary(finish), "list_running": summary(running), "list_running_by_account": summary(by_account),
+    }
+
+def benchmark_executor(num_jobs: int = 1_000, max_workers: int = 8, queue_size: int = 64, step_seconds: float = 0.01,
+                       kind: Literal["thread", "asyncio"] = "thread") -> dict:
+    """Floods a task executor with `num_jobs` waiting jobs and reports throughput and peak thread count.
+
+    For `kind="asyncio"`, `max_workers` is the executor's concurrency limit.
+    """
+    class SleepyGraph:
+        def stream(self, inputs):
+            for step in range(3):
+                time.sleep(step_seconds)
+                yield {f"step_{step}": {}}
+
+        async def astream(self, inputs):
+            for step in range(3):
+                await asyncio.sleep(step_seconds)
+                yield {f"step_{step}": {}}
+
+    manager = JobManager(retention=RetentionPolicy(max_jobs=num_jobs, max_age_seconds=None))
+    if kind == "asyncio":
+        executor = AsyncioTaskExecutor(manager, max_concurrency=max_workers, queue_size=queue_size, on_full="block")
+    else:
+        executor = ThreadPoolTaskExecutor(manager, max_workers=max_workers, queue_size=queue_size, on_full="block")
+    graph = SleepyGraph()
+    peak_threads = threading.active_count()
+    started = time.perf_counter()
+    for _ in range(num_jobs):
+        executor.submit_task(graph, manager.create_job(TaskType.THEMATIC_ANALYSIS, {}), {})
+        peak_threads = max(peak_threads, threading.active_count())
+    executor.shutdown(wait=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "jobs": num_jobs, "seconds": round(elapsed, 3), "jobs_per_s": round(num_jobs / elapsed, 1),
+        "peak_threads": peak_threads, "executor": executor.stats(),
+    }
+
+def benchmark_batch_waits(num_jobs: int = 500, runtime_s: float = 1.0, notifications: bool = True) -> dict:
+    """Awaits `num_jobs` concurrent batch jobs and reports how late each wait returned and how many status polls it cost."""
+    async def wait_all() -> list[float]:
+        async def wait_one() -> float:
+            job_id = service.start_prediction_job([], {})
+            due = service._due[job_id]
+            await service.await_job(job_id)
+            service.forget(job_id)
+            return time.monotonic() - due
+        return await asyncio.gather(*(wait_one() for _ in range(num_jobs)))
+
+    service = BatchProcessingService(runtime_s=runtime_s, supports_notifications=notifications)
+    started = time.perf_counter()
+    lateness = sorted(asyncio.run(wait_all()))
+    return {
+        "jobs": num_jobs, "notifications": notifications, "seconds": round(time.perf_counter() - started, 3),
+        "status_checks": service.status_checks,
+        "lateness_ms": {"p50": round(lateness[len(lateness) // 2] * 1e3, 2), "max": round(lateness[-1] * 1e3, 2)},
+        "peak_threads": threading.active_count(),
+    }
+
+# ==============================================================================
+# 10. Main Execution Block
 # ==============================================================================
 
 if __name__ == "__main__":
-    system = PortfolioSystem()
-    system.run_demo()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Portfolio management agent demo")
+    parser.add_argument("--bench-jobs", type=int, metavar="N", help="Benchmark the JobManager with N jobs instead of running the demo")
+    parser.add_argument("--bench-store", metavar="PATH", help="Back the benchmark with a sqlite job store at PATH")
+    parser.add_argument("--bench-executor", type=int, metavar="N", help="Benchmark the task executor with N queued jobs")
+    parser.add_argument("--bench-batch-waits", type=int, metavar="N", help="Benchmark waiting on N concurrent batch jobs (notifications vs. polling)")
+    parser.add_argument("--executor", choices=["thread", "asyncio"], default="thread", help="Executor for --bench-executor")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers (thread) or concurrent tasks (asyncio) for --bench-executor")
+    args = parser.parse_args()
+    if args.bench_batch_waits:
+        print(json.dumps([benchmark_batch_waits(args.bench_batch_waits, notifications=n) for n in (True, False)], indent=2))
+    elif args.bench_executor:
+        print(json.dumps(benchmark_executor(args.bench_executor, max_workers=args.concurrency, kind=args.executor), indent=2))
+    elif args.bench_jobs:
+        store = SQLiteJobStore(args.bench_store) if args.bench_store else None
+        print(json.dumps(benchmark_job_manager(args.bench_jobs, store=store), indent=2))
+    else:
+        system = PortfolioSystem()
+        system.run_demo()
\ No newline at end of file